@@ -0,0 +1,63 @@
+"""
+Compares the best-K asset selection methods against a brute force search of every subset, then times
+the heuristics on a universe the size of nasdaq100.csv, where brute force is out of reach.
+
+Run from the repository root:
+    python benchmarks/bench_selection.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from selection import select_assets
+from fixtures import synthetic_universe
+
+SMALL_CASES = [(15, 3), (15, 5), (20, 4)]
+LARGE_CASE_ASSETS = 95
+LARGE_CASE_SELECTED = [5, 10, 20]
+SEEDS = [0, 1, 2]
+METHODS = [("forward", False), ("forward", True), ("backward", False), ("backward", True), ("exact", False)]
+
+def run(returns, cov_matrix, num_selected, objective, method, local_search):
+    """
+    Returns the value and run time in seconds of one selection.
+    """
+    start = time.perf_counter()
+    _, _, value = select_assets(returns, cov_matrix, num_selected, objective, method=method, local_search=local_search)
+    return value, time.perf_counter() - start
+
+def method_name(method, local_search):
+    return method + (" + swaps" if local_search else "")
+
+def main():
+    for objective in ["min_risk", "max_sharpe"]:
+        print(f"\n{objective}: gap to brute force (worst over seeds) and run time")
+        print(f"{'assets':>6} {'K':>3} {'brute (ms)':>11} " + " ".join(f"{method_name(*m):>24}" for m in METHODS))
+        for num_assets, num_selected in SMALL_CASES:
+            worst_gaps = np.zeros(len(METHODS))
+            times = np.zeros(len(METHODS))
+            brute_time = 0.0
+            for seed in SEEDS:
+                returns, cov_matrix = synthetic_universe(num_assets, seed=seed)
+                best, elapsed = run(returns, cov_matrix, num_selected, objective, "brute_force", False)
+                brute_time += elapsed / len(SEEDS)
+                for i, (method, local_search) in enumerate(METHODS):
+                    value, elapsed = run(returns, cov_matrix, num_selected, objective, method, local_search)
+                    # Relative shortfall, positive when the method is worse
+                    gap = (value - best) / best if objective == "min_risk" else (best - value) / best
+                    worst_gaps[i] = max(worst_gaps[i], gap)
+                    times[i] += elapsed / len(SEEDS)
+            print(f"{num_assets:>6} {num_selected:>3} {brute_time * 1e3:>11.1f} "
+                  + " ".join(f"{gap:>12.2e} {elapsed * 1e3:>8.1f} ms" for gap, elapsed in zip(worst_gaps, times)))
+
+        print(f"\n{objective}: {LARGE_CASE_ASSETS} assets, value and run time of the heuristics")
+        returns, cov_matrix = synthetic_universe(LARGE_CASE_ASSETS)
+        for num_selected in LARGE_CASE_SELECTED:
+            results = [run(returns, cov_matrix, num_selected, objective, method, local_search)
+                       for method, local_search in METHODS if method != "exact"]
+            print(f"K={num_selected:>3} " + " ".join(f"{value:>10.5f} {elapsed * 1e3:>8.1f} ms" for value, elapsed in results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares the cvxpy and NumPy (critical line) backends of optimize_portfolio at several asset counts.
+
+Run from the repository root:
+    python benchmarks/bench_solvers.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from optimization import optimize_portfolio, optimize_portfolios
+from fixtures import synthetic_universe
+
+ASSET_COUNTS = [5, 25, 50, 100]
+REPEATS = 5
+NUM_TARGETS = 76
+
+def best_time(function):
+    """
+    Returns the fastest of REPEATS runs of function, in seconds.
+    """
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    print(f"{'assets':>6} {'cvxpy (ms)':>11} {'numpy (ms)':>11} {'speedup':>8} {'risk diff':>14} "
+          f"{'cvxpy frontier (ms)':>20} {'numpy frontier (ms)':>20}")
+    for num_assets in ASSET_COUNTS:
+        returns, cov_matrix = synthetic_universe(num_assets)
+        target_return = np.median(returns)
+
+        cvxpy_time = best_time(lambda: optimize_portfolio(returns, cov_matrix, target_return))
+        numpy_time = best_time(lambda: optimize_portfolio(returns, cov_matrix, target_return, method="critical_line"))
+
+        cvxpy_weights = optimize_portfolio(returns, cov_matrix, target_return)
+        numpy_weights = optimize_portfolio(returns, cov_matrix, target_return, method="critical_line")
+        risk_diff = abs(np.sqrt(cvxpy_weights @ cov_matrix @ cvxpy_weights) - np.sqrt(numpy_weights @ cov_matrix @ numpy_weights))
+
+        target_returns = np.linspace(returns.min(), returns.max(), NUM_TARGETS)
+        cvxpy_frontier_time = best_time(lambda: optimize_portfolios(returns, cov_matrix, target_returns, method="cvxpy"))
+        numpy_frontier_time = best_time(lambda: optimize_portfolios(returns, cov_matrix, target_returns))
+
+        print(f"{num_assets:>6} {cvxpy_time * 1e3:>11.2f} {numpy_time * 1e3:>11.2f} {cvxpy_time / numpy_time:>8.1f} "
+              f"{risk_diff:>14.2e} {cvxpy_frontier_time * 1e3:>20.1f} {numpy_frontier_time * 1e3:>20.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Seeded synthetic market data for the benchmarks, so they run without network access.
+"""
+import numpy as np
+
+def synthetic_universe(num_assets, seed=0, num_days=750):
+    """
+    Creates annualized expected returns and a covariance matrix for a synthetic universe where
+    every asset has some exposure to a common market factor.
+
+    Args:
+        num_assets (int): Number of assets.
+        seed (int): Seed for the random data.
+        num_days (int): Number of simulated daily returns the covariance is estimated from.
+
+    Returns:
+        tuple: (returns, cov_matrix)
+            - returns (np.array): Expected returns for each asset (1D array).
+            - cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+    """
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0, 0.01, (num_days, 1))
+    daily_returns = market * rng.uniform(0.5, 1.5, num_assets) + rng.normal(0, 0.015, (num_days, num_assets))
+    returns = rng.uniform(0.0, 0.4, num_assets)
+    return returns, np.cov(daily_returns.T) * 252
@@ -0,0 +1,206 @@
+"""
+Benchmarks every stage of the pipeline on synthetic data at several scales, and compares the
+results against a stored baseline.
+
+Run from the repository root:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --time-threshold 0.25
+
+The exit code is 1 if any benchmark is slower, or uses more memory, than the baseline by more
+than the threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from data_processing import get_efficient_frontier_data, get_random_portfolios
+from monte_carlo import simulate_portfolio_returns, simulate_portfolio_summary, simulate_asset_returns
+from optimization import optimize_portfolio, optimize_max_sharpe, optimize_cvar
+from resampling import resampled_frontier
+from service import PortfolioService
+from fixtures import synthetic_universe
+
+RISK_FREE_RETURN = 0.03
+
+# Sweeps of each stage. cvxpy backed stages stop at 100 assets, where a frontier already takes seconds.
+ASSET_COUNTS = [5, 25, 100, 500]
+CVXPY_ASSET_COUNTS = [5, 25, 100]
+FRONTIER_DENSITIES = [25, 76, 250]
+RANDOM_PORTFOLIO_AMOUNTS = [1_000, 100_000]
+SIMULATION_COUNTS = [1_000, 10_000]
+CVAR_SCENARIO_COUNTS = [10_000, 100_000]
+BOOTSTRAP_RESAMPLES = [100, 1_000]
+
+def benchmark_cases(quick=False):
+    """
+    Lists every benchmark as (name, params, function). Each function runs the stage once.
+
+    Args:
+        quick (bool): Setting to True only keeps the smallest scale of each sweep.
+    """
+    asset_counts = ASSET_COUNTS[:2] if quick else ASSET_COUNTS
+    cvxpy_asset_counts = CVXPY_ASSET_COUNTS[:2] if quick else CVXPY_ASSET_COUNTS
+    densities = FRONTIER_DENSITIES[:1] if quick else FRONTIER_DENSITIES
+    amounts = RANDOM_PORTFOLIO_AMOUNTS[:1] if quick else RANDOM_PORTFOLIO_AMOUNTS
+    sim_counts = SIMULATION_COUNTS[:1] if quick else SIMULATION_COUNTS
+    scenario_counts = CVAR_SCENARIO_COUNTS[:1] if quick else CVAR_SCENARIO_COUNTS
+    resample_counts = BOOTSTRAP_RESAMPLES[:1] if quick else BOOTSTRAP_RESAMPLES
+
+    cases = []
+    for num_assets in asset_counts:
+        returns, cov_matrix = synthetic_universe(num_assets)
+        target_return = float(np.median(returns))
+        # Stay just below the highest asset return, where solvers can misreport feasibility
+        min_return = float(returns.min())
+        max_return = float(returns.max() - 0.05 * (returns.max() - returns.min()))
+
+        cases.append(("optimize_portfolio", {"assets": num_assets, "method": "critical_line"},
+                      lambda r=returns, c=cov_matrix, t=target_return: optimize_portfolio(r, c, t, method="critical_line")))
+        for density in densities:
+            cases.append(("get_efficient_frontier_data", {"assets": num_assets, "points": density, "method": "critical_line"},
+                          lambda r=returns, c=cov_matrix, d=density, lo=min_return, hi=max_return:
+                          get_efficient_frontier_data(r, c, RISK_FREE_RETURN, lo, hi, d, method="critical_line")))
+        for amount in amounts:
+            cases.append(("get_random_portfolios", {"assets": num_assets, "amount": amount},
+                          lambda r=returns, c=cov_matrix, a=amount: get_random_portfolios(r, c, a, seed=0)))
+
+        if num_assets in cvxpy_asset_counts:
+            cases.append(("optimize_portfolio", {"assets": num_assets, "method": "cvxpy"},
+                          lambda r=returns, c=cov_matrix, t=target_return: optimize_portfolio(r, c, t)))
+            cases.append(("optimize_max_sharpe", {"assets": num_assets},
+                          lambda r=returns, c=cov_matrix: optimize_max_sharpe(r, c, RISK_FREE_RETURN)))
+            for density in densities:
+                cases.append(("get_efficient_frontier_data", {"assets": num_assets, "points": density, "method": "cvxpy"},
+                              lambda r=returns, c=cov_matrix, d=density, lo=min_return, hi=max_return:
+                              get_efficient_frontier_data(r, c, RISK_FREE_RETURN, lo, hi, d)))
+
+    for sims in sim_counts:
+        cases.append(("simulate_portfolio_returns", {"sims": sims},
+                      lambda s=sims: simulate_portfolio_returns(10_000, 0.15, 0.2, 1, 1 / 252, s, seed=0)))
+        cases.append(("simulate_portfolio_summary", {"sims": sims},
+                      lambda s=sims: simulate_portfolio_summary(10_000, 0.15, 0.2, 1, 1 / 252, s, seed=0)))
+
+    returns, cov_matrix = synthetic_universe(ASSET_COUNTS[1])
+    for num_scenarios in scenario_counts:
+        scenarios = simulate_asset_returns(returns, cov_matrix, 1, num_scenarios, seed=0)
+        cases.append(("optimize_cvar", {"assets": len(returns), "scenarios": num_scenarios},
+                      lambda s=scenarios, r=returns, t=float(np.median(returns)): optimize_cvar(s, t, returns=r)))
+
+    daily_returns = simulate_asset_returns(np.full(50, 0.1), np.eye(50) * 0.04 + 0.02, 1 / 252, 750, seed=0)
+    for resamples in resample_counts:
+        cases.append(("resampled_frontier", {"assets": 50, "resamples": resamples},
+                      lambda d=daily_returns, b=resamples: resampled_frontier(d, resamples=b, workers=1, seed=0)))
+
+    # Repeated service queries are answered from the cached universe, so this measures the request overhead
+    service = PortfolioService(loader=lambda tickers, days_back, cov_estimator: synthetic_universe(len(tickers)))
+    request = {"method": "min_risk", "params": {"tickers": [f"T{i}" for i in range(ASSET_COUNTS[1])], "days_back": 365, "target_return": 0.2}}
+    asyncio.run(service.handle(request))
+    cases.append(("service_cached_query", {"assets": ASSET_COUNTS[1]}, lambda: asyncio.run(service.handle(request))))
+
+    return cases
+
+def case_key(name, params):
+    """
+    Identifies a benchmark across runs, for example "optimize_portfolio[assets=5,method=cvxpy]".
+    """
+    return f"{name}[{','.join(f'{key}={value}' for key, value in sorted(params.items()))}]"
+
+def measure(function, repeats):
+    """
+    Runs function repeats times and measures it.
+
+    Returns:
+        tuple: (best_time, peak_memory)
+            - best_time (float): Fastest wall time, in seconds.
+            - peak_memory (int): Peak memory allocated during one extra traced run, in bytes. Tracing
+            slows the run down so it isn't included in the time.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(times), peak_memory
+
+def run_benchmarks(quick=False, repeats=3):
+    """
+    Runs every benchmark and returns the results in the same layout as the JSON output.
+    """
+    results = {}
+    for name, params, function in benchmark_cases(quick):
+        best_time, peak_memory = measure(function, repeats)
+        key = case_key(name, params)
+        results[key] = {"name": name, "params": params, "time": best_time, "peak_memory": peak_memory}
+        print(f"{key:<75} {best_time * 1e3:>10.2f} ms {peak_memory / 1e6:>10.2f} MB")
+
+    metadata = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "quick": quick,
+        "repeats": repeats,
+    }
+    return {"metadata": metadata, "results": results}
+
+def compare_to_baseline(current, baseline, time_threshold, memory_threshold):
+    """
+    Finds benchmarks that got slower or use more memory than the baseline by more than the
+    thresholds, which are fractions (0.25 means 25% worse). Benchmarks missing from either
+    run are skipped.
+
+    Returns:
+        list: A message for each regression.
+    """
+    regressions = []
+    for key, result in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        previous = baseline["results"][key]
+        if result["time"] > previous["time"] * (1 + time_threshold):
+            regressions.append(f"{key}: time {previous['time'] * 1e3:.2f} ms -> {result['time'] * 1e3:.2f} ms")
+        if result["peak_memory"] > previous["peak_memory"] * (1 + memory_threshold):
+            regressions.append(f"{key}: peak memory {previous['peak_memory'] / 1e6:.2f} MB -> {result['peak_memory'] / 1e6:.2f} MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare against the results in this JSON file.")
+    parser.add_argument("--time-threshold", type=float, default=0.25, help="Allowed fractional slowdown (default 0.25).")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed fractional memory increase (default 0.25).")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs of each benchmark, the fastest is kept.")
+    parser.add_argument("--quick", action="store_true", help="Only run the smallest scale of each sweep.")
+    args = parser.parse_args()
+
+    current = run_benchmarks(args.quick, args.repeats)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(current, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare_to_baseline(current, baseline, args.time_threshold, args.memory_threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import numpy as np
+from optimization import FrontierProblem
+from data_processing import TRADING_DAYS_PER_YEAR
+from instrumentation import timed
+
+class RollingMoments:
+    """
+    Mean and covariance of a sliding window of daily returns. Adding or dropping a day is a
+    rank-one update of the running sums, so sliding the window costs O(n²) instead of
+    recomputing the covariance from the whole window.
+
+    The sums are kept relative to a fixed shift (the mean of the first window) so the
+    covariance doesn't lose precision to cancellation when returns are far from zero.
+    """
+    def __init__(self, initial_returns):
+        """
+        Args:
+            initial_returns (np.array): Daily returns of the first window, one row per day (2D array).
+        """
+        initial_returns = np.asarray(initial_returns, dtype=float)
+        self.shift = initial_returns.mean(axis=0)
+        centered = initial_returns - self.shift
+        self.count = len(initial_returns)
+        self.total = centered.sum(axis=0)
+        self.outer_total = centered.T @ centered
+
+    def add(self, daily_return):
+        """
+        Adds one day of returns (1D array) to the window.
+        """
+        centered = daily_return - self.shift
+        self.count += 1
+        self.total += centered
+        self.outer_total += np.outer(centered, centered)
+
+    def remove(self, daily_return):
+        """
+        Drops one day of returns (1D array) from the window.
+        """
+        centered = daily_return - self.shift
+        self.count -= 1
+        self.total -= centered
+        self.outer_total -= np.outer(centered, centered)
+
+    def mean(self):
+        """
+        Returns the mean daily return of each asset in the window (1D array).
+        """
+        return self.shift + self.total / self.count
+
+    def cov(self):
+        """
+        Returns the sample covariance matrix of daily returns in the window (2D array).
+        """
+        centered_mean = self.total / self.count
+        return (self.outer_total - self.count * np.outer(centered_mean, centered_mean)) / (self.count - 1)
+
+@timed
+def walk_forward_backtest(daily_returns, window, rebalance_every, target_return=None, initial_value=1.0, solver=None):
+    """
+    Simulates periodically re-optimizing a portfolio on a rolling window of past returns and
+    holding it until the next rebalance.
+
+    At each rebalance the annualized returns and covariance of the last window days are
+    calculated the same way as get_asset_data, and the minimum risk portfolio is re-solved
+    starting from the previous rebalance's weights. Between rebalances the holdings drift with
+    the daily returns.
+
+    Args:
+        daily_returns (np.array): Daily asset returns, one row per day with no missing values (2D array),
+        for example get_closes(tickers, days_back).pct_change().dropna().
+        window (int): Number of past days used to estimate returns and covariance.
+        rebalance_every (int): Number of days between rebalances.
+        target_return (float): The minimum expected return of the portfolio, None uses the minimum
+        risk portfolio. If no portfolio meets the target the previous weights are kept.
+        initial_value (float): Starting value of the portfolio.
+        solver (str): Name of the cvxpy solver to use, None lets cvxpy choose.
+
+    Returns:
+        tuple: (portfolio_values, rebalance_days, weights_history)
+            - portfolio_values (np.array): Portfolio value before the first day after the first window
+            and after every following day (1D array of length days - window + 1).
+            - rebalance_days (list): Row of daily_returns on which each rebalance happened, before that
+            day's return.
+            - weights_history (np.array): Weights chosen at each rebalance, one row per rebalance (2D array).
+    """
+    daily_returns = np.asarray(daily_returns, dtype=float)
+    num_days, num_assets = daily_returns.shape
+    if num_days <= window:
+        raise ValueError("daily_returns must have more rows than the window size.")
+
+    moments = RollingMoments(daily_returns[:window])
+    frontier_problem = None
+    weights = np.full(num_assets, 1 / num_assets)
+
+    portfolio_values = [initial_value]
+    rebalance_days = []
+    weights_history = []
+    for day in range(window, num_days):
+        if (day - window) % rebalance_every == 0:
+            annualized_returns = (1 + moments.mean()) ** TRADING_DAYS_PER_YEAR - 1
+            cov_matrix = moments.cov() * TRADING_DAYS_PER_YEAR
+            if frontier_problem is None:
+                frontier_problem = FrontierProblem(annualized_returns, cov_matrix, parametric_data=True, solver=solver)
+            else:
+                frontier_problem.update_data(annualized_returns, cov_matrix)
+
+            # Every portfolio meets the lowest asset return, so it gives the minimum risk portfolio
+            target = np.min(annualized_returns) if target_return is None else target_return
+            new_weights = frontier_problem.solve(target, initial_weights=weights)
+            if new_weights is not None:
+                weights = np.clip(new_weights, 0, None)
+                weights /= weights.sum()
+            rebalance_days.append(day)
+            weights_history.append(weights.copy())
+
+        # Hold the portfolio for the day and let the weights drift with the asset returns
+        growth = 1 + daily_returns[day]
+        portfolio_growth = weights @ growth
+        portfolio_values.append(portfolio_values[-1] * portfolio_growth)
+        weights = weights * growth / portfolio_growth
+
+        moments.add(daily_returns[day])
+        moments.remove(daily_returns[day - window])
+
+    return np.array(portfolio_values), rebalance_days, np.array(weights_history)
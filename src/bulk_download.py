@@ -0,0 +1,127 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from instrumentation import timed, record_event
+from price_cache import has_weekdays
+
+def yfinance_fetcher(ticker, start, end):
+    """
+    Downloads the daily closing prices of one ticker from Yahoo Finance, raising if the download fails.
+
+    Args:
+        ticker (str): Asset to download.
+        start (datetime): First date, inclusive.
+        end (datetime): Last date, exclusive.
+
+    Returns:
+        pd.Series: Closing prices indexed by date, empty if the range has no weekdays.
+    """
+    if not has_weekdays(start, end):
+        # yfinance raises for a range without trading days, but there is nothing to download
+        return pd.Series(index=pd.DatetimeIndex([]), dtype=float)
+
+    import yfinance as yf
+    history = yf.Ticker(ticker).history(start=start, end=end, raise_errors=True)
+    closes = history["Close"]
+    if closes.index.tz is not None:
+        closes.index = closes.index.tz_localize(None)
+    return closes
+
+class RateLimiter:
+    """
+    Spaces out calls so no more than requests_per_second start each second, across every thread.
+    """
+    def __init__(self, requests_per_second=None, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1 / requests_per_second if requests_per_second else 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Blocks until the caller's turn. Each caller reserves the next free slot, then sleeps outside the lock.
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = self.clock()
+            slot = max(now, self._next_time)
+            self._next_time = slot + self.interval
+        if slot > now:
+            self.sleep(slot - now)
+
+@timed
+def bulk_download(tickers, start, end, fetcher=yfinance_fetcher, max_workers=8, retries=3, backoff=0.5,
+                  max_backoff=8.0, requests_per_second=None, sleep=time.sleep):
+    """
+    Downloads the closing prices of many tickers concurrently, one request per ticker, so a bad
+    symbol only loses its own column. Failed requests are retried with exponential backoff.
+
+    Args:
+        tickers (list): List of assets.
+        start (datetime): First date, inclusive.
+        end (datetime): Last date, exclusive.
+        fetcher (callable): Function taking (ticker, start, end) and returning a pd.Series of closes
+        indexed by date, raising on failure. An empty result means the range had no trading days. Can be replaced to use another data source or a fake in tests.
+        max_workers (int): Number of tickers downloaded at the same time.
+        retries (int): Extra attempts after a ticker's first request fails.
+        backoff (float): Seconds waited before the first retry, doubling for every later retry.
+        max_backoff (float): Longest wait between retries, in seconds.
+        requests_per_second (float): Limit on how many requests start each second, None for no limit.
+        sleep (callable): Function used to wait, can be replaced in tests.
+
+    Returns:
+        tuple: (closes, failed)
+            - closes (pd.DataFrame): Closing prices indexed by the union of every ticker's dates, with
+            one column per ticker that downloaded, in the same order as tickers. A ticker without
+            prices in the range has an all NaN column.
+            - failed (dict): For each ticker that failed every attempt, the error message of its
+            last attempt. These tickers have no column in closes.
+    """
+    rate_limiter = RateLimiter(requests_per_second, sleep=sleep)
+
+    def fetch(ticker):
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                sleep(min(backoff * 2 ** (attempt - 1), max_backoff))
+            rate_limiter.wait()
+            try:
+                return fetcher(ticker, start, end).dropna(), None
+            except Exception as error:
+                last_error = f"{type(error).__name__}: {error}"
+        return None, last_error
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(fetch, tickers))
+
+    columns, failed = {}, {}
+    for ticker, (closes, error) in zip(tickers, results):
+        if error is None:
+            columns[ticker] = closes
+        else:
+            failed[ticker] = error
+            record_event("failed_download", ticker=ticker, error=error)
+
+    closes = pd.DataFrame(columns).sort_index()
+    closes.index.name = "Date"
+    return closes, failed
+
+class BulkDownloader:
+    """
+    Wraps bulk_download with the same arguments and return value as price_cache.yfinance_downloader,
+    so it can be passed as the downloader of load_closes and get_asset_data. The tickers that failed
+    are left out of the result and collected in the failed attribute, which maps each ticker to its last error.
+
+    Args:
+        **options: Keyword arguments passed to bulk_download, such as fetcher, max_workers or retries.
+    """
+    def __init__(self, **options):
+        self.options = options
+        self.failed = {}
+
+    def __call__(self, tickers, start, end):
+        closes, failed = bulk_download(tickers, start, end, **self.options)
+        self.failed.update(failed)
+        return closes
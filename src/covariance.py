@@ -0,0 +1,114 @@
+import numpy as np
+
+def sample_covariance(daily_returns):
+    """
+    Calculates the sample covariance matrix of daily returns.
+
+    Args:
+        daily_returns (np.array): Daily asset returns, one row per day with no missing values (2D array).
+
+    Returns:
+        np.array: Covariance matrix of daily returns (2D array).
+    """
+    return np.cov(np.asarray(daily_returns, dtype=float), rowvar=False)
+
+def ledoit_wolf_covariance(daily_returns):
+    """
+    Calculates the Ledoit-Wolf shrinkage estimate of the covariance matrix. The sample covariance
+    is pulled towards a multiple of the identity matrix by the amount that minimizes the expected
+    estimation error, which keeps the matrix well conditioned even with more assets than days.
+
+    Args:
+        daily_returns (np.array): Daily asset returns, one row per day with no missing values (2D array).
+
+    Returns:
+        tuple: (cov_matrix, shrinkage)
+            - cov_matrix (np.array): Shrunk covariance matrix of daily returns (2D array).
+            - shrinkage (float): Weight given to the identity target, between 0 and 1.
+    """
+    daily_returns = np.asarray(daily_returns, dtype=float)
+    num_days, num_assets = daily_returns.shape
+    centered = daily_returns - daily_returns.mean(axis=0)
+    sample = centered.T @ centered / num_days
+
+    # Target: the average variance on the diagonal
+    target_scale = np.trace(sample) / num_assets
+    target_distance = np.sum((sample - target_scale * np.eye(num_assets)) ** 2) / num_assets
+
+    # Variance of the sample covariance, using sum_t ||x_t x_tᵀ - S||² = sum_t (x_tᵀ x_t)² - T ||S||²
+    squared_norms = np.sum(centered ** 2, axis=1)
+    sample_variance = (np.sum(squared_norms ** 2) - num_days * np.sum(sample ** 2)) / (num_days ** 2 * num_assets)
+    sample_variance = min(sample_variance, target_distance)
+
+    shrinkage = sample_variance / target_distance if target_distance > 0 else 1.0
+    cov_matrix = shrinkage * target_scale * np.eye(num_assets) + (1 - shrinkage) * sample
+
+    return cov_matrix, shrinkage
+
+def pca_factor_model(daily_returns, num_factors):
+    """
+    Fits a statistical factor model where the covariance is the low-rank part explained by the
+    top principal components plus a diagonal of asset specific variances: Σ = B Bᵀ + diag(D). The
+    components come from a thin SVD of the centered returns, so the dense covariance matrix is never
+    built and memory grows with days times assets.
+
+    Args:
+        daily_returns (np.array): Daily asset returns, one row per day with no missing values (2D array).
+        num_factors (int): Number of principal components kept.
+
+    Returns:
+        tuple: (factor_loadings, specific_variances)
+            - factor_loadings (np.array): Loadings B of each asset on each factor, shape (assets, factors) (2D array).
+            - specific_variances (np.array): Variance D of each asset not explained by the factors (1D array).
+    """
+    daily_returns = np.asarray(daily_returns, dtype=float)
+    centered = daily_returns - daily_returns.mean(axis=0)
+    scale = np.sqrt(len(daily_returns) - 1)
+
+    # The right singular vectors of the centered returns are the eigenvectors of the sample covariance,
+    # and svd sorts the singular values in decreasing order
+    _, singular_values, components = np.linalg.svd(centered / scale, full_matrices=False)
+    factor_loadings = np.zeros((centered.shape[1], min(num_factors, centered.shape[1])))
+    # With fewer days than factors the remaining components have no variance and their loadings stay 0
+    kept = min(factor_loadings.shape[1], len(singular_values))
+    factor_loadings[:, :kept] = components[:kept].T * singular_values[:kept]
+
+    # Keep the specific variances positive so the model stays positive definite
+    variances = np.sum((centered / scale) ** 2, axis=0)
+    specific_variances = variances - np.sum(factor_loadings ** 2, axis=1)
+    floor = 1e-6 * np.mean(variances)
+    specific_variances = np.clip(specific_variances, floor, None)
+
+    return factor_loadings, specific_variances
+
+def factor_covariance(factor_loadings, specific_variances):
+    """
+    Builds the dense covariance matrix B Bᵀ + diag(D) of a factor model.
+
+    Args:
+        factor_loadings (np.array): Loadings of each asset on each factor (2D array).
+        specific_variances (np.array): Asset specific variances (1D array).
+
+    Returns:
+        np.array: Covariance matrix (2D array).
+    """
+    return factor_loadings @ factor_loadings.T + np.diag(specific_variances)
+
+def covariance_factor(cov_matrix):
+    """
+    Calculates a matrix F such that F.T @ F equals the covariance matrix, so the portfolio
+    variance can be written as the sum of squares of F @ weights.
+
+    Args:
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+
+    Returns:
+        np.array: The factor matrix (2D array). Uses the Cholesky factor when the matrix is
+        positive definite and falls back to an eigendecomposition when it is only semidefinite.
+    """
+    try:
+        return np.linalg.cholesky(cov_matrix).T
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(cov_matrix)
+        eigenvalues = np.clip(eigenvalues, 0, None)
+        return (eigenvectors * np.sqrt(eigenvalues)).T
@@ -0,0 +1,187 @@
+import numpy as np
+from instrumentation import timed
+
+# Tolerance used to decide when a weight or a bound multiplier has reached zero
+TOLERANCE = 1e-10
+
+@timed
+def critical_line_frontier(returns, cov_matrix, stop_return=None):
+    """
+    Calculates the corner portfolios of the long-only minimum risk frontier using the critical
+    line algorithm. Between two neighbouring corner portfolios the set of assets held does not
+    change and the weights change linearly with the target return, so the corners describe the
+    whole frontier exactly.
+
+    The algorithm follows the frontier from the highest return portfolio down to the minimum
+    risk portfolio. It minimizes 0.5 * wᵀ Σ w - λ * wᵀ r for a decreasing risk tolerance λ,
+    adding an asset when its bound stops being optimal and removing one when its weight hits zero.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        stop_return (float): Stops once a corner portfolio's return is at or below this return. The
+        corners found so far are enough to interpolate any target return above it.
+
+    Returns:
+        tuple: (corner_returns, corner_risks, corner_weights)
+            - corner_returns (np.array): Return of each corner portfolio, from highest to lowest (1D array).
+            - corner_risks (np.array): Risk of each corner portfolio (1D array).
+            - corner_weights (np.array): Weights of each corner portfolio, one row per corner (2D array).
+    """
+    returns = np.asarray(returns, dtype=float)
+    cov_matrix = np.asarray(cov_matrix, dtype=float)
+    num_assets = len(returns)
+
+    # Start with the highest return assets. When several assets share the highest return the
+    # starting portfolio is their minimum risk combination.
+    free = np.isclose(returns, returns.max(), rtol=0, atol=TOLERANCE)
+    alpha, beta, _ = _free_weights(returns, cov_matrix, free)
+    while np.any(alpha < -TOLERANCE):
+        free[np.flatnonzero(free)[np.argmin(alpha)]] = False
+        alpha, beta, _ = _free_weights(returns, cov_matrix, free)
+
+    corner_weights = []
+    current_lambda = np.inf
+    last_changed = None
+    while True:
+        alpha, beta, gradient = _free_weights(returns, cov_matrix, free)
+        free_indices = np.flatnonzero(free)
+        bound_indices = np.flatnonzero(~free)
+
+        # The largest λ below the current one at which a free asset's weight reaches zero
+        candidate_lambda = 0.0
+        candidate_asset = None
+        with np.errstate(divide="ignore", invalid="ignore"):
+            leave_lambdas = -alpha / beta
+        for asset, slope, leave_lambda in zip(free_indices, beta, leave_lambdas):
+            if slope > TOLERANCE and leave_lambda < current_lambda and asset != last_changed:
+                if leave_lambda > candidate_lambda:
+                    candidate_lambda, candidate_asset = leave_lambda, asset
+
+        # The largest λ below the current one at which a bound asset should start being held
+        intercepts, slopes = gradient
+        with np.errstate(divide="ignore", invalid="ignore"):
+            enter_lambdas = -intercepts / slopes
+        for asset, slope, enter_lambda in zip(bound_indices, slopes, enter_lambdas):
+            if slope > TOLERANCE and enter_lambda < current_lambda and asset != last_changed:
+                if enter_lambda > candidate_lambda:
+                    candidate_lambda, candidate_asset = enter_lambda, asset
+
+        weights = np.zeros(num_assets)
+        weights[free] = alpha + candidate_lambda * beta
+        corner_weights.append(weights)
+
+        if candidate_asset is None:
+            # λ reached zero, this is the minimum risk portfolio
+            break
+        if stop_return is not None and weights @ returns <= stop_return:
+            break
+        free[candidate_asset] = not free[candidate_asset]
+        current_lambda = candidate_lambda
+        last_changed = candidate_asset
+
+    corner_weights = np.array(corner_weights)
+    corner_weights = np.clip(corner_weights, 0, None)
+    corner_weights /= corner_weights.sum(axis=1, keepdims=True)
+    corner_returns = corner_weights @ returns
+    corner_risks = np.sqrt(np.einsum("ij,jk,ik->i", corner_weights, cov_matrix, corner_weights))
+
+    return corner_returns, corner_risks, corner_weights
+
+def _free_weights(returns, cov_matrix, free):
+    """
+    Solves the equality constrained problem on the free assets. The free weights are
+    alpha + λ * beta, and the bound multiplier of each bound asset is intercept + λ * slope.
+    """
+    free_cov = cov_matrix[np.ix_(free, free)]
+    free_returns = returns[free]
+    ones = np.ones(len(free_returns))
+
+    inv_ones, inv_returns = np.linalg.solve(free_cov, np.column_stack([ones, free_returns])).T
+    a = ones @ inv_ones
+    b = ones @ inv_returns
+
+    # The budget constraint fixes its multiplier as (1 - λ * b) / a
+    alpha = inv_ones / a
+    beta = inv_returns - inv_ones * b / a
+
+    bound_cov = cov_matrix[np.ix_(~free, free)]
+    intercepts = bound_cov @ alpha - 1 / a
+    slopes = bound_cov @ beta - returns[~free] + b / a
+
+    return alpha, beta, (intercepts, slopes)
+
+def interpolate_frontier_weights(corner_returns, corner_weights, target_returns):
+    """
+    Calculates the minimum risk portfolio for each target return from the corner portfolios,
+    without solving any optimization problem. Like optimize_portfolio, the target is a minimum
+    return, so targets below the minimum risk portfolio's return give the minimum risk portfolio.
+
+    Args:
+        corner_returns (np.array): Corner portfolio returns from critical_line_frontier (1D array).
+        corner_weights (np.array): Corner portfolio weights from critical_line_frontier (2D array).
+        target_returns (np.array): Target returns (1D array).
+
+    Returns:
+        np.array: Weights for each target return, one row per target (2D array). Rows are NaN
+        where the target is above the highest return any portfolio can reach.
+    """
+    target_returns = np.atleast_1d(np.asarray(target_returns, dtype=float))
+
+    # searchsorted needs increasing values, the corners go from highest to lowest return
+    increasing_returns = corner_returns[::-1]
+    increasing_weights = corner_weights[::-1]
+    clipped_targets = np.clip(target_returns, increasing_returns[0], increasing_returns[-1])
+
+    upper = np.searchsorted(increasing_returns, clipped_targets, side="left")
+    upper = np.clip(upper, 1, len(increasing_returns) - 1) if len(increasing_returns) > 1 else np.zeros_like(upper)
+    lower = np.maximum(upper - 1, 0)
+    span = increasing_returns[upper] - increasing_returns[lower]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(span > 0, (clipped_targets - increasing_returns[lower]) / span, 0.0)
+
+    weights = increasing_weights[lower] + fraction[:, None] * (increasing_weights[upper] - increasing_weights[lower])
+    weights[target_returns > increasing_returns[-1] + TOLERANCE] = np.nan
+
+    return weights
+
+def frontier_max_sharpe(corner_returns, corner_weights, cov_matrix, risk_free_return):
+    """
+    Finds the highest Sharpe ratio portfolio on the frontier described by the corner portfolios. Between
+    two corners the weights are w(t) = w_low + t * (w_high - w_low), so the excess return is linear and
+    the variance quadratic in t, and setting the derivative of the Sharpe ratio to zero leaves a linear
+    equation in t. Each segment's best point is therefore found exactly without a solver.
+
+    Args:
+        corner_returns (np.array): Corner portfolio returns from critical_line_frontier (1D array).
+        corner_weights (np.array): Corner portfolio weights from critical_line_frontier (2D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        risk_free_return (float): The risk-free return rate.
+
+    Returns:
+        np.array: The portfolio weights for each asset (1D array), or None if no corner returns more
+        than the risk-free rate.
+    """
+    excess_returns = corner_returns - risk_free_return
+    if np.all(excess_returns <= 0):
+        return None
+
+    # Each segment goes from a lower corner (t = 0) to the next higher one (t = 1)
+    low_weights = corner_weights[1:]
+    directions = corner_weights[:-1] - low_weights
+    low_excess = excess_returns[1:]
+    excess_slopes = excess_returns[:-1] - low_excess
+    quadratic = np.einsum("ij,jk,ik->i", directions, cov_matrix, directions)
+    linear = np.einsum("ij,jk,ik->i", low_weights, cov_matrix, directions)
+    constant = np.einsum("ij,jk,ik->i", low_weights, cov_matrix, low_weights)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        best_t = (low_excess * linear - excess_slopes * constant) / (excess_slopes * linear - low_excess * quadratic)
+    best_t = np.clip(np.nan_to_num(best_t), 0, 1)
+
+    candidates = np.vstack([corner_weights, low_weights + best_t[:, None] * directions])
+    candidate_excess = np.concatenate([excess_returns, low_excess + best_t * excess_slopes])
+    candidate_risks = np.sqrt(np.einsum("ij,jk,ik->i", candidates, cov_matrix, candidates))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe_ratios = np.where(candidate_risks > 0, candidate_excess / candidate_risks, np.inf * np.sign(candidate_excess))
+    return candidates[np.nanargmax(sharpe_ratios)]
@@ -1,13 +1,17 @@
 from datetime import datetime, timedelta
-import yfinance as yf
+import heapq
 import numpy as np 
-import cvxpy as cp
-from optimization import optimize_portfolio
-from portfolio_stats import portfolio_return_and_risk, portfolio_sharpe_ratio
+from optimization import FrontierProblem
+from critical_line import critical_line_frontier, interpolate_frontier_weights
+from covariance import ledoit_wolf_covariance, pca_factor_model, factor_covariance, covariance_factor
+from price_cache import load_closes, yfinance_downloader, MissingPriceDataError
+from portfolio_stats import portfolio_return_and_risk, portfolio_returns_and_risks, portfolio_sharpe_ratios
+from instrumentation import timed, record_event
 
 TRADING_DAYS_PER_YEAR = 252
 
-def get_asset_data(tickers, days_back):
+@timed
+def get_asset_data(tickers, days_back, cache_dir=None, offline=False, downloader=None, cov_estimator="sample", num_factors=5):
     """
     Calculates the historical individual returns and pairwise covariance 
     of a group of assets.
@@ -16,20 +20,104 @@ def get_asset_data(tickers, days_back):
         tickers (list): List of assets.
         days_back (int): The number of calendar days for historical data, 
         considering only trading days within the last days_back days. 
+        cache_dir (str): Directory of the local price cache. When given, only dates that are
+        not cached yet are downloaded, see price_cache.load_closes.
+        offline (bool): Setting to True only uses the cache, see price_cache.load_closes.
+        downloader (callable): Replaces the yfinance download, see price_cache.yfinance_downloader.
+        cov_estimator (str): How the covariance is estimated, see compute_asset_statistics.
+        num_factors (int): Number of factors for the "pca" covariance estimator.
     
     Returns:
         tuple: (returns_vec, cov_matrix)
             returns_vec (np.array): Expected returns for each asset (1D array).
             cov_matrix (np.array): Covariance matrix of asset returns (2D array).
     """
+    closes = get_closes(tickers, days_back, cache_dir, offline, downloader)
+    return compute_asset_statistics(closes, cov_estimator, num_factors)
+
+@timed
+def get_closes(tickers, days_back, cache_dir=None, offline=False, downloader=None, drop_missing=False):
+    """
+    Loads the daily closing prices of a group of assets. Takes the same arguments as get_asset_data.
+
+    Args:
+        drop_missing (bool): Setting to True leaves out tickers without any prices, for example when
+        their download failed, instead of raising.
+
+    Returns:
+        pd.DataFrame: Closing prices indexed by date with one column per ticker, in the same
+        order as tickers.
+
+    Raises:
+        MissingPriceDataError: If a ticker has no prices and drop_missing is False.
+    """
     # Get historical date period
     now = datetime.now()
     start_time = (now - timedelta(days=days_back))
 
     # Get asset data
-    closes = yf.download(tickers, start=start_time, end=now)["Close"]
-    closes = closes[tickers] # Make sure the order is the same as the original ticker list
-    
+    downloader = downloader or yfinance_downloader
+    if cache_dir is not None:
+        closes = load_closes(tickers, start_time, now, cache_dir, downloader=downloader, offline=offline)
+    elif offline:
+        raise ValueError("Offline mode needs a cache_dir to load prices from.")
+    else:
+        closes = downloader(tickers, start_time, now)
+    closes = closes.reindex(columns=tickers) # Make sure the order is the same as the original ticker list
+
+    # Tickers without prices would otherwise turn into all NaN columns
+    missing = closes.columns[closes.isna().all()].tolist()
+    if missing and not drop_missing:
+        raise MissingPriceDataError(f"No prices were found for {missing}")
+    for ticker in missing:
+        record_event("dropped_ticker", ticker=ticker)
+
+    return closes.drop(columns=missing)
+
+@timed
+def get_factor_model_data(tickers, days_back, cache_dir=None, offline=False, downloader=None, num_factors=5):
+    """
+    Loads the expected returns and a statistical factor model of the covariance of a group of assets,
+    for optimization.optimize_portfolio_factor. Takes the same arguments as get_asset_data, and unlike
+    get_asset_data(cov_estimator="pca") never builds the dense covariance matrix, see
+    covariance.pca_factor_model.
+
+    Returns:
+        tuple: (returns_vec, factor_loadings, specific_variances), see compute_factor_model.
+    """
+    closes = get_closes(tickers, days_back, cache_dir, offline, downloader)
+    return compute_factor_model(closes, num_factors)
+
+@timed
+def get_scenario_returns(tickers, days_back, cache_dir=None, offline=False, downloader=None):
+    """
+    Loads the historical daily returns of a group of assets as scenarios for optimization.optimize_cvar.
+    Takes the same arguments as get_asset_data.
+
+    Returns:
+        np.array: Daily returns with one row per day where every asset has a return and one column per
+        ticker, in the same order as tickers (2D array).
+    """
+    closes = get_closes(tickers, days_back, cache_dir, offline, downloader)
+    return closes.pct_change().dropna().to_numpy()
+
+@timed
+def compute_asset_statistics(closes, cov_estimator="sample", num_factors=5):
+    """
+    Calculates annualized expected returns and covariance from daily closing prices.
+
+    Args:
+        closes (pd.DataFrame): Closing prices indexed by date with one column per asset.
+        cov_estimator (str): "sample" for the sample covariance, "ledoit_wolf" for Ledoit-Wolf
+        shrinkage or "pca" for a statistical factor model. The last two only use days where every
+        asset has a return and stay well conditioned for large universes.
+        num_factors (int): Number of factors for the "pca" estimator.
+
+    Returns:
+        tuple: (returns_vec, cov_matrix)
+            returns_vec (np.array): Expected returns for each asset (1D array).
+            cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+    """
     # Get average geometric annualized return 
     daily_returns = closes.pct_change()
     avg_daily_returns = daily_returns.mean()
@@ -37,15 +125,45 @@ def get_asset_data(tickers, days_back):
     returns_vec = annualized_returns.squeeze().to_numpy()
 
     # Get covariance matrix
-    cov_df = daily_returns.cov()
-    cov_matrix = cov_df.to_numpy() * TRADING_DAYS_PER_YEAR
+    if cov_estimator == "sample":
+        cov_matrix = daily_returns.cov().to_numpy()
+    elif cov_estimator == "ledoit_wolf":
+        cov_matrix, _ = ledoit_wolf_covariance(daily_returns.dropna().to_numpy())
+    elif cov_estimator == "pca":
+        cov_matrix = factor_covariance(*pca_factor_model(daily_returns.dropna().to_numpy(), num_factors))
+    else:
+        raise ValueError(f"Unknown covariance estimator: {cov_estimator}")
+    cov_matrix = cov_matrix * TRADING_DAYS_PER_YEAR
 
     return returns_vec, cov_matrix
     
-def get_efficient_frontier_data(returns, cov_matrix, risk_free_return, min_return, max_return, num_returns):
+def compute_factor_model(closes, num_factors=5):
+    """
+    Calculates annualized expected returns and an annualized PCA factor model Σ = B Bᵀ + diag(D) from
+    daily closing prices. Its covariance is the same as compute_asset_statistics with the "pca" estimator.
+
+    Args:
+        closes (pd.DataFrame): Closing prices indexed by date with one column per asset.
+        num_factors (int): Number of factors.
+
+    Returns:
+        tuple: (returns_vec, factor_loadings, specific_variances)
+            returns_vec (np.array): Expected returns for each asset (1D array).
+            factor_loadings (np.array): Loadings B of each asset on each factor, shape (assets, factors) (2D array).
+            specific_variances (np.array): Asset specific variances D (1D array).
+    """
+    daily_returns = closes.pct_change()
+    returns_vec = ((1 + daily_returns.mean()) ** TRADING_DAYS_PER_YEAR - 1).squeeze().to_numpy()
+    factor_loadings, specific_variances = pca_factor_model(daily_returns.dropna().to_numpy(), num_factors)
+    return returns_vec, factor_loadings * np.sqrt(TRADING_DAYS_PER_YEAR), specific_variances * TRADING_DAYS_PER_YEAR
+
+@timed
+def get_efficient_frontier_data(returns, cov_matrix, risk_free_return, min_return, max_return, num_returns, solver=None, method="cvxpy"):
     """
     Calculates a series of returns and their risks and Sharpe ratios. Used to plot the efficient frontier
-    and Sharpe ratio visuals.
+    and Sharpe ratio visuals. With the cvxpy method the optimization problem is compiled once and re-solved
+    for each target return. The critical_line method finds the corner portfolios of the frontier once and
+    interpolates between them, so no solver is called and any number of points costs about the same.
 
     Args:
         returns (np.array): Expected returns for each asset (1D array).
@@ -53,6 +171,8 @@ def get_efficient_frontier_data(returns, cov_matrix, risk_free_return, min_retur
         min_return (float): Smallest target return.
         max_return (float): Largest target return.
         num_returns (float): Amount of portfolios calculated.
+        solver (str): Name of the cvxpy solver to use, None lets cvxpy choose.
+        method (str): "cvxpy" or "critical_line".
     
     Returns:
         tuple: (actual_returns, risks, sharpe_ratios)
@@ -63,31 +183,129 @@ def get_efficient_frontier_data(returns, cov_matrix, risk_free_return, min_retur
 
     """
     target_returns = np.linspace(min_return, max_return, num_returns)
+    solver_errors = (ValueError,)
+    if method == "cvxpy":
+        import cvxpy as cp
+        solver_errors = (ValueError, cp.error.SolverError)
+        frontier_problem = FrontierProblem(returns, cov_matrix, solver=solver)
+        solve_target = frontier_problem.solve
+    elif method == "critical_line":
+        corner_returns, _, corner_weights = critical_line_frontier(returns, cov_matrix)
 
-    actual_returns = []
-    risks = []
-    sharpe_ratios = []
-    for target_return in target_returns:
+        def solve_target(target_return):
+            weights = interpolate_frontier_weights(corner_returns, corner_weights, target_return)[0]
+            return None if np.isnan(weights).any() else weights
+    else:
+        raise ValueError(f"Unknown efficient frontier method: {method}")
+
+    # Solve every target first, then calculate the statistics of all portfolios at once
+    frontier_weights = np.full((len(target_returns), len(returns)), np.nan)
+    for target_index, target_return in enumerate(target_returns):
         try:
-            weights = optimize_portfolio(returns, cov_matrix, target_return)
-            portfolio_return, portfolio_risk = portfolio_return_and_risk(returns, cov_matrix, weights)
-            sharpe_ratio = portfolio_sharpe_ratio(portfolio_return, portfolio_risk, risk_free_return)
-        except (ValueError, cp.error.SolverError) as e:
+            weights = solve_target(target_return)
+            if weights is None:
+                raise ValueError(f"No feasible portfolio for target return {target_return}")
+            frontier_weights[target_index] = weights
+        except solver_errors as e:
             # This will occur if there is not a feasible solution with the given
             # assets and target return
             print(f"Infeasible solution for target return: {target_return}")
-            actual_returns.append(np.nan)
-            risks.append(np.nan)
-            sharpe_ratios.append(np.nan)
-            continue 
+            record_event("infeasible_target_return", target_return=float(target_return), error=str(e))
 
-        actual_returns.append(portfolio_return)
-        risks.append(portfolio_risk)
-        sharpe_ratios.append(sharpe_ratio)
+    actual_returns, risks = portfolio_returns_and_risks(returns, cov_matrix, frontier_weights)
+    sharpe_ratios = portfolio_sharpe_ratios(actual_returns, risks, risk_free_return)
 
-    return actual_returns, risks, sharpe_ratios
+    return actual_returns.tolist(), risks.tolist(), sharpe_ratios.tolist()
     
-def get_random_portfolios(returns, cov_matrix, amount):
+@timed
+def get_adaptive_frontier_data(returns, cov_matrix, risk_free_return, tolerance=1e-3, max_points=100, solver=None, method="cvxpy"):
+    """
+    Calculates efficient frontier points like get_efficient_frontier_data, but chooses the target returns
+    itself. Targets only span the feasible range, from the minimum risk portfolio's return to the highest
+    asset return, so no target fails or repeats the minimum risk portfolio.
+
+    Points are added where the frontier curves most. Each gap between neighbouring points is split at its
+    middle return, and the halves are split again while the risk at the middle differs from the straight
+    line between the gap's ends by more than the tolerance. Since risk is convex in return along the frontier, this bounds how
+    far the line drawn through the points is from the real frontier.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        risk_free_return (float): The risk-free return rate.
+        tolerance (float): Largest allowed gap between the frontier's risk and the line through the points.
+        max_points (int): Most portfolios calculated, including the two ends.
+        solver (str): Name of the cvxpy solver to use, None lets cvxpy choose.
+        method (str): "cvxpy" or "critical_line", see get_efficient_frontier_data.
+
+    Returns:
+        tuple: (actual_returns, risks, sharpe_ratios) ordered by return, see get_efficient_frontier_data.
+
+    Raises:
+        ValueError: If the minimum risk portfolio can't be solved for.
+    """
+    if method == "cvxpy":
+        import cvxpy as cp
+        frontier_problem = FrontierProblem(returns, cov_matrix, solver=solver)
+
+        def solve_target(target_return):
+            # A failed solve is skipped like an infeasible target
+            try:
+                return frontier_problem.solve(target_return)
+            except cp.error.SolverError:
+                return None
+        # Any target at or below the lowest asset return gives the minimum risk portfolio
+        lowest_target = np.min(returns)
+    elif method == "critical_line":
+        corner_returns, _, corner_weights = critical_line_frontier(returns, cov_matrix)
+        solve_target = lambda target_return: interpolate_frontier_weights(corner_returns, corner_weights, target_return)[0]
+        lowest_target = corner_returns[-1]
+    else:
+        raise ValueError(f"Unknown efficient frontier method: {method}")
+
+    def evaluate(target_return):
+        weights = solve_target(target_return)
+        if weights is None or np.isnan(weights).any():
+            print(f"Infeasible solution for target return: {target_return}")
+            record_event("infeasible_target_return", target_return=float(target_return))
+            return None
+        return portfolio_return_and_risk(returns, cov_matrix, weights)
+
+    lowest = evaluate(lowest_target)
+    if lowest is None:
+        raise ValueError("No feasible minimum risk portfolio, so the frontier has no starting point")
+    highest = evaluate(np.max(returns))
+    if highest is None:
+        # Solvers can misreport the highest return as infeasible, it is the best single asset
+        best_asset = np.argmax(returns)
+        highest = (returns[best_asset], np.sqrt(cov_matrix[best_asset, best_asset]))
+    points = [lowest, highest]
+
+    # Gaps waiting to be split, largest error first: (-error, left point, right point, middle point)
+    gaps = []
+    def add_gap(left, right):
+        if len(points) >= max_points or right[0] - left[0] <= 0:
+            return
+        middle = evaluate((left[0] + right[0]) / 2)
+        if middle is None:
+            return
+        points.append(middle)
+        line_risk = left[1] + (right[1] - left[1]) * (middle[0] - left[0]) / (right[0] - left[0])
+        error = abs(middle[1] - line_risk)
+        heapq.heappush(gaps, (-error, left, right, middle))
+
+    add_gap(lowest, highest)
+    while gaps and -gaps[0][0] > tolerance and len(points) < max_points:
+        _, left, right, middle = heapq.heappop(gaps)
+        add_gap(left, middle)
+        add_gap(middle, right)
+
+    actual_returns, risks = np.array(sorted(points)).T
+    sharpe_ratios = portfolio_sharpe_ratios(actual_returns, risks, risk_free_return)
+    return actual_returns.tolist(), risks.tolist(), sharpe_ratios.tolist()
+
+@timed
+def get_random_portfolios(returns, cov_matrix, amount, method="uniform", seed=None):
     """
     Calculates the risks and returns for a series of randomly weighted porfolios.
 
@@ -95,6 +313,8 @@ def get_random_portfolios(returns, cov_matrix, amount):
         returns (np.array): Expected returns for each asset (1D array).
         cov_matrix (np.array): Covariance matrix of asset returns (2D array).
         amount (int): Amount of portfolios generated.
+        method (str): How weights are drawn, see random_weights.
+        seed (int or np.random.Generator): Seed for the random weights.
 
     Returns:
         tuple: (actual_returns, risks)
@@ -102,16 +322,128 @@ def get_random_portfolios(returns, cov_matrix, amount):
             here so there is no target return.
             - risks (list): The risk of each portfolio.
     """
-    num_assets = len(returns)
-    risks = []
     actual_returns = []
-    for _ in range(amount):
-        weights = np.random.rand(num_assets)
-        weights = weights / np.sum(weights)
+    risks = []
+    for chunk_returns, chunk_risks in iter_random_portfolios(returns, cov_matrix, amount, method=method, seed=seed):
+        actual_returns.extend(chunk_returns.tolist())
+        risks.extend(chunk_risks.tolist())
+
+    return actual_returns, risks
 
-        portfolio_return, portfolio_risk = portfolio_return_and_risk(returns, cov_matrix, weights)
+def random_weights(rng, amount, num_assets, method="uniform"):
+    """
+    Draws a matrix of random long-only portfolio weights.
 
-        risks.append(portfolio_risk)
-        actual_returns.append(portfolio_return)
+    Args:
+        rng (np.random.Generator): Random number generator.
+        amount (int): Amount of portfolios.
+        num_assets (int): Number of assets in each portfolio.
+        method (str): "uniform" normalizes uniform draws (the original behaviour), "dirichlet"
+        samples uniformly from all portfolios that sum to 1.
 
-    return actual_returns, risks
+    Returns:
+        np.array: Weights with one portfolio per row (2D array).
+    """
+    if method == "uniform":
+        weights = rng.random((amount, num_assets))
+    elif method == "dirichlet":
+        weights = rng.standard_exponential((amount, num_assets))
+    else:
+        raise ValueError(f"Unknown random weights method: {method}")
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights
+
+def iter_random_portfolios(returns, cov_matrix, amount, chunk_size=50_000, method="uniform", seed=None):
+    """
+    Generates random portfolios in chunks so any amount can be processed in bounded memory.
+    The returns and risks of a whole chunk are calculated with one call to portfolio_returns_and_risks,
+    reusing one Cholesky factor of the covariance matrix for every chunk.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        amount (int): Amount of portfolios generated.
+        chunk_size (int): Amount of portfolios per chunk.
+        method (str): How weights are drawn, see random_weights.
+        seed (int or np.random.Generator): Seed for the random weights.
+
+    Yields:
+        tuple: (chunk_returns, chunk_risks)
+            - chunk_returns (np.array): The return of each portfolio in the chunk (1D array).
+            - chunk_risks (np.array): The risk of each portfolio in the chunk (1D array).
+    """
+    rng = np.random.default_rng(seed)
+    num_assets = len(returns)
+    cov_factor = covariance_factor(cov_matrix)
+    for start in range(0, amount, chunk_size):
+        weights = random_weights(rng, min(chunk_size, amount - start), num_assets, method)
+        yield portfolio_returns_and_risks(returns, cov_matrix, weights, cov_factor)
+
+@timed
+def get_random_portfolio_histogram(returns, cov_matrix, amount, bins=200, chunk_size=50_000, method="uniform", seed=None):
+    """
+    Counts random portfolios on a fixed risk-return grid. Memory only depends on the number of
+    bins, so this works for tens of millions of portfolios.
+
+    The grid covers every long-only portfolio: returns lie between the lowest and highest asset
+    return, and risk is at most the highest individual asset risk.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        amount (int): Amount of portfolios generated.
+        bins (int): Number of bins along each axis.
+        chunk_size (int): Amount of portfolios per chunk.
+        method (str): How weights are drawn, see random_weights.
+        seed (int or np.random.Generator): Seed for the random weights.
+
+    Returns:
+        tuple: (counts, risk_edges, return_edges)
+            - counts (np.array): Number of portfolios in each bin, indexed [risk, return] (2D array).
+            - risk_edges (np.array): Bin edges along the risk axis (1D array).
+            - return_edges (np.array): Bin edges along the return axis (1D array).
+    """
+    risk_edges = np.linspace(0, np.sqrt(np.max(np.diag(cov_matrix))), bins + 1)
+    return_edges = np.linspace(np.min(returns), np.max(returns), bins + 1)
+    counts = np.zeros((bins, bins), dtype=np.int64)
+    for chunk_returns, chunk_risks in iter_random_portfolios(returns, cov_matrix, amount, chunk_size, method, seed):
+        chunk_counts, _, _ = np.histogram2d(chunk_risks, chunk_returns, bins=[risk_edges, return_edges])
+        counts += chunk_counts.astype(np.int64)
+
+    return counts, risk_edges, return_edges
+
+@timed
+def get_random_portfolio_sample(returns, cov_matrix, amount, sample_size, chunk_size=50_000, method="uniform", seed=None):
+    """
+    Keeps a uniform random sample of sample_size portfolios out of amount generated portfolios
+    (reservoir sampling). Each portfolio gets a random key and the smallest keys are kept, so
+    memory only depends on sample_size.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        amount (int): Amount of portfolios generated.
+        sample_size (int): Amount of portfolios kept.
+        chunk_size (int): Amount of portfolios per chunk.
+        method (str): How weights are drawn, see random_weights.
+        seed (int or np.random.Generator): Seed for the random weights and the sample.
+
+    Returns:
+        tuple: (sample_returns, sample_risks)
+            - sample_returns (np.array): The return of each kept portfolio (1D array).
+            - sample_risks (np.array): The risk of each kept portfolio (1D array).
+    """
+    rng = np.random.default_rng(seed)
+    key_rng = rng.spawn(1)[0]
+    keys = np.empty(0)
+    sample_returns = np.empty(0)
+    sample_risks = np.empty(0)
+    for chunk_returns, chunk_risks in iter_random_portfolios(returns, cov_matrix, amount, chunk_size, method, rng):
+        keys = np.concatenate([keys, key_rng.random(len(chunk_returns))])
+        sample_returns = np.concatenate([sample_returns, chunk_returns])
+        sample_risks = np.concatenate([sample_risks, chunk_risks])
+        if len(keys) > sample_size:
+            keep = np.argpartition(keys, sample_size)[:sample_size]
+            keys, sample_returns, sample_risks = keys[keep], sample_returns[keep], sample_risks[keep]
+
+    return sample_returns, sample_risks
@@ -0,0 +1,161 @@
+import cProfile
+import csv
+import functools
+import json
+import time
+from contextlib import contextmanager
+
+# Instrumentation is off by default. While it is off, timed functions only pay for one check of
+# this flag and stage() does nothing.
+_enabled = False
+_records = []
+_profiler = None
+
+def enable(profile=False):
+    """
+    Starts recording timings, solver statistics and events.
+
+    Args:
+        profile (bool): Setting to True also runs cProfile until disable() is called, see write_profile.
+    """
+    global _enabled, _profiler
+    _enabled = True
+    if profile:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+def disable():
+    """
+    Stops recording. Records collected so far are kept until reset() is called.
+    """
+    global _enabled
+    _enabled = False
+    if _profiler is not None:
+        _profiler.disable()
+
+def is_enabled():
+    """
+    Returns True while instrumentation is recording.
+    """
+    return _enabled
+
+def reset():
+    """
+    Clears the collected records and stops and discards the profile.
+    """
+    global _profiler
+    _records.clear()
+    if _profiler is not None:
+        _profiler.disable()
+    _profiler = None
+
+def get_records():
+    """
+    Returns the collected records as a list of dicts. Every record has a "type" ("stage", "solve"
+    or "event") and a "name", plus fields that depend on the type.
+    """
+    return list(_records)
+
+@contextmanager
+def stage(name, **details):
+    """
+    Context manager that records the wall time of the code inside it as a "stage" record.
+
+    Args:
+        name (str): Name of the stage.
+        **details: Extra fields added to the record.
+    """
+    if not _enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _records.append({"type": "stage", "name": name, "duration": time.perf_counter() - start, **details})
+
+def timed(function):
+    """
+    Decorator that records each call of a function as a stage named after the function.
+    """
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return function(*args, **kwargs)
+        with stage(name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+def record_solver_stats(name, problem):
+    """
+    Records the status and solver statistics of a solved cvxpy problem as a "solve" record.
+
+    Args:
+        name (str): Name of the caller.
+        problem (cp.Problem): The solved problem.
+    """
+    if not _enabled:
+        return
+
+    solver_stats = problem.solver_stats
+    _records.append({
+        "type": "solve",
+        "name": name,
+        "status": problem.status,
+        "solver": solver_stats.solver_name if solver_stats else None,
+        "compilation_time": problem.compilation_time,
+        "setup_time": solver_stats.setup_time if solver_stats else None,
+        "solve_time": solver_stats.solve_time if solver_stats else None,
+        "iterations": solver_stats.num_iters if solver_stats else None,
+    })
+
+def record_event(name, **details):
+    """
+    Records something that happened, for example an infeasible target return, as an "event" record.
+    """
+    if _enabled:
+        _records.append({"type": "event", "name": name, **details})
+
+def write_metrics(path):
+    """
+    Writes the collected records to a JSON file, or to a CSV file if path ends with ".csv". CSV
+    columns are the union of every record's fields.
+    """
+    if path.endswith(".csv"):
+        columns = []
+        for record in _records:
+            columns.extend(key for key in record if key not in columns)
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(_records)
+    else:
+        with open(path, "w") as file:
+            json.dump(_records, file, indent=2, default=str)
+
+def write_profile(path):
+    """
+    Writes the cProfile statistics collected since enable(profile=True), readable with pstats or snakeviz.
+    """
+    if _profiler is None:
+        raise ValueError("No profile was collected, call enable(profile=True) first.")
+    _profiler.dump_stats(path)
+
+def summarize():
+    """
+    Totals the time of each stage.
+
+    Returns:
+        dict: For each stage name, a dict with its number of calls and total duration in seconds.
+    """
+    summary = {}
+    for record in _records:
+        if record["type"] == "stage":
+            totals = summary.setdefault(record["name"], {"calls": 0, "duration": 0.0})
+            totals["calls"] += 1
+            totals["duration"] += record["duration"]
+    return summary
@@ -2,12 +2,16 @@
 import pandas as pd
 import numpy as np
 import random
+import os
 
 # Custom Modules
-from optimization import optimize_portfolio
+from optimization import optimize_portfolio, optimize_max_sharpe
 from data_processing import (
     get_asset_data,
+    get_closes,
+    compute_asset_statistics,
     get_efficient_frontier_data,
+    get_adaptive_frontier_data,
     get_random_portfolios,
 )
 from visualizations import (
@@ -15,15 +19,25 @@ from visualizations import (
     plot_scatter,
     display_portfolio_bar_chart,
     plot_monte_carlo_all,
-    plot_monte_carlo_avg
+    plot_monte_carlo_avg,
+    render_figures
 )
-from portfolio_stats import portfolio_return_and_risk
+from bulk_download import BulkDownloader
+from universe_index import build_universe_index
+from screening import random_universes, screen_universes
+from selection import select_assets
+from portfolio_stats import portfolio_return_and_risk, portfolio_sharpe_ratio
 from monte_carlo import simulate_portfolio_returns
+import instrumentation
 
 # Historical data settings
 TOTAL_YEARS_BACK = 3
 TOTAL_DAYS_BACK = 365 * TOTAL_YEARS_BACK
 ASSETS = 5
+CACHE_DIR = "../.price_cache" # Closing prices are cached here so only new dates are downloaded
+OFFLINE = False # Setting to True only uses cached prices
+DOWNLOAD_WORKERS = 8 # Tickers downloaded at the same time
+DOWNLOAD_RETRIES = 3 # Extra attempts for each ticker whose download fails
 
 # Optimization settings
 RISK_FREE_RETURN = 0.03
@@ -34,6 +48,9 @@ TARGET_RETURN = 0.15 # Can be used in place of even_return if not comparing to e
 MIN_RETURN = 0.05
 MAX_RETURN = 0.8
 NUM_RETURNS = 76
+EF_METHOD = "critical_line" # "critical_line" interpolates the exact frontier, "cvxpy" solves each point
+EF_SAMPLING = "adaptive" # "adaptive" places points where the frontier curves, "grid" uses MIN_RETURN to MAX_RETURN
+EF_TOLERANCE = 1e-3 # Largest gap between the adaptive frontier's line and its real risk
 
 # Random portfolios settings for the efficient frontier plot
 RANDOM_PORTFOLIOS = 1_000
@@ -43,28 +60,59 @@ INITIAL_VALUE = 10_000 # Dollars
 TOTAL_TIME = 1 # Years
 STEP_SIZE = 1 / 252 # 252 trading days in a year
 SIMS = 1_000
+MC_METHOD = "plain" # "plain", "antithetic", "moment_matching" or "sobol", see monte_carlo.simulate_portfolio_returns
+
+# Universe screening settings
+SCREEN_UNIVERSES = 0 # Number of random ASSETS ticker universes from nasdaq100.csv to rank, 0 skips screening
+SCREEN_RANK_BY = "max_sharpe_ratio" # Any metric in screening.METRICS
+SCREEN_OUTPUT = "../screening.csv"
+UNIVERSE_INDEX_DIR = "../.universe_index"
+
+# Asset selection settings
+SELECTION_METHOD = None # "forward" or "backward" picks the best ASSETS tickers of nasdaq100.csv instead of the tickers below. "exact" is only practical for small universes, not all of nasdaq100.csv
+SELECTION_OBJECTIVE = "max_sharpe" # "min_risk" or "max_sharpe", see selection.select_assets
+
+# Figure settings
+HEADLESS = False # Setting to True writes every figure to FIGURES_DIR in parallel instead of showing them
+FIGURES_DIR = "../figures"
+MC_PLOT_STYLE = "lines" # "lines", "subsample", "bands" or "density", the last three take the same time for any SIMS
+
+# Instrumentation settings
+METRICS_PATH = None # e.g. "metrics.json" or "metrics.csv" to record stage timings and solver statistics
+PROFILE_PATH = None # e.g. "main.prof" to also write a cProfile dump
 
 def main():
+    if METRICS_PATH or PROFILE_PATH:
+        instrumentation.enable(profile=PROFILE_PATH is not None)
+
+    # Each figure is (plot function, args, kwargs, file name), they are drawn at the end
+    figures = []
+
     # --------------- Load Data ---------------
     # Load the list of tickers on the Nasdaq 100 and randomly choose a group of them
     # Some tickers were removed because of a lack of data on yahoo finance:
     # SPLK, FISV, SGEN
     tickers_df = pd.read_csv("../nasdaq100.csv")
     tickers = tickers_df["Ticker"].tolist()
+    if SCREEN_UNIVERSES:
+        screen(tickers)
     tickers = random.sample(tickers, ASSETS)
     #tickers = ["MSFT", "AAPL", "NFLX", "NVDA"] # This line can be used to select specific tickers
     tickers = ['PDD', 'ORLY', 'TMUS', 'DLTR', 'ON'] # Good example
+    if SELECTION_METHOD:
+        tickers = select(tickers_df["Ticker"].tolist())
     print(tickers)
 
     # Get expected returns vector and covariance matrix
-    returns, cov_matrix = get_asset_data(tickers, TOTAL_DAYS_BACK)
+    downloader = BulkDownloader(max_workers=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES)
+    returns, cov_matrix = get_asset_data(tickers, TOTAL_DAYS_BACK, cache_dir=CACHE_DIR, offline=OFFLINE, downloader=downloader)
 
     # --------------- Evenly Weighted Portfolio Calculations ---------------
     # Get risk and return of evenly weighted portfolio
     even_weights = np.full(len(tickers), 1 / len(tickers))    
     even_return, even_risk = portfolio_return_and_risk(returns, cov_matrix, even_weights)
     even_weight_title = f"Evenly Weighted Portfolio with {np.round(even_return*100, 1)} % Expected Return and {np.round(even_risk*100, 1)} % Risk"
-    display_portfolio_bar_chart(even_weights, tickers, even_weight_title)
+    figures.append((display_portfolio_bar_chart, (even_weights, tickers, even_weight_title), {}, "even_weights.png"))
 
     # --------------- Optimized Minimum Risk Portfolio Calculations ---------------
     # Calculate and display weights of the minimum risk portfolio
@@ -72,35 +120,88 @@ def main():
     optimized_portfolio_return, optimized_portfolio_risk = portfolio_return_and_risk(returns, cov_matrix, weights)
     rounded_weights = np.round(weights, 3)
     min_risk_title =f"Minimum Risk Portfolio with {np.round(optimized_portfolio_return*100, 1)} % Expected Return and {np.round(optimized_portfolio_risk*100, 1)} % Risk"
-    display_portfolio_bar_chart(rounded_weights, tickers, min_risk_title)
+    figures.append((display_portfolio_bar_chart, (rounded_weights, tickers, min_risk_title), {}, "min_risk_weights.png"))
 
     # --------------- Monte Carlo Simulations ---------------
     # Calculate Monte Carlo simulations
-    optimized_portfolio_paths = simulate_portfolio_returns(INITIAL_VALUE, optimized_portfolio_return, optimized_portfolio_risk, TOTAL_TIME, STEP_SIZE, SIMS)
-    even_portfolio_paths = simulate_portfolio_returns(INITIAL_VALUE, even_return, even_risk, TOTAL_TIME, STEP_SIZE, SIMS)
+    optimized_portfolio_paths = simulate_portfolio_returns(INITIAL_VALUE, optimized_portfolio_return, optimized_portfolio_risk, TOTAL_TIME, STEP_SIZE, SIMS, method=MC_METHOD)
+    even_portfolio_paths = simulate_portfolio_returns(INITIAL_VALUE, even_return, even_risk, TOTAL_TIME, STEP_SIZE, SIMS, method=MC_METHOD)
     
     # Plot simulation visuals
     even_portfolio_sims_title = f"Portfolio Simulations Using Even Weights"
     optimized_portfolio_sims_title = f"Portfolio Simulations Using Optimal Weights"
-    plot_monte_carlo_all(even_portfolio_paths, even_portfolio_sims_title)
-    plot_monte_carlo_all(optimized_portfolio_paths, optimized_portfolio_sims_title)
+    figures.append((plot_monte_carlo_all, (even_portfolio_paths, even_portfolio_sims_title), {"style": MC_PLOT_STYLE}, "even_simulations.png"))
+    figures.append((plot_monte_carlo_all, (optimized_portfolio_paths, optimized_portfolio_sims_title), {"style": MC_PLOT_STYLE}, "optimized_simulations.png"))
     
     even_portfolio_avg_title = f"Average Portfolio Performance Using Even Weights"
     optimized_portfolio_avg_title = f"Average Portfolio Performance Using Optimal Weights"
-    plot_monte_carlo_avg(even_portfolio_paths, even_portfolio_avg_title)
-    plot_monte_carlo_avg(optimized_portfolio_paths, optimized_portfolio_avg_title)
+    figures.append((plot_monte_carlo_avg, (even_portfolio_paths, even_portfolio_avg_title), {}, "even_average.png"))
+    figures.append((plot_monte_carlo_avg, (optimized_portfolio_paths, optimized_portfolio_avg_title), {}, "optimized_average.png"))
 
     # --------------- Efficient Frontier ---------------
     # Get the efficient frontier data points
-    ef_returns, ef_risks, ef_sharp_ratios = get_efficient_frontier_data(returns, cov_matrix, RISK_FREE_RETURN, MIN_RETURN, MAX_RETURN, NUM_RETURNS)
-    max_sharpe_ratio = max(ef_sharp_ratios)
-    max_sharpe_ratio_index = ef_sharp_ratios.index(max_sharpe_ratio)
+    if EF_SAMPLING == "adaptive":
+        ef_returns, ef_risks, ef_sharp_ratios = get_adaptive_frontier_data(returns, cov_matrix, RISK_FREE_RETURN, EF_TOLERANCE, max_points=NUM_RETURNS, method=EF_METHOD)
+    else:
+        ef_returns, ef_risks, ef_sharp_ratios = get_efficient_frontier_data(returns, cov_matrix, RISK_FREE_RETURN, MIN_RETURN, MAX_RETURN, NUM_RETURNS, method=EF_METHOD)
+    # The max Sharpe ratio portfolio is solved for directly so it doesn't depend on the frontier's grid
+    max_sharpe_weights = optimize_max_sharpe(returns, cov_matrix, RISK_FREE_RETURN)
+    if max_sharpe_weights is None:
+        # No asset returns more than the risk free rate, so there is no tangency portfolio to plot
+        print("No portfolio has a positive Sharpe ratio, the max Sharpe ratio portfolio is not shown")
+        max_sharpe_ratio, max_sharpe_point = None, None
+    else:
+        max_sharpe_return, max_sharpe_risk = portfolio_return_and_risk(returns, cov_matrix, max_sharpe_weights)
+        max_sharpe_ratio = portfolio_sharpe_ratio(max_sharpe_return, max_sharpe_risk, RISK_FREE_RETURN)
+        max_sharpe_point = (max_sharpe_risk, max_sharpe_return)
     # Get random portfolios
     random_returns, random_risks = get_random_portfolios(returns, cov_matrix, RANDOM_PORTFOLIOS)
 
-    plot_random_portfolios_with_EF(ef_risks, ef_returns, max_sharpe_ratio, max_sharpe_ratio_index, random_risks, random_returns)
-    plot_scatter(ef_returns, ef_sharp_ratios, line=True, xlabel="Return", ylabel="Sharpe Ratio", title="Sharpe Ratio vs Return")
-    plot_scatter(ef_risks, ef_sharp_ratios, line=True, xlabel="Risk", ylabel="Sharpe Ratio", title="Sharpe Ratio vs Risk")
+    figures.append((plot_random_portfolios_with_EF, (ef_risks, ef_returns, max_sharpe_ratio, max_sharpe_point, random_risks, random_returns), {}, "efficient_frontier.png"))
+    figures.append((plot_scatter, (ef_returns, ef_sharp_ratios), {"line": True, "xlabel": "Return", "ylabel": "Sharpe Ratio", "title": "Sharpe Ratio vs Return"}, "sharpe_vs_return.png"))
+    figures.append((plot_scatter, (ef_risks, ef_sharp_ratios), {"line": True, "xlabel": "Risk", "ylabel": "Sharpe Ratio", "title": "Sharpe Ratio vs Risk"}, "sharpe_vs_risk.png"))
+
+    # --------------- Figures ---------------
+    if HEADLESS:
+        os.makedirs(FIGURES_DIR, exist_ok=True)
+        jobs = [(plot, args, {**kwargs, "save_path": os.path.join(FIGURES_DIR, file_name)}) for plot, args, kwargs, file_name in figures]
+        for path in render_figures(jobs):
+            print(f"Saved {path}")
+    else:
+        for plot, args, kwargs, _ in figures:
+            plot(*args, **kwargs)
+
+    # --------------- Instrumentation ---------------
+    if instrumentation.is_enabled():
+        instrumentation.disable()
+        for name, totals in instrumentation.summarize().items():
+            print(f"{name}: {totals['calls']} calls, {totals['duration']:.3f} s")
+        if METRICS_PATH:
+            instrumentation.write_metrics(METRICS_PATH)
+        if PROFILE_PATH:
+            instrumentation.write_profile(PROFILE_PATH)
+
+def screen(tickers):
+    """
+    Ranks random universes drawn from tickers and prints the best ones. Results are also written to SCREEN_OUTPUT.
+    """
+    downloader = BulkDownloader(max_workers=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES)
+    closes = get_closes(tickers, TOTAL_DAYS_BACK, cache_dir=CACHE_DIR, offline=OFFLINE, downloader=downloader, drop_missing=True)
+    index = build_universe_index(closes, UNIVERSE_INDEX_DIR)
+    universes = random_universes(index.tickers, ASSETS, SCREEN_UNIVERSES)
+    results = screen_universes(index, universes, SCREEN_OUTPUT, risk_free_return=RISK_FREE_RETURN, rank_by=SCREEN_RANK_BY)
+    print(results.head(10).to_string(index=False))
+
+def select(tickers):
+    """
+    Picks the ASSETS tickers whose long-only portfolio scores best by SELECTION_OBJECTIVE.
+    """
+    downloader = BulkDownloader(max_workers=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES)
+    closes = get_closes(tickers, TOTAL_DAYS_BACK, cache_dir=CACHE_DIR, offline=OFFLINE, downloader=downloader, drop_missing=True)
+    returns, cov_matrix = compute_asset_statistics(closes)
+    selected, _, value = select_assets(returns, cov_matrix, ASSETS, SELECTION_OBJECTIVE, RISK_FREE_RETURN, method=SELECTION_METHOD)
+    print(f"Selected by {SELECTION_OBJECTIVE} ({value:.3f})")
+    return closes.columns[selected].tolist()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,6 +1,14 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+from covariance import covariance_factor
+from instrumentation import timed
 
-def simulate_portfolio_returns(initial_value, expected_return, expected_risk, total_time, step_size, sims):
+# Ways of drawing the standard normal shocks, see simulate_portfolio_returns
+SAMPLING_METHODS = ("plain", "antithetic", "moment_matching", "sobol")
+
+@timed
+def simulate_portfolio_returns(initial_value, expected_return, expected_risk, total_time, step_size, sims, seed=None, method="plain"):
     """
     Function simulates a portfolios performance based on its expected return and risk.
 
@@ -11,20 +19,30 @@ def simulate_portfolio_returns(initial_value, expected_return, expected_risk, to
         total_time (float): Total time period simulated, in years.
         step_size (float): Time difference of each incriment, in years.
         sims (int): Number of simulations computed.
+        seed (int or np.random.Generator): Seed for the random draws.
+        method (str): How the shocks are drawn, which changes how accurate estimates from the paths are:
+            - "plain": independent draws.
+            - "antithetic": every second path uses the negated shocks of the path before it.
+            - "moment_matching": the shocks of each step are rescaled to exactly mean 0 and standard deviation 1.
+            - "sobol": scrambled Sobol points turned into shocks with a Brownian bridge, so the first and
+            best spread out dimensions decide the final value and the coarse shape of each path. Works best
+            when sims is a power of 2.
 
     Returns:
         portfolio_paths (np.ndarray) of shape (sims, total_steps + 1): Each row is one path of the potfolio's
         value, there are sims amount of them. Each column is the porfolio value at that given timestep.
     """
+    rng = np.random.default_rng(seed)
+
     # Time incriments
     total_steps = int(total_time / step_size)
-    
+
     # Initialize blank portfolio paths starting at initia_value
     portfolio_paths = np.empty((sims, total_steps + 1))
     portfolio_paths[:, 0] = initial_value
-    
+
     # Random samples of the standard normal distribution, for the Brownian motion: Z ~ N(0, 1)
-    Z = np.random.normal(0, 1, (sims, total_steps))
+    Z = _standard_normal_shocks(rng, sims, total_steps, method)
 
     # Compute log returns
     drift = (expected_return - 0.5 * expected_risk**2) * step_size
@@ -34,4 +52,402 @@ def simulate_portfolio_returns(initial_value, expected_return, expected_risk, to
     # Fill the portfolio paths
     portfolio_paths[:, 1:] = portfolio_paths[:, [0]] * np.exp(np.cumsum(log_returns, axis=1))
 
-    return portfolio_paths
\ No newline at end of file
+    return portfolio_paths
+
+@timed
+def simulate_portfolio_estimates(initial_value, expected_return, expected_risk, total_time, step_size, sims,
+                                 method="plain", control_variate=False, confidence_level=0.95, batches=16, seed=None):
+    """
+    Simulates paths like simulate_portfolio_returns and estimates the mean final value and the value at
+    risk, each with its standard error, so the number of simulations can be chosen for a given accuracy.
+
+    The simulations are split into batches that each use their own random stream (and their own Sobol
+    scrambling), so the batch estimates are independent. The standard error is the spread of the batch
+    estimates divided by the square root of the number of batches.
+
+    Args:
+        initial_value (float): Starting value of the portfolio.
+        expected_return (float): Expected portfolio return.
+        expected_risk (float): Expected portfolio risk (standard deviation of returns).
+        total_time (float): Total time period simulated, in years.
+        step_size (float): Time difference of each incriment, in years.
+        sims (int): Number of simulations computed, split evenly between the batches, so a multiple of batches.
+        method (str): How the shocks are drawn, see simulate_portfolio_returns.
+        control_variate (bool): Setting to True corrects both estimates with the final value of each path's
+        Brownian motion, whose mean and quantiles are known in closed form. Each estimate is shifted by how
+        far the same estimate of the Brownian motion is from its exact value, scaled by a coefficient fitted
+        on the batches. Skipped when expected_risk is 0, since every path is then the same.
+        confidence_level (float): Confidence level of the value at risk.
+        batches (int): Number of independent batches, at least 2.
+        seed (int or np.random.SeedSequence): Seed for the random draws.
+
+    Returns:
+        dict: Estimates from every path.
+            - paths (np.ndarray): Portfolio paths in the same layout as simulate_portfolio_returns.
+            - mean_terminal_value (float): Average final portfolio value.
+            - mean_standard_error (float): Standard error of mean_terminal_value.
+            - value_at_risk (float): Loss from the initial value that is only exceeded with probability
+            1 - confidence_level.
+            - value_at_risk_standard_error (float): Standard error of value_at_risk.
+
+    Raises:
+        ValueError: If batches is below 2 or sims isn't a positive multiple of batches.
+    """
+    if batches < 2:
+        raise ValueError(f"At least 2 batches are needed for a standard error, got {batches}")
+    if sims < batches or sims % batches:
+        raise ValueError(f"sims must be a positive multiple of batches, got {sims} sims and {batches} batches")
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    batch_size = sims // batches
+    paths = np.concatenate([
+        simulate_portfolio_returns(initial_value, expected_return, expected_risk, total_time, step_size, batch_size,
+                                   seed=np.random.default_rng(batch_seed), method=method)
+        for batch_seed in seed_sequence.spawn(batches)
+    ])
+
+    terminal_values = paths[:, -1].reshape(batches, batch_size)
+    tail_probability = 1 - confidence_level
+    estimates = {
+        "mean": (terminal_values.mean(), terminal_values.mean(axis=1)),
+        "value_at_risk": (initial_value - np.quantile(terminal_values, tail_probability),
+                          initial_value - np.quantile(terminal_values, tail_probability, axis=1)),
+    }
+
+    if control_variate and expected_risk > 0:
+        # Final value of the Brownian motion of each path, W_T ~ N(0, T)
+        total_steps = paths.shape[1] - 1
+        drift = (expected_return - 0.5 * expected_risk**2) * step_size * total_steps
+        brownian = (np.log(terminal_values / initial_value) - drift) / expected_risk
+        brownian_std = np.sqrt(step_size * total_steps)
+        controls = {
+            "mean": (brownian.mean(), brownian.mean(axis=1), 0.0),
+            "value_at_risk": (-np.quantile(brownian, tail_probability), -np.quantile(brownian, tail_probability, axis=1),
+                              -brownian_std * _standard_normal_quantile(tail_probability)),
+        }
+        for name, (estimate, batch_estimates) in estimates.items():
+            control, batch_controls, exact_control = controls[name]
+            coefficient = np.cov(batch_estimates, batch_controls)[0, 1] / np.var(batch_controls, ddof=1)
+            estimates[name] = (estimate - coefficient * (control - exact_control),
+                               batch_estimates - coefficient * (batch_controls - exact_control))
+
+    standard_errors = {name: np.std(batch_estimates, ddof=1) / np.sqrt(batches) for name, (_, batch_estimates) in estimates.items()}
+    return {
+        "paths": paths,
+        "mean_terminal_value": float(estimates["mean"][0]),
+        "mean_standard_error": float(standard_errors["mean"]),
+        "value_at_risk": float(estimates["value_at_risk"][0]),
+        "value_at_risk_standard_error": float(standard_errors["value_at_risk"]),
+    }
+
+@timed
+def simulate_portfolio_summary(initial_value, expected_return, expected_risk, total_time, step_size, sims,
+                               chunk_size=4096, quantiles=(0.05, 0.5, 0.95), confidence_level=0.95,
+                               bins=1024, dtype=np.float64, seed=None):
+    """
+    Simulates the same paths as simulate_portfolio_returns but only keeps summary statistics, so
+    memory stays the same for any number of simulations. Paths are generated in chunks of
+    chunk_size and every chunk reuses the same buffers.
+
+    Quantiles are estimated from a histogram of the log portfolio value at each time step. The bins
+    at each step span 8 standard deviations either side of the expected log value, so quantile
+    estimates are accurate to within one bin width.
+
+    Args:
+        initial_value (float): Starting value of the portfolio.
+        expected_return (float): Expected portfolio return.
+        expected_risk (float): Expected portfolio risk (standard deviation of returns).
+        total_time (float): Total time period simulated, in years.
+        step_size (float): Time difference of each incriment, in years.
+        sims (int): Number of simulations computed.
+        chunk_size (int): Number of paths simulated at once.
+        quantiles (tuple): Quantiles of the portfolio value reported at each time step.
+        confidence_level (float): Confidence level of the value at risk and conditional value at risk.
+        bins (int): Number of histogram bins per time step.
+        dtype (np.dtype): np.float64, or np.float32 to halve the memory of each chunk.
+        seed (int or np.random.Generator): Seed for the random draws. The same seed gives the same
+        paths as simulate_portfolio_returns, whatever the chunk size.
+
+    Returns:
+        dict: Summary of the simulations.
+            - mean_path (np.array): Average portfolio value at each time step (1D array).
+            - quantile_paths (np.array): Portfolio value at each quantile (rows) and time step (columns) (2D array).
+            - terminal_counts (np.array): Histogram counts of the final portfolio values (1D array).
+            - terminal_edges (np.array): Bin edges of the final portfolio value histogram (1D array).
+            - min_terminal_value (float): Lowest final portfolio value of any simulation.
+            - value_at_risk (float): Loss from the initial value that is only exceeded with probability
+            1 - confidence_level.
+            - conditional_value_at_risk (float): Average loss in the worst 1 - confidence_level of simulations.
+            - mean_max_drawdown (float): Average over simulations of the largest fall from a previous peak,
+            as a fraction of the peak.
+            - worst_max_drawdown (float): Largest max drawdown of any simulation.
+    """
+    rng = np.random.default_rng(seed)
+    total_steps = int(total_time / step_size)
+    chunk_size = min(chunk_size, sims)
+    drift = (expected_return - 0.5 * expected_risk**2) * step_size
+    diffusion = expected_risk * np.sqrt(step_size)
+
+    # Histogram grid of the log growth at each step, centered on its expected value. Without risk every
+    # path is the same, so the grid gets a tiny width around that value instead of zero width bins.
+    steps = np.arange(1, total_steps + 1)
+    half_widths = np.maximum(8 * diffusion * np.sqrt(steps), 1e-12 * np.maximum(1, np.abs(drift * steps)))
+    bin_widths = 2 * half_widths / bins
+    bin_starts = drift * steps - half_widths
+    bin_offsets = np.arange(total_steps) * bins
+
+    counts = np.zeros(total_steps * bins, dtype=np.int64)
+    terminal_value_sums = np.zeros(bins)
+    growth_sums = np.zeros(total_steps)
+    min_log_growth = np.inf
+    drawdown_sum = 0.0
+    worst_drawdown = 0.0
+
+    # Buffers reused by every chunk
+    log_growth = np.empty((chunk_size, total_steps), dtype=dtype)
+    scratch = np.empty((chunk_size, total_steps), dtype=dtype)
+    bin_index = np.empty((chunk_size, total_steps), dtype=np.int64)
+
+    for start in range(0, sims, chunk_size):
+        size = min(chunk_size, sims - start)
+        chunk_growth, chunk_scratch, chunk_index = log_growth[:size], scratch[:size], bin_index[:size]
+
+        # Log returns, then cumulative log growth, all in place
+        rng.standard_normal(out=chunk_growth, dtype=dtype)
+        chunk_growth *= diffusion
+        chunk_growth += drift
+        np.cumsum(chunk_growth, axis=1, out=chunk_growth)
+
+        # Histogram of every step at once by offsetting each step's bins
+        np.subtract(chunk_growth, bin_starts, out=chunk_scratch)
+        chunk_scratch /= bin_widths
+        np.clip(chunk_scratch, 0, bins - 1, out=chunk_scratch)
+        chunk_index[...] = chunk_scratch
+        chunk_index += bin_offsets
+        counts += np.bincount(chunk_index.ravel(), minlength=total_steps * bins)
+
+        # Max drawdown in log space: running peak (including the start) minus the current value
+        np.maximum.accumulate(chunk_growth, axis=1, out=chunk_scratch)
+        np.maximum(chunk_scratch, 0, out=chunk_scratch)
+        chunk_scratch -= chunk_growth
+        max_drawdowns = 1 - np.exp(-chunk_scratch.max(axis=1, initial=0).astype(np.float64))
+        drawdown_sum += max_drawdowns.sum()
+        worst_drawdown = max(worst_drawdown, max_drawdowns.max())
+
+        min_log_growth = min(min_log_growth, float(chunk_growth[:, -1].min()))
+
+        np.exp(chunk_growth, out=chunk_growth)
+        growth_sums += chunk_growth.sum(axis=0, dtype=np.float64)
+        terminal_bins = chunk_index[:, -1] - bin_offsets[-1]
+        terminal_value_sums += np.bincount(terminal_bins, weights=chunk_growth[:, -1], minlength=bins)
+
+    counts = counts.reshape(total_steps, bins)
+    mean_path = initial_value * np.concatenate([[1.0], growth_sums / sims])
+
+    quantile_paths = np.empty((len(quantiles), total_steps + 1))
+    quantile_paths[:, 0] = initial_value
+    for step in range(total_steps):
+        log_quantiles = _histogram_quantiles(counts[step], bin_starts[step], bin_widths[step], quantiles)
+        quantile_paths[:, step + 1] = initial_value * np.exp(log_quantiles)
+
+    # Value at risk and conditional value at risk from the final step's histogram
+    tail_probability = 1 - confidence_level
+    var_log_growth = _histogram_quantiles(counts[-1], bin_starts[-1], bin_widths[-1], [tail_probability])[0]
+    var_value = initial_value * np.exp(var_log_growth)
+    cvar_value = initial_value * _tail_mean(counts[-1], terminal_value_sums, bin_starts[-1], bin_widths[-1], var_log_growth, tail_probability * sims)
+
+    terminal_edges = initial_value * np.exp(bin_starts[-1] + bin_widths[-1] * np.arange(bins + 1))
+
+    return {
+        "mean_path": mean_path,
+        "quantile_paths": quantile_paths,
+        "terminal_counts": counts[-1],
+        "terminal_edges": terminal_edges,
+        "min_terminal_value": initial_value * np.exp(min_log_growth),
+        "value_at_risk": initial_value - var_value,
+        "conditional_value_at_risk": initial_value - cvar_value,
+        "mean_max_drawdown": drawdown_sum / sims,
+        "worst_max_drawdown": worst_drawdown,
+    }
+
+@timed
+def simulate_multi_asset_portfolio(initial_value, weights, returns, cov_matrix, total_time, step_size, sims,
+                                   rebalance_every=None, block_size=1000, workers=None, seed=None):
+    """
+    Simulates a portfolio's performance by simulating every asset, instead of treating the portfolio
+    as a single asset like simulate_portfolio_returns. Each asset follows geometric Brownian motion
+    with its own expected return, and the daily shocks are correlated through the covariance matrix.
+
+    The simulations are split into blocks of block_size paths that run in a process pool. Each block
+    gets its own random stream spawned from the seed, so the result only depends on the seed and
+    block_size, not on the number of workers.
+
+    Args:
+        initial_value (float): Starting value of the portfolio.
+        weights (np.array): Portfolio weights for each asset (1D array).
+        returns (np.array): Expected returns for each asset (1D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        total_time (float): Total time period simulated, in years.
+        step_size (float): Time difference of each incriment, in years.
+        sims (int): Number of simulations computed.
+        rebalance_every (int): Number of steps between resetting the holdings to the weights, None
+        buys once and holds.
+        block_size (int): Number of paths simulated by each task.
+        workers (int): Number of worker processes, None uses every core and 1 runs in this process.
+        seed (int or np.random.SeedSequence): Seed for the random draws.
+
+    Returns:
+        portfolio_paths (np.ndarray) of shape (sims, total_steps + 1): Each row is one path of the potfolio's
+        value, in the same layout as simulate_portfolio_returns.
+    """
+    total_steps = int(total_time / step_size)
+    weights = np.asarray(weights, dtype=float)
+    returns = np.asarray(returns, dtype=float)
+
+    # Correlated shocks are standard normal draws times the transposed covariance factor
+    shock_matrix = covariance_factor(cov_matrix) * np.sqrt(step_size)
+    drifts = (returns - 0.5 * np.diag(cov_matrix)) * step_size
+
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    block_sizes = [min(block_size, sims - start) for start in range(0, sims, block_size)]
+    tasks = [(block_seed, size, initial_value, weights, drifts, shock_matrix, total_steps, rebalance_every)
+             for block_seed, size in zip(seed_sequence.spawn(len(block_sizes)), block_sizes)]
+
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(tasks) == 1:
+        blocks = [_simulate_multi_asset_block(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            blocks = list(executor.map(_simulate_multi_asset_block, tasks))
+
+    return np.concatenate(blocks)
+
+@timed
+def simulate_asset_returns(returns, cov_matrix, total_time, sims, seed=None):
+    """
+    Simulates the returns of every asset over a period, as scenarios for optimization.optimize_cvar.
+    Each asset follows geometric Brownian motion with the same drift and correlated shocks as
+    simulate_multi_asset_portfolio, and only the total return over the period is drawn.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        total_time (float): Total time period simulated, in years.
+        sims (int): Number of scenarios.
+        seed (int or np.random.Generator): Seed for the random draws.
+
+    Returns:
+        np.array: Simple return of each asset over the period, one row per scenario (2D array).
+    """
+    rng = np.random.default_rng(seed)
+    drifts = (np.asarray(returns, dtype=float) - 0.5 * np.diag(cov_matrix)) * total_time
+    log_returns = rng.standard_normal((sims, len(drifts))) @ (covariance_factor(cov_matrix) * np.sqrt(total_time))
+    return np.expm1(log_returns + drifts)
+
+def _simulate_multi_asset_block(task):
+    """
+    Simulates one block of multi-asset portfolio paths. Takes a single tuple so it can be mapped
+    over a process pool.
+    """
+    block_seed, size, initial_value, weights, drifts, shock_matrix, total_steps, rebalance_every = task
+    rng = np.random.default_rng(block_seed)
+
+    portfolio_paths = np.empty((size, total_steps + 1))
+    portfolio_paths[:, 0] = initial_value
+    holdings = initial_value * np.tile(weights, (size, 1))
+
+    for step in range(1, total_steps + 1):
+        log_returns = rng.standard_normal((size, len(weights))) @ shock_matrix
+        log_returns += drifts
+        holdings *= np.exp(log_returns)
+        portfolio_paths[:, step] = holdings.sum(axis=1)
+
+        if rebalance_every and step % rebalance_every == 0:
+            holdings = portfolio_paths[:, [step]] * weights
+
+    return portfolio_paths
+
+def _histogram_quantiles(counts, bin_start, bin_width, quantiles):
+    """
+    Estimates quantiles from histogram counts, interpolating linearly inside the bin.
+    """
+    cumulative = np.concatenate([[0], np.cumsum(counts)])
+    targets = np.asarray(quantiles) * cumulative[-1]
+    upper = np.clip(np.searchsorted(cumulative, targets, side="left"), 1, len(counts))
+    lower_count = cumulative[upper - 1]
+    bin_counts = np.maximum(counts[upper - 1], 1)
+    fraction = np.clip((targets - lower_count) / bin_counts, 0, 1)
+    return bin_start + bin_width * (upper - 1 + fraction)
+
+def _tail_mean(counts, value_sums, bin_start, bin_width, threshold, tail_count):
+    """
+    Average growth of the tail_count lowest simulations. Whole bins below the threshold use their
+    exact sums and the bin holding the threshold contributes its average value.
+    """
+    threshold_bin = min(int((threshold - bin_start) / bin_width), len(counts) - 1)
+    full_count = counts[:threshold_bin].sum()
+    full_sum = value_sums[:threshold_bin].sum()
+    partial_count = max(tail_count - full_count, 0)
+    if counts[threshold_bin] > 0:
+        full_sum += partial_count * value_sums[threshold_bin] / counts[threshold_bin]
+    return full_sum / max(full_count + partial_count, 1)
+
+def _standard_normal_shocks(rng, sims, total_steps, method):
+    """
+    Draws a (sims, total_steps) array of standard normal shocks with one of the SAMPLING_METHODS.
+    """
+    if method == "plain":
+        return rng.standard_normal((sims, total_steps))
+    elif method == "antithetic":
+        shocks = rng.standard_normal((sims, total_steps))
+        pairs = sims // 2
+        shocks[1:2 * pairs:2] = -shocks[0:2 * pairs:2]
+        return shocks
+    elif method == "moment_matching":
+        shocks = rng.standard_normal((sims, total_steps))
+        if sims > 1:
+            shocks -= shocks.mean(axis=0)
+            shocks /= shocks.std(axis=0)
+        return shocks
+    elif method == "sobol":
+        # scipy is only needed for this method
+        import warnings
+        from scipy.stats import qmc
+        from scipy.special import ndtri
+        sampler = qmc.Sobol(d=total_steps, scramble=True, seed=rng)
+        with warnings.catch_warnings():
+            # Sobol points are best balanced for powers of 2, but any amount is still valid
+            warnings.simplefilter("ignore", UserWarning)
+            uniforms = sampler.random(sims)
+        return _brownian_bridge(ndtri(uniforms))
+    else:
+        raise ValueError(f"Unknown sampling method: {method}")
+
+def _brownian_bridge(normals):
+    """
+    Turns standard normals into the standard normal increments of a Brownian motion, using the first
+    column for the final value and the next columns for midpoints of ever smaller intervals.
+    """
+    sims, total_steps = normals.shape
+    brownian = np.zeros((sims, total_steps + 1))
+    brownian[:, -1] = np.sqrt(total_steps) * normals[:, 0]
+
+    column = 1
+    intervals = [(0, total_steps)]
+    for left, right in intervals:
+        if right - left < 2:
+            continue
+        middle = (left + right) // 2
+        weight = (middle - left) / (right - left)
+        std = np.sqrt((middle - left) * (right - middle) / (right - left))
+        brownian[:, middle] = (1 - weight) * brownian[:, left] + weight * brownian[:, right] + std * normals[:, column]
+        column += 1
+        intervals.extend([(left, middle), (middle, right)])
+
+    return np.diff(brownian, axis=1)
+
+def _standard_normal_quantile(probability):
+    """
+    Quantile of the standard normal distribution.
+    """
+    from scipy.special import ndtri
+    return float(ndtri(probability))
@@ -1,6 +1,11 @@
-import cvxpy as cp
+import time
+import numpy as np
+from covariance import covariance_factor
+from critical_line import critical_line_frontier, interpolate_frontier_weights
+from instrumentation import timed, record_solver_stats, record_event
 
-def optimize_portfolio(returns, cov_matrix, target_return):
+@timed
+def optimize_portfolio(returns, cov_matrix, target_return, method="cvxpy"):
     """
     Calculates the weights of a minimum risk portfolio that has meets 
     a specified target return and does not allow short selling.
@@ -9,10 +14,23 @@ def optimize_portfolio(returns, cov_matrix, target_return):
         returns (np.array): Expected returns for each asset (1D array).
         cov_matrix (np.array): Covariance matrix of asset returns (2D array).
         target_return (float): The minimum expected return of a feasible portfolio.
+        method (str): "cvxpy" builds and solves a cvxpy problem. "critical_line" solves the problem
+        directly in NumPy with the active-set path of the critical line algorithm, stopping as soon as
+        the target return is reached, which avoids cvxpy's problem construction overhead.
 
     Returns:
-        np.array: The optimal portfolio weights for each asset (1D array).
+        np.array: The optimal portfolio weights for each asset (1D array), or None if no
+        portfolio meets the target return.
     """
+    if method == "critical_line":
+        corner_returns, _, corner_weights = critical_line_frontier(returns, cov_matrix, stop_return=target_return)
+        weights = interpolate_frontier_weights(corner_returns, corner_weights, target_return)[0]
+        return None if np.isnan(weights).any() else weights
+    elif method != "cvxpy":
+        raise ValueError(f"Unknown method: {method}")
+
+    # cvxpy takes about a second to import, so it is only imported by the functions that solve with it
+    import cvxpy as cp
     weights = cp.Variable(len(cov_matrix))
     objective = cp.Minimize(cp.quad_form(weights, cov_matrix))
 
@@ -28,5 +46,319 @@ def optimize_portfolio(returns, cov_matrix, target_return):
 
     prob = cp.Problem(objective, constraints)
     prob.solve()
+    record_solver_stats("optimize_portfolio", prob)
+
+    return weights.value
+
+@timed
+def optimize_portfolios(returns, cov_matrix, target_returns, method="critical_line"):
+    """
+    Calculates minimum risk portfolios for many target returns, and optionally many universes, at once.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array), or one row per universe (2D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array), or one per universe (3D array).
+        target_returns (np.array): Target returns (1D array).
+        method (str): "critical_line" finds each universe's frontier once and interpolates every target,
+        "cvxpy" compiles one problem per universe and re-solves it for each target.
+
+    Returns:
+        np.array: Weights with shape (targets, assets), or (universes, targets, assets) when several
+        universes are given. Rows are NaN where no portfolio meets the target return.
+    """
+    returns = np.asarray(returns, dtype=float)
+    cov_matrix = np.asarray(cov_matrix, dtype=float)
+    target_returns = np.atleast_1d(np.asarray(target_returns, dtype=float))
+    if returns.ndim == 2:
+        return np.array([optimize_portfolios(universe_returns, universe_cov, target_returns, method)
+                         for universe_returns, universe_cov in zip(returns, cov_matrix)])
+
+    if method == "critical_line":
+        corner_returns, _, corner_weights = critical_line_frontier(returns, cov_matrix, stop_return=np.min(target_returns))
+        return interpolate_frontier_weights(corner_returns, corner_weights, target_returns)
+    elif method == "cvxpy":
+        frontier_problem = FrontierProblem(returns, cov_matrix)
+        weights = [frontier_problem.solve(target_return) for target_return in target_returns]
+        return np.array([np.full(len(returns), np.nan) if w is None else w for w in weights])
+    else:
+        raise ValueError(f"Unknown method: {method}")
+
+@timed
+def optimize_max_sharpe(returns, cov_matrix, risk_free_return, solver=None):
+    """
+    Calculates the weights of the long-only portfolio with the highest Sharpe ratio (the tangency
+    portfolio) with a single solve, instead of scanning the efficient frontier.
+
+    Maximizing the Sharpe ratio directly is not convex, but with the scaled weights y = w / k, where
+    k is the portfolio's excess return, it becomes the quadratic program
+
+        minimize yᵀ Σ y  subject to  (μ - r_f)ᵀ y = 1, y >= 0
+
+    and the weights are y divided by its sum.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        risk_free_return (float): The risk-free return rate.
+        solver (str): Name of the cvxpy solver to use, None lets cvxpy choose.
+
+    Returns:
+        np.array: The portfolio weights for each asset (1D array), or None if no asset returns more
+        than the risk-free rate, in which case no portfolio has a positive Sharpe ratio.
+    """
+    excess_returns = np.asarray(returns, dtype=float) - risk_free_return
+    if np.all(excess_returns <= 0):
+        return None
+
+    import cvxpy as cp
+    scaled_weights = cp.Variable(len(excess_returns))
+    objective = cp.Minimize(cp.quad_form(scaled_weights, cov_matrix))
+    constraints = [
+        scaled_weights @ excess_returns == 1,
+        scaled_weights >= 0
+    ]
+
+    prob = cp.Problem(objective, constraints)
+    prob.solve(solver=solver)
+    record_solver_stats("optimize_max_sharpe", prob)
+    if prob.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+        return None
+
+    weights = np.clip(scaled_weights.value, 0, None)
+    return weights / weights.sum()
+
+@timed
+def optimize_portfolio_factor(returns, factor_loadings, specific_variances, target_return, solver=None):
+    """
+    Calculates the weights of a minimum risk portfolio like optimize_portfolio, for a covariance
+    matrix given as a factor model B Bᵀ + diag(D). The risk is written as ||Bᵀ w||² + ||sqrt(D) w||²,
+    so the problem only has the k factor exposures and n specific terms instead of an n×n
+    quadratic form, which keeps it fast and well conditioned for universes of thousands of assets.
+    data_processing.get_factor_model_data loads the factor model without building the dense matrix.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array).
+        factor_loadings (np.array): Loadings B of each asset on each factor, shape (assets, factors) (2D array).
+        specific_variances (np.array): Asset specific variances D (1D array).
+        target_return (float): The minimum expected return of a feasible portfolio.
+        solver (str): Name of the cvxpy solver to use, None lets cvxpy choose.
+
+    Returns:
+        np.array: The optimal portfolio weights for each asset (1D array).
+    """
+    import cvxpy as cp
+    weights = cp.Variable(len(returns))
+    factor_exposures = factor_loadings.T @ weights
+    risk = cp.sum_squares(factor_exposures) + cp.sum_squares(cp.multiply(np.sqrt(specific_variances), weights))
+
+    constraints = [
+        cp.sum(weights) == 1,
+        weights >= 0,
+        weights @ returns >= target_return
+    ]
+
+    prob = cp.Problem(cp.Minimize(risk), constraints)
+    prob.solve(solver=solver)
+    record_solver_stats("optimize_portfolio_factor", prob)
 
     return weights.value
+
+class FrontierProblem:
+    """
+    A minimum risk portfolio problem that is built and compiled once and then re-solved for
+    any number of target returns. The target return is a cvxpy Parameter, so after the first
+    solve cvxpy reuses its canonicalization and the solver warm starts from the previous
+    solution.
+
+    With parametric_data=True the expected returns and covariance are Parameters as well, so the
+    same compiled problem can be reused after the asset data changes (see update_data). The
+    covariance then enters the objective through its factor, since cvxpy only allows parameters
+    in a quadratic objective in that form.
+
+    The timings attribute keeps a running total of where the time goes:
+        - compile_time (float): Time cvxpy spent building and canonicalizing the problem.
+        - solver_time (float): Time reported by the solver itself.
+        - total_time (float): Wall time of all solve calls.
+        - solves (int): Number of solves.
+    """
+    def __init__(self, returns, cov_matrix, parametric_data=False, solver=None):
+        """
+        Args:
+            returns (np.array): Expected returns for each asset (1D array).
+            cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+            parametric_data (bool): Setting to True makes the returns and covariance Parameters.
+            solver (str): Name of the cvxpy solver to use, None lets cvxpy choose.
+        """
+        import cvxpy as cp
+        num_assets = len(cov_matrix)
+        self.solver = solver
+        self.parametric_data = parametric_data
+        self.weights = cp.Variable(num_assets)
+        self.target_return = cp.Parameter()
+
+        if parametric_data:
+            self.returns = cp.Parameter(num_assets)
+            self.cov_factor = cp.Parameter((num_assets, num_assets))
+            risk = cp.sum_squares(self.cov_factor @ self.weights)
+            self.update_data(returns, cov_matrix)
+        else:
+            self.returns = returns
+            risk = cp.quad_form(self.weights, cov_matrix)
+
+        # Same constraints as optimize_portfolio
+        constraints = [
+            cp.sum(self.weights) == 1,
+            self.weights >= 0,
+            self.weights @ self.returns >= self.target_return
+        ]
+        self.problem = cp.Problem(cp.Minimize(risk), constraints)
+        self.timings = {"compile_time": 0.0, "solver_time": 0.0, "total_time": 0.0, "solves": 0}
+
+    def update_data(self, returns, cov_matrix):
+        """
+        Replaces the expected returns and covariance matrix without rebuilding the problem.
+        Only available when the problem was created with parametric_data=True.
+        """
+        if not self.parametric_data:
+            raise ValueError("Asset data can only be updated on a problem created with parametric_data=True.")
+        self.returns.value = np.asarray(returns, dtype=float)
+        self.cov_factor.value = covariance_factor(cov_matrix)
+
+    def solve(self, target_return, initial_weights=None):
+        """
+        Calculates the weights of the minimum risk portfolio for a target return.
+
+        Args:
+            target_return (float): The minimum expected return of a feasible portfolio.
+            initial_weights (np.array): Optional starting point for the solver (1D array). By default
+            the solver warm starts from the previous solution.
+
+        Returns:
+            np.array: The optimal portfolio weights for each asset (1D array), or None if there
+            is no feasible portfolio for the target return.
+        """
+        import cvxpy as cp
+        self.target_return.value = target_return
+        if initial_weights is not None:
+            self.weights.value = initial_weights
+
+        start = time.perf_counter()
+        self.problem.solve(solver=self.solver, warm_start=True)
+        self.timings["total_time"] += time.perf_counter() - start
+        self.timings["compile_time"] += self.problem.compilation_time or 0.0
+        self.timings["solver_time"] += self.problem.solver_stats.solve_time or 0.0
+        self.timings["solves"] += 1
+        record_solver_stats("FrontierProblem.solve", self.problem)
+
+        if self.problem.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+            return None
+        return self.weights.value
+
+    def solve_many(self, target_returns):
+        """
+        Solves the problem for each target return in order.
+
+        Args:
+            target_returns (np.array): Target returns (1D array).
+
+        Returns:
+            list: The optimal weights for each target return, None where infeasible.
+        """
+        return [self.solve(target_return) for target_return in target_returns]
+
+@timed
+def optimize_cvar(scenario_returns, target_return, confidence_level=0.95, returns=None, method="cutting_plane", tolerance=1e-8, max_iterations=200):
+    """
+    Calculates the weights of the long-only portfolio with the lowest conditional value at risk (the
+    average loss in the worst 1 - confidence_level of scenarios) that meets a target return, using the
+    linear program of Rockafellar and Uryasev
+
+        minimize α + 1 / ((1 - β) S) Σₛ uₛ  subject to  uₛ >= -rₛᵀ w - α, u >= 0, Σ w = 1, w >= 0, μᵀ w >= target
+
+    where α ends up at the value at risk and uₛ is the loss of scenario s beyond it.
+
+    Args:
+        scenario_returns (np.array): Asset returns of each scenario, one row per scenario, for example
+        historical daily returns from data_processing.get_scenario_returns or simulated returns from
+        monte_carlo.simulate_asset_returns (2D array). Can be a memory mapped array.
+        target_return (float): The minimum expected return of a feasible portfolio, in the same units as returns.
+        confidence_level (float): Confidence level β of the conditional value at risk.
+        returns (np.array): Expected returns for each asset (1D array), by default the mean of the scenarios.
+        method (str): How the linear program is solved with HiGHS:
+            - "cutting_plane": the loss variables are replaced by a single variable bounded below by cuts,
+            each the summed loss of the scenarios beyond α at the previous solution. Every master problem
+            only has assets + 2 variables and one row per cut, and the scenarios are only used to evaluate
+            losses, so it scales to hundreds of thousands of scenarios in little memory (about a second
+            for 100k scenarios of 10 assets).
+            - "lp": the full program with one loss variable per scenario. Its constraint matrix is built
+            sparse, so memory grows with scenarios times assets rather than scenarios squared, but the
+            solve time grows quickly past tens of thousands of scenarios.
+        tolerance (float): Gap between the cutting plane bound and the conditional value at risk at which
+        the "cutting_plane" method stops.
+        max_iterations (int): Most cuts added by the "cutting_plane" method. If the gap is still above
+        the tolerance after them, the best portfolio found is returned and a "cvar_not_converged" event
+        is recorded.
+
+    Returns:
+        np.array: The optimal portfolio weights for each asset (1D array), or None if no portfolio
+        meets the target return.
+    """
+    scenario_returns = np.asarray(scenario_returns, dtype=float)
+    num_scenarios, num_assets = scenario_returns.shape
+    returns = scenario_returns.mean(axis=0) if returns is None else np.asarray(returns, dtype=float)
+    tail_weight = 1 / ((1 - confidence_level) * num_scenarios)
+
+    # scipy is only imported by the CVaR optimizer, like cvxpy by the functions that solve with it
+    from scipy import sparse
+    from scipy.optimize import linprog
+
+    if method == "lp":
+        # Variables: weights, α, then one loss beyond α per scenario
+        costs = np.concatenate([np.zeros(num_assets), [1.0], np.full(num_scenarios, tail_weight)])
+        loss_rows = sparse.hstack([sparse.csr_matrix(-scenario_returns), sparse.csr_matrix(-np.ones((num_scenarios, 1))),
+                                   -sparse.identity(num_scenarios, format="csr")])
+        return_row = sparse.csr_matrix(np.concatenate([-returns, np.zeros(num_scenarios + 1)]))
+        A_ub = sparse.vstack([loss_rows, return_row], format="csr")
+        b_ub = np.concatenate([np.zeros(num_scenarios), [-target_return]])
+        A_eq = sparse.csr_matrix(np.concatenate([np.ones(num_assets), np.zeros(num_scenarios + 1)]))
+        bounds = [(0, None)] * num_assets + [(None, None)] + [(0, None)] * num_scenarios
+
+        result = linprog(costs, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=[1.0], bounds=bounds, method="highs")
+        if result.status != 0:
+            record_event("infeasible_target_return", target_return=float(target_return), error=result.message)
+            return None
+        return np.clip(result.x[:num_assets], 0, None)
+    elif method != "cutting_plane":
+        raise ValueError(f"Unknown method: {method}")
+
+    # Variables: weights, α, θ. Each cut is θ >= tail_weight * Σ_{s in K} (-rₛᵀ w - α) for a set K of scenarios.
+    costs = np.concatenate([np.zeros(num_assets), [1.0, 1.0]])
+    A_eq = np.concatenate([np.ones(num_assets), [0.0, 0.0]])[None, :]
+    bounds = [(0, None)] * num_assets + [(None, None), (0, None)]
+
+    def cut(in_tail):
+        return np.concatenate([-tail_weight * scenario_returns[in_tail].sum(axis=0), [-tail_weight * in_tail.sum(), -1.0]])
+
+    # The cut over every scenario keeps α bounded below from the start
+    cuts = [np.concatenate([-returns, [0.0, 0.0]]), cut(np.ones(num_scenarios, dtype=bool))]
+    best_cvar, best_weights = np.inf, None
+    for _ in range(max_iterations):
+        result = linprog(costs, A_ub=np.array(cuts), b_ub=np.concatenate([[-target_return], np.zeros(len(cuts) - 1)]),
+                         A_eq=A_eq, b_eq=[1.0], bounds=bounds, method="highs")
+        if result.status != 0:
+            record_event("infeasible_target_return", target_return=float(target_return), error=result.message)
+            return None
+
+        weights, value_at_risk = np.clip(result.x[:num_assets], 0, None), result.x[num_assets]
+        losses = -(scenario_returns @ weights)
+        cvar = value_at_risk + tail_weight * np.maximum(losses - value_at_risk, 0).sum()
+        if cvar < best_cvar:
+            best_cvar, best_weights = cvar, weights
+        if best_cvar - result.fun <= tolerance:
+            break
+        cuts.append(cut(losses > value_at_risk))
+    else:
+        record_event("cvar_not_converged", target_return=float(target_return), gap=float(best_cvar - result.fun),
+                     iterations=max_iterations)
+
+    return best_weights
@@ -41,3 +41,68 @@ def portfolio_sharpe_ratio(portfolio_return, portfolio_risk, risk_free_rate):
     
     sharpe_ratio = (portfolio_return - risk_free_rate) / portfolio_risk
     return sharpe_ratio
+
+def portfolio_returns_and_risks(returns, cov_matrix, weights, cov_factor=None):
+    """
+    Calculates the expected returns and risks of many portfolios at once.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        weights (np.array): Weights of each portfolio, shape (portfolios, assets) (2D array).
+        cov_factor (np.array): Optional factor F with F.T @ F equal to cov_matrix, for example the transposed
+        Cholesky factor from covariance.covariance_factor. The risk is then the length of F @ w, which
+        can't come out negative through rounding.
+
+    Returns:
+        tuple: (portfolio_returns, portfolio_risks)
+            - portfolio_returns (np.array): Expected return of each portfolio (1D array).
+            - portfolio_risks (np.array): Risk (standard deviation of returns) of each portfolio (1D array).
+    """
+    weights = np.atleast_2d(weights)
+    portfolio_returns = weights @ returns
+
+    if cov_factor is not None:
+        exposures = weights @ cov_factor.T
+        portfolio_variances = np.einsum("ij,ij->i", exposures, exposures)
+    else:
+        portfolio_variances = np.einsum("ij,ij->i", weights @ cov_matrix, weights)
+    portfolio_risks = np.sqrt(np.maximum(portfolio_variances, 0))
+
+    return portfolio_returns, portfolio_risks
+
+def portfolio_sharpe_ratios(portfolio_returns, portfolio_risks, risk_free_rate):
+    """
+    Calculates the Sharpe ratios of many portfolios at once. Unlike portfolio_sharpe_ratio, a
+    portfolio with zero risk gets NaN instead of raising.
+
+    Args:
+        portfolio_returns (np.array): Expected return of each portfolio (1D array).
+        portfolio_risks (np.array): Risk of each portfolio (1D array).
+        risk_free_rate (float): The risk-free return rate.
+
+    Returns:
+        np.array: The Sharpe ratio of each portfolio (1D array).
+    """
+    portfolio_returns = np.asarray(portfolio_returns, dtype=float)
+    portfolio_risks = np.asarray(portfolio_risks, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(portfolio_risks > 0, (portfolio_returns - risk_free_rate) / portfolio_risks, np.nan)
+
+def portfolio_conditional_value_at_risk(scenario_returns, weights, confidence_level=0.95):
+    """
+    Calculates the conditional value at risk of a portfolio over a set of scenarios, the average loss
+    in the worst 1 - confidence_level of scenarios with the value at risk scenario counted fractionally.
+    This is the objective minimized by optimization.optimize_cvar.
+
+    Args:
+        scenario_returns (np.array): Asset returns of each scenario, one row per scenario (2D array).
+        weights (np.array): Portfolio weights for each asset (1D array).
+        confidence_level (float): Confidence level of the conditional value at risk.
+
+    Returns:
+        float: The conditional value at risk, as a fraction of the portfolio value.
+    """
+    losses = -(scenario_returns @ weights)
+    value_at_risk = np.quantile(losses, confidence_level, method="inverted_cdf")
+    return value_at_risk + np.maximum(losses - value_at_risk, 0).mean() / (1 - confidence_level)
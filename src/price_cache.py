@@ -0,0 +1,180 @@
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from instrumentation import timed
+
+class MissingPriceDataError(LookupError):
+    """
+    Raised in offline mode when the cache does not cover the requested tickers and dates, or when
+    tickers have no prices at all.
+    """
+
+@timed
+def yfinance_downloader(tickers, start, end):
+    """
+    Downloads daily closing prices from Yahoo Finance.
+
+    Args:
+        tickers (list): List of assets.
+        start (datetime): First date, inclusive.
+        end (datetime): Last date, exclusive.
+
+    Returns:
+        pd.DataFrame: Closing prices indexed by date with one column per ticker that downloaded.
+        Tickers that failed are left out.
+    """
+    if not has_weekdays(start, end):
+        # yfinance reports a range without trading days as failed, but there is nothing to download
+        return pd.DataFrame(columns=tickers, index=pd.DatetimeIndex([]), dtype=float)
+
+    # Imported here so runs that only read the cache don't pay for importing yfinance
+    import yfinance as yf
+    closes = yf.download(tickers, start=start, end=end)["Close"]
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(tickers[0])
+    # yfinance returns failed tickers as all NaN columns
+    return closes.dropna(axis=1, how="all")
+
+def has_weekdays(start, end):
+    """
+    Checks if a date range has any weekdays, the only days that can have closing prices.
+
+    Args:
+        start (datetime): First date, inclusive.
+        end (datetime): Last date, exclusive.
+    """
+    return np.busday_count(np.datetime64(pd.Timestamp(start).date(), "D"), np.datetime64(pd.Timestamp(end).date(), "D")) > 0
+
+@timed
+def load_closes(tickers, start, end, cache_dir, downloader=yfinance_downloader, offline=False):
+    """
+    Loads daily closing prices, downloading only the dates that are not already cached on disk.
+
+    Each ticker is stored in its own NPZ file in cache_dir holding its dates, closes and the
+    date range that has been downloaded so far. A request only downloads the parts of its range
+    that fall outside that coverage, and tickers that are missing the same range are downloaded
+    together. Today is never marked as covered since its close may not be final yet.
+
+    A ticker missing from the downloader's result failed to download and is not cached, so it is
+    requested again next time. A ticker in the result without any prices, for example over a weekend,
+    downloaded fine and its range is marked as covered.
+
+    Args:
+        tickers (list): List of assets.
+        start (datetime): First date, inclusive.
+        end (datetime): Last date, exclusive.
+        cache_dir (str): Directory of the cache files, created if it doesn't exist.
+        downloader (callable): Function with the same arguments and return value as
+        yfinance_downloader, can be replaced to use another data source. It must leave the tickers
+        that failed out of its result.
+        offline (bool): Setting to True never downloads. Dates after a ticker's cached range are left
+        out, and it raises if a ticker isn't cached or its cache starts after start.
+
+    Returns:
+        pd.DataFrame: Closing prices indexed by date with one column per ticker, in the same
+        order as tickers.
+
+    Raises:
+        MissingPriceDataError: If offline is True and the cache doesn't cover the start of the request.
+    """
+    start = np.datetime64(pd.Timestamp(start).date(), "D")
+    end = np.datetime64(pd.Timestamp(end).date(), "D")
+    today = np.datetime64(datetime.now().date(), "D")
+
+    entries = {ticker: _read_entry(cache_dir, ticker) for ticker in tickers}
+
+    # Group tickers by the date ranges they are missing so they can be downloaded together
+    missing = {}
+    for ticker, entry in entries.items():
+        for missing_range in _missing_ranges(entry, start, end):
+            if offline and entry is not None and missing_range[0] == entry["coverage"][1]:
+                # Newer prices than the cache can't be downloaded offline, so the cached prices are used as they are
+                continue
+            missing.setdefault(missing_range, []).append(ticker)
+
+    if missing and offline:
+        details = ", ".join(f"{tickers_missing} from {range_start} to {range_end}"
+                            for (range_start, range_end), tickers_missing in missing.items())
+        raise MissingPriceDataError(f"Price data is not cached for {details}")
+
+    updated = set()
+    for (range_start, range_end), tickers_missing in missing.items():
+        downloaded = downloader(tickers_missing, pd.Timestamp(range_start).to_pydatetime(), pd.Timestamp(range_end).to_pydatetime())
+        if isinstance(downloaded, pd.Series):
+            downloaded = downloaded.to_frame(tickers_missing[0])
+        for ticker in tickers_missing:
+            if ticker not in downloaded:
+                # Failed downloads are left out by the downloader and must not be marked as covered
+                continue
+            column = downloaded[ticker].dropna()
+            dates = column.index.values.astype("datetime64[D]")
+            closes = column.to_numpy(dtype=float)
+            entries[ticker] = _merge_entry(entries[ticker], dates, closes, range_start, min(range_end, today))
+            updated.add(ticker)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for ticker in updated:
+        entry = entries[ticker]
+        np.savez(_entry_path(cache_dir, ticker), dates=entry["dates"], closes=entry["closes"], coverage=entry["coverage"])
+
+    columns = {}
+    for ticker in tickers:
+        entry = entries[ticker]
+        if entry is None:
+            columns[ticker] = pd.Series(dtype=float)
+            continue
+        in_range = (entry["dates"] >= start) & (entry["dates"] < end)
+        columns[ticker] = pd.Series(entry["closes"][in_range], index=pd.DatetimeIndex(entry["dates"][in_range]))
+
+    closes = pd.DataFrame(columns).sort_index()
+    closes.index.name = "Date"
+    return closes
+
+def _entry_path(cache_dir, ticker):
+    return os.path.join(cache_dir, f"{ticker}.npz")
+
+def _read_entry(cache_dir, ticker):
+    """
+    Reads a ticker's cache file, or returns None if it isn't cached.
+    """
+    path = _entry_path(cache_dir, ticker)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {"dates": data["dates"], "closes": data["closes"], "coverage": data["coverage"]}
+
+def _missing_ranges(entry, start, end):
+    """
+    Calculates the date ranges of a request that are not covered by a cache entry. The ranges
+    always connect to the existing coverage so it stays one continuous range.
+    """
+    if entry is None:
+        return [(start, end)]
+
+    coverage_start, coverage_end = entry["coverage"]
+    ranges = []
+    if start < coverage_start:
+        ranges.append((start, coverage_start))
+    if end > coverage_end:
+        ranges.append((coverage_end, end))
+    return ranges
+
+def _merge_entry(entry, dates, closes, range_start, range_end):
+    """
+    Adds newly downloaded closes to a cache entry and extends its coverage.
+    """
+    if entry is None:
+        entry = {"dates": np.empty(0, dtype="datetime64[D]"), "closes": np.empty(0),
+                 "coverage": np.array([range_start, range_start], dtype="datetime64[D]")}
+
+    # Newly downloaded values replace cached values on the same date
+    keep = ~np.isin(entry["dates"], dates)
+    merged_dates = np.concatenate([entry["dates"][keep], dates])
+    merged_closes = np.concatenate([entry["closes"][keep], closes])
+    order = np.argsort(merged_dates)
+
+    coverage_start, coverage_end = entry["coverage"]
+    coverage = np.array([min(coverage_start, range_start), max(coverage_end, range_end)], dtype="datetime64[D]")
+
+    return {"dates": merged_dates[order], "closes": merged_closes[order], "coverage": coverage}
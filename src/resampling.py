@@ -0,0 +1,161 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from critical_line import critical_line_frontier, interpolate_frontier_weights
+from portfolio_stats import portfolio_returns_and_risks
+from instrumentation import timed
+
+TRADING_DAYS_PER_YEAR = 252
+
+def bootstrap_indices(num_days, resamples, block_size=1, seed=None):
+    """
+    Draws the days of each bootstrap resample. With block_size above 1 this is a circular block
+    bootstrap, which keeps runs of consecutive days together so short term autocorrelation and
+    volatility clustering survive the resampling.
+
+    Args:
+        num_days (int): Number of days in the sample.
+        resamples (int): Number of resamples.
+        block_size (int): Number of consecutive days in each block.
+        seed (int or np.random.Generator): Seed for the random draws.
+
+    Returns:
+        np.array: Day indices of each resample, shape (resamples, num_days) (2D array).
+    """
+    rng = np.random.default_rng(seed)
+    num_blocks = -(-num_days // block_size)
+    starts = rng.integers(0, num_days, (resamples, num_blocks))
+    indices = (starts[:, :, None] + np.arange(block_size)) % num_days
+    return indices.reshape(resamples, -1)[:, :num_days]
+
+@timed
+def bootstrap_statistics(daily_returns, resamples, block_size=1, chunk_size=64, seed=None):
+    """
+    Calculates the annualized expected returns and covariance of many bootstrap resamples of the daily
+    returns, the same statistics as data_processing.compute_asset_statistics with the sample estimator.
+
+    A resample only changes how many times each day is counted, so the resamples are turned into a
+    matrix of day counts and every mean and covariance comes from weighted sums over the original days:
+    one matrix product for all the means and one batched product per chunk of resamples for the second
+    moments, instead of building and estimating each resample separately.
+
+    Args:
+        daily_returns (np.array): Daily returns, one row per day and one column per asset, without NaN
+        (2D array). For example from data_processing.get_scenario_returns.
+        resamples (int): Number of resamples.
+        block_size (int): Number of consecutive days drawn together, see bootstrap_indices.
+        chunk_size (int): Resamples whose second moments are calculated at once. Memory grows with
+        chunk_size times days times assets.
+        seed (int or np.random.Generator): Seed for the random draws.
+
+    Returns:
+        tuple: (returns, cov_matrices)
+            - returns (np.array): Expected returns of each resample, shape (resamples, assets) (2D array).
+            - cov_matrices (np.array): Covariance matrix of each resample, shape (resamples, assets, assets) (3D array).
+    """
+    daily_returns = np.asarray(daily_returns, dtype=float)
+    num_days, num_assets = daily_returns.shape
+    indices = bootstrap_indices(num_days, resamples, block_size, seed)
+
+    # counts[b, t] is the number of times day t is in resample b
+    counts = np.zeros((resamples, num_days))
+    np.add.at(counts, (np.arange(resamples)[:, None], indices), 1)
+
+    means = counts @ daily_returns / num_days
+    cov_matrices = np.empty((resamples, num_assets, num_assets))
+    for start in range(0, resamples, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        weighted_returns = counts[chunk, :, None] * daily_returns
+        second_moments = np.matmul(weighted_returns.transpose(0, 2, 1), daily_returns)
+        cov_matrices[chunk] = (second_moments - num_days * means[chunk, :, None] * means[chunk, None, :]) / (num_days - 1)
+
+    returns = (1 + means) ** TRADING_DAYS_PER_YEAR - 1
+    return returns, cov_matrices * TRADING_DAYS_PER_YEAR
+
+@timed
+def resampled_frontier(daily_returns, num_points=50, resamples=1_000, block_size=1, confidence_level=0.9,
+                       workers=None, seed=None):
+    """
+    Calculates a resampled efficient frontier. Every bootstrap resample of the daily returns gets its own
+    frontier, which is cut into num_points portfolios evenly spaced in return from its minimum risk
+    portfolio to its highest return portfolio. Portfolios of the same rank are averaged over the
+    resamples, which gives weights that change much less with small changes to the data than the
+    frontier of the point estimates.
+
+    The frontiers are found with the critical line algorithm in a process pool, one chunk of resamples
+    per task. Every portfolio is evaluated with the statistics of the full sample, and the bands are
+    the spread of these values over the resamples.
+
+    Args:
+        daily_returns (np.array): Daily returns, one row per day and one column per asset, without NaN (2D array).
+        num_points (int): Number of portfolios on the frontier.
+        resamples (int): Number of bootstrap resamples.
+        block_size (int): Number of consecutive days drawn together, see bootstrap_indices.
+        confidence_level (float): Share of resamples that fall inside the bands.
+        workers (int): Number of worker processes, None uses every core and 1 runs in this process.
+        seed (int or np.random.Generator): Seed for the random draws.
+
+    Returns:
+        dict: The resampled frontier, with one row per return rank from lowest to highest.
+            - weights (np.array): Average weights, shape (num_points, assets) (2D array).
+            - returns (np.array): Expected return of the average weights (1D array).
+            - risks (np.array): Risk of the average weights (1D array).
+            - weights_lower, weights_upper (np.array): Bands of each weight over the resamples (2D arrays).
+            - returns_lower, returns_upper (np.array): Bands of the return of each rank's portfolios (1D arrays).
+            - risks_lower, risks_upper (np.array): Bands of the risk of each rank's portfolios (1D arrays).
+    """
+    daily_returns = np.asarray(daily_returns, dtype=float)
+    full_returns = (1 + daily_returns.mean(axis=0)) ** TRADING_DAYS_PER_YEAR - 1
+    full_cov_matrix = np.cov(daily_returns.T) * TRADING_DAYS_PER_YEAR
+    returns, cov_matrices = bootstrap_statistics(daily_returns, resamples, block_size, seed=seed)
+
+    workers = workers or os.cpu_count()
+    chunk_size = -(-resamples // (4 * workers))
+    tasks = [(returns[start:start + chunk_size], cov_matrices[start:start + chunk_size], num_points)
+             for start in range(0, resamples, chunk_size)]
+    if workers == 1 or len(tasks) == 1:
+        chunks = [_resample_frontiers(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(_resample_frontiers, tasks))
+    weights = np.concatenate(chunks)
+
+    # Every resample's portfolios evaluated with the full sample statistics
+    rank_returns, rank_risks = portfolio_returns_and_risks(full_returns, full_cov_matrix, weights.reshape(-1, weights.shape[-1]))
+    rank_returns = rank_returns.reshape(resamples, num_points)
+    rank_risks = rank_risks.reshape(resamples, num_points)
+
+    average_weights = weights.mean(axis=0)
+    average_returns, average_risks = portfolio_returns_and_risks(full_returns, full_cov_matrix, average_weights)
+    tail = (1 - confidence_level) / 2
+    weights_lower, weights_upper = np.quantile(weights, [tail, 1 - tail], axis=0)
+    returns_lower, returns_upper = np.quantile(rank_returns, [tail, 1 - tail], axis=0)
+    risks_lower, risks_upper = np.quantile(rank_risks, [tail, 1 - tail], axis=0)
+
+    return {
+        "weights": average_weights,
+        "returns": average_returns,
+        "risks": average_risks,
+        "weights_lower": weights_lower,
+        "weights_upper": weights_upper,
+        "returns_lower": returns_lower,
+        "returns_upper": returns_upper,
+        "risks_lower": risks_lower,
+        "risks_upper": risks_upper,
+    }
+
+def _resample_frontiers(task):
+    """
+    Finds the frontier of each resample in a chunk and interpolates it at evenly spaced returns. Takes
+    a single tuple so it can be mapped over a process pool.
+
+    Returns:
+        np.array: Weights with shape (resamples in the chunk, num_points, assets) (3D array).
+    """
+    returns, cov_matrices, num_points = task
+    weights = np.empty((len(returns), num_points, returns.shape[1]))
+    for resample, (resample_returns, cov_matrix) in enumerate(zip(returns, cov_matrices)):
+        corner_returns, _, corner_weights = critical_line_frontier(resample_returns, cov_matrix)
+        target_returns = np.linspace(corner_returns[-1], corner_returns[0], num_points)
+        weights[resample] = interpolate_frontier_weights(corner_returns, corner_weights, target_returns)
+    return weights
@@ -0,0 +1,163 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from critical_line import critical_line_frontier, frontier_max_sharpe
+from instrumentation import timed
+
+# Result columns, and whether a lower value ranks a universe higher
+METRICS = {
+    "min_risk": True,
+    "min_risk_return": False,
+    "max_sharpe_ratio": False,
+    "max_sharpe_return": False,
+    "max_sharpe_risk": True,
+    "value_at_risk": True,
+    "conditional_value_at_risk": True,
+}
+
+# Arrays shared with the current worker process, set by _attach_shared_arrays
+_shared_arrays = {}
+
+def random_universes(tickers, size, amount, seed=None):
+    """
+    Draws random universes, each a sorted list of size different tickers.
+
+    Args:
+        tickers (list): Tickers to choose from.
+        size (int): Number of tickers in each universe.
+        amount (int): Number of universes.
+        seed (int): Seed for the random draws.
+
+    Returns:
+        list: One list of tickers per universe.
+    """
+    rng = np.random.default_rng(seed)
+    return [sorted(rng.choice(tickers, size=size, replace=False).tolist()) for _ in range(amount)]
+
+@timed
+def screen_universes(index, universes, output_path, risk_free_return=0.03, rank_by="max_sharpe_ratio",
+                     monte_carlo_sims=10_000, initial_value=10_000, total_time=1, confidence_level=0.95,
+                     chunk_size=32, workers=None, seed=None):
+    """
+    Calculates the minimum risk and maximum Sharpe ratio portfolios of many universes, and the Monte
+    Carlo tail risk of each maximum Sharpe portfolio, then ranks the universes by one of the metrics.
+
+    The expected returns and covariance of the whole ticker universe are copied once into shared memory,
+    and worker processes slice each universe out of them, so only the positions of the tickers are sent
+    to the workers. Universes are handed out in chunks and each finished chunk is appended to the output
+    file straight away, so the results so far survive if the run is stopped.
+
+    Args:
+        index (UniverseIndex): Statistics of every ticker, see universe_index.build_universe_index.
+        universes (list): Lists of tickers to evaluate, for example from random_universes.
+        output_path (str): CSV file the results are written to, one row per universe.
+        risk_free_return (float): The risk-free return rate.
+        rank_by (str): Metric the returned results are sorted by, one of METRICS.
+        monte_carlo_sims (int): Simulations of the maximum Sharpe portfolio per universe, 0 skips them. Only
+        the final values are needed for the tail metrics, and the log return of geometric Brownian motion
+        over the whole period is normal, so each simulation is a single draw instead of a path.
+        initial_value (float): Starting value of the simulated portfolios.
+        total_time (float): Total time period simulated, in years.
+        confidence_level (float): Confidence level of the value at risk and conditional value at risk.
+        chunk_size (int): Universes sent to a worker at once.
+        workers (int): Number of worker processes, None uses every core and 1 runs in this process.
+        seed (int): Seed for the simulations. Each universe gets its own stream, so results don't depend
+        on the number of workers or the chunk size.
+
+    Returns:
+        pd.DataFrame: One row per universe with its tickers and every metric, best first by rank_by.
+    """
+    if rank_by not in METRICS:
+        raise ValueError(f"Unknown metric: {rank_by}")
+
+    positions = [index.indices(universe) for universe in universes]
+    seeds = np.random.SeedSequence(seed).spawn(len(universes))
+    settings = (risk_free_return, monte_carlo_sims, initial_value, total_time, confidence_level)
+    tasks = [(list(range(start, min(start + chunk_size, len(universes)))), positions[start:start + chunk_size],
+              seeds[start:start + chunk_size], settings) for start in range(0, len(universes), chunk_size)]
+
+    with open(output_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["universe", "tickers", *METRICS])
+
+        def write_rows(rows):
+            for universe_number, metrics in rows:
+                writer.writerow([universe_number, " ".join(universes[universe_number]), *metrics])
+            file.flush()
+
+        workers = workers or os.cpu_count()
+        if workers == 1:
+            _shared_arrays.update(returns=np.asarray(index.returns), cov_matrix=np.asarray(index.cov_matrix))
+            try:
+                for task in tasks:
+                    write_rows(_screen_chunk(task))
+            finally:
+                _shared_arrays.clear()
+        else:
+            blocks = []
+            try:
+                for name in ["returns", "cov_matrix"]:
+                    array = np.asarray(getattr(index, name))
+                    block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+                    blocks.append(block)
+                    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                layout = {name: (block.name, getattr(index, name).shape, getattr(index, name).dtype.str)
+                          for name, block in zip(["returns", "cov_matrix"], blocks)}
+                with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_arrays, initargs=(layout,)) as executor:
+                    for future in as_completed([executor.submit(_screen_chunk, task) for task in tasks]):
+                        write_rows(future.result())
+            finally:
+                for block in blocks:
+                    block.close()
+                    block.unlink()
+
+    results = pd.read_csv(output_path).sort_values(rank_by, ascending=METRICS[rank_by], kind="stable")
+    return results.reset_index(drop=True)
+
+def _attach_shared_arrays(layout):
+    """
+    Worker initializer that maps the shared blocks as arrays. The blocks are kept referenced for as long
+    as the worker lives, since the arrays would point to freed memory otherwise.
+    """
+    for name, (block_name, shape, dtype) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _shared_arrays[name + "_block"] = block
+        _shared_arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+def _screen_chunk(task):
+    """
+    Calculates the metrics of a chunk of universes from the shared arrays.
+
+    Returns:
+        list: (universe number, metrics in the order of METRICS) for each universe.
+    """
+    universe_numbers, positions, seeds, (risk_free_return, monte_carlo_sims, initial_value, total_time, confidence_level) = task
+    rows = []
+    for universe_number, universe_positions, universe_seed in zip(universe_numbers, positions, seeds):
+        returns = _shared_arrays["returns"][universe_positions]
+        cov_matrix = _shared_arrays["cov_matrix"][np.ix_(universe_positions, universe_positions)]
+
+        corner_returns, corner_risks, corner_weights = critical_line_frontier(returns, cov_matrix)
+        max_sharpe_weights = frontier_max_sharpe(corner_returns, corner_weights, cov_matrix, risk_free_return)
+        if max_sharpe_weights is None:
+            max_sharpe_return = max_sharpe_risk = max_sharpe_ratio = np.nan
+        else:
+            max_sharpe_return = max_sharpe_weights @ returns
+            max_sharpe_risk = np.sqrt(max_sharpe_weights @ cov_matrix @ max_sharpe_weights)
+            max_sharpe_ratio = (max_sharpe_return - risk_free_return) / max_sharpe_risk
+
+        value_at_risk = conditional_value_at_risk = np.nan
+        if monte_carlo_sims and max_sharpe_weights is not None:
+            rng = np.random.default_rng(universe_seed)
+            log_growth = rng.normal((max_sharpe_return - 0.5 * max_sharpe_risk**2) * total_time,
+                                    max_sharpe_risk * np.sqrt(total_time), monte_carlo_sims)
+            losses = initial_value * (1 - np.exp(log_growth))
+            value_at_risk = np.quantile(losses, confidence_level)
+            conditional_value_at_risk = losses[losses >= value_at_risk].mean()
+
+        rows.append((universe_number, [corner_risks[-1], corner_returns[-1], max_sharpe_ratio, max_sharpe_return,
+                                       max_sharpe_risk, value_at_risk, conditional_value_at_risk]))
+    return rows
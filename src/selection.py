@@ -0,0 +1,320 @@
+import itertools
+import numpy as np
+from critical_line import critical_line_frontier, frontier_max_sharpe
+from instrumentation import timed
+
+# What select_assets optimizes, and the ways it can search
+OBJECTIVES = ("min_risk", "max_sharpe")
+SELECTION_METHODS = ("forward", "backward", "exact", "brute_force")
+
+# Weights below this are treated as not held
+WEIGHT_TOLERANCE = 1e-9
+
+@timed
+def select_assets(returns, cov_matrix, num_selected, objective="min_risk", risk_free_return=0.03, method="forward",
+                  local_search=True, max_passes=10):
+    """
+    Chooses the num_selected assets whose long-only portfolio has the lowest risk or highest Sharpe
+    ratio. Trying every subset grows combinatorially, so the heuristic methods build the subset one
+    asset at a time and score every candidate move at once:
+
+        - "forward": starts empty and adds the asset that improves the objective most.
+        - "backward": starts with every asset, drops the ones the long-only optimum doesn't hold, then
+        removes the asset whose loss hurts least.
+
+    Without the long-only constraint, the best portfolio of a subset is Σ⁻¹ v normalized, with v a
+    vector of ones for the minimum risk and the excess returns for the maximum Sharpe ratio. Adding or
+    removing an asset is a rank one update of Σ⁻¹, so every candidate's unconstrained portfolio comes
+    from one matrix product. When that portfolio has no negative weights it is also the long-only
+    optimum and its score is exact. Only the other candidates are solved with the critical line algorithm.
+
+    With local_search, the subset is then improved by swapping one selected asset for one that isn't,
+    using the same updates, until no swap helps.
+
+    The "exact" method is a branch and bound over which assets are held. The bound at each node is the
+    long-only optimum of every asset not yet excluded, since holding more assets can't make the
+    objective worse, and a node is finished once that optimum holds few enough assets. It finds the
+    same subset as "brute_force", which tries every subset, but usually solves far fewer problems.
+    Both are only practical for small universes or num_selected.
+
+    Args:
+        returns (np.array): Expected returns for each asset (1D array).
+        cov_matrix (np.array): Covariance matrix of asset returns (2D array).
+        num_selected (int): Number of assets to select.
+        objective (str): "min_risk" or "max_sharpe".
+        risk_free_return (float): The risk-free return rate, used by "max_sharpe".
+        method (str): One of SELECTION_METHODS.
+        local_search (bool): Setting to True improves a "forward" or "backward" result with swaps.
+        max_passes (int): Most rounds of swaps tried by the local search.
+
+    Returns:
+        tuple: (selected, weights, value)
+            - selected (np.array): Positions of the selected assets, sorted (1D array).
+            - weights (np.array): Long-only portfolio weights of the selected assets, in the same order (1D array).
+            - value (float): Risk of the portfolio for "min_risk", or its Sharpe ratio for "max_sharpe".
+            The Sharpe ratio is -inf if no asset returns more than the risk-free rate.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}")
+    returns = np.asarray(returns, dtype=float)
+    cov_matrix = np.asarray(cov_matrix, dtype=float)
+    num_assets = len(returns)
+    if not 0 < num_selected <= num_assets:
+        raise ValueError(f"Can't select {num_selected} of {num_assets} assets.")
+    # Scores are higher for better subsets: minus the risk, or the Sharpe ratio
+    problem = (returns, cov_matrix, objective, risk_free_return)
+    target = np.ones(num_assets) if objective == "min_risk" else returns - risk_free_return
+
+    if method == "forward":
+        selected = _forward_selection(problem, target, [], num_selected)
+    elif method == "backward":
+        selected = _backward_selection(problem, target, num_selected)
+    elif method == "exact":
+        # The heuristic result lets the search discard most branches from the start
+        start = _swap_search(problem, target, _forward_selection(problem, target, [], num_selected), max_passes)
+        selected = _branch_and_bound(problem, num_selected, start)
+        local_search = False
+    elif method == "brute_force":
+        subsets = itertools.combinations(range(num_assets), num_selected)
+        selected = list(max(subsets, key=lambda subset: _solve_subset(problem, list(subset))[0]))
+        local_search = False
+    else:
+        raise ValueError(f"Unknown method: {method}")
+
+    if local_search:
+        selected = _swap_search(problem, target, selected, max_passes)
+
+    selected = np.sort(selected)
+    score, weights = _solve_subset(problem, list(selected))
+    if weights is None:
+        weights = np.full(len(selected), np.nan)
+    return selected, weights, -score if objective == "min_risk" else score
+
+def _solve_subset(problem, subset):
+    """
+    Solves the long-only problem on a subset with the critical line algorithm.
+
+    Returns:
+        tuple: (score, weights), where weights follow the order of subset and are None if no
+        portfolio of the subset has a positive excess return for "max_sharpe".
+    """
+    returns, cov_matrix, objective, risk_free_return = problem
+    subset = np.asarray(subset, dtype=int)
+    subset_returns = returns[subset]
+    subset_cov = cov_matrix[np.ix_(subset, subset)]
+    corner_returns, corner_risks, corner_weights = critical_line_frontier(subset_returns, subset_cov)
+    if objective == "min_risk":
+        return -corner_risks[-1], corner_weights[-1]
+
+    weights = frontier_max_sharpe(corner_returns, corner_weights, subset_cov, risk_free_return)
+    if weights is None:
+        return -np.inf, None
+    return (weights @ subset_returns - risk_free_return) / np.sqrt(weights @ subset_cov @ weights), weights
+
+def _scores(problem, quadratics, unconstrained_weights, subsets, settled=None, settled_score=-np.inf):
+    """
+    Scores candidate subsets from their unconstrained optimum. Where that optimum has negative weights
+    its score is only an upper bound of the long-only score, so those candidates are solved in order of
+    their bound until no remaining bound beats the best score found.
+
+    Args:
+        quadratics (np.array): vᵀ Σ⁻¹ v of each candidate (1D array).
+        unconstrained_weights (np.array): Σ⁻¹ v of each candidate, one column per candidate (2D array).
+        subsets (callable): Function returning the asset positions of candidate i.
+        settled (np.array): Candidates already known to score settled_score (1D boolean array).
+        settled_score (float): Score of the settled candidates.
+
+    Returns:
+        np.array: Score of each candidate, -inf for candidates that were skipped since they can't be best (1D array).
+    """
+    objective = problem[2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bounds = -1 / np.sqrt(quadratics) if objective == "min_risk" else np.sqrt(quadratics)
+    bounds = np.where(quadratics > 0, bounds, np.inf)
+    exact = np.all(unconstrained_weights >= -WEIGHT_TOLERANCE, axis=0) & (quadratics > 0)
+    scores = np.where(exact, bounds, -np.inf)
+    if settled is not None:
+        scores[settled & ~exact] = settled_score
+        exact |= settled
+
+    best = scores.max(initial=-np.inf)
+    inexact = np.flatnonzero(~exact)
+    for candidate in inexact[np.argsort(-bounds[inexact], kind="stable")]:
+        if bounds[candidate] <= best:
+            break
+        scores[candidate] = _solve_subset(problem, subsets(candidate))[0]
+        best = max(best, scores[candidate])
+    return scores
+
+def _addition_updates(cov_matrix, target, inverse, subset, candidates):
+    """
+    Unconstrained optimum of subset plus each candidate, from the inverse of the subset's covariance.
+
+    Returns:
+        tuple: (quadratics, unconstrained_weights, projections, schur_complements), where projections
+        holds Σ⁻¹ b for each candidate's covariances b with the subset, one column per candidate.
+    """
+    subset = np.asarray(subset, dtype=int)
+    base = inverse @ target[subset]
+    cross_cov = cov_matrix[np.ix_(subset, candidates)]
+    projections = inverse @ cross_cov
+    schur_complements = cov_matrix[candidates, candidates] - np.einsum("ij,ij->j", cross_cov, projections)
+    new_weights = (target[candidates] - cross_cov.T @ base) / schur_complements
+    quadratics = target[subset] @ base + new_weights**2 * schur_complements
+    unconstrained_weights = np.vstack([base[:, None] - projections * new_weights, new_weights])
+    return quadratics, unconstrained_weights, projections, schur_complements
+
+def _add_to_inverse(inverse, projection, schur_complement):
+    """
+    Inverse of the covariance after adding an asset, from the block matrix inverse.
+    """
+    size = len(inverse)
+    updated = np.empty((size + 1, size + 1))
+    updated[:size, :size] = inverse + np.outer(projection, projection) / schur_complement
+    updated[:size, size] = updated[size, :size] = -projection / schur_complement
+    updated[size, size] = 1 / schur_complement
+    return updated
+
+def _remove_from_inverse(inverse, position):
+    """
+    Inverse of the covariance after removing the asset at position.
+    """
+    keep = np.arange(len(inverse)) != position
+    column = inverse[keep, position]
+    return inverse[np.ix_(keep, keep)] - np.outer(column, column) / inverse[position, position]
+
+def _best_addition(problem, target, subset, inverse, excluded=()):
+    """
+    Finds the asset whose addition to subset scores best.
+
+    Returns:
+        tuple: (score, asset, inverse after adding it)
+    """
+    cov_matrix = problem[1]
+    candidates = np.setdiff1d(np.arange(len(target)), np.array([*subset, *excluded], dtype=int))
+    quadratics, unconstrained_weights, projections, schur_complements = _addition_updates(cov_matrix, target, inverse, subset, candidates)
+
+    # Adding an asset the subset's long-only optimum wouldn't buy leaves that optimum unchanged
+    settled, settled_score = None, -np.inf
+    if len(subset) > 0:
+        settled_score, weights = _solve_subset(problem, subset)
+        if weights is not None:
+            settled = _no_gain(problem, subset, weights, candidates)
+    scores = _scores(problem, quadratics, unconstrained_weights, lambda i: [*subset, candidates[i]], settled, settled_score)
+    best = np.argmax(scores)
+    return scores[best], candidates[best], _add_to_inverse(inverse, projections[:, best], schur_complements[best])
+
+def _no_gain(problem, subset, weights, candidates):
+    """
+    Checks which candidates the long-only optimum of subset would give zero weight if they were added,
+    from the optimality conditions: a minimum risk portfolio w only gains from asset j when
+    (Σ w)ⱼ < wᵀ Σ w, and a maximum Sharpe ratio portfolio when eⱼ wᵀ Σ w > (eᵀ w)(Σ w)ⱼ, with e the
+    excess returns. Adding any other candidate leaves the optimum and its score unchanged.
+
+    Returns:
+        np.array: True for candidates that can't improve the score (1D boolean array).
+    """
+    returns, cov_matrix, objective, risk_free_return = problem
+    subset = np.asarray(subset, dtype=int)
+    covariances = cov_matrix[np.ix_(candidates, subset)] @ weights
+    variance = weights @ cov_matrix[np.ix_(subset, subset)] @ weights
+    if objective == "min_risk":
+        return covariances >= variance * (1 - 1e-12)
+    excess_return = weights @ (returns[subset] - risk_free_return)
+    return (returns[candidates] - risk_free_return) * variance <= excess_return * covariances
+
+def _forward_selection(problem, target, subset, num_selected):
+    """
+    Adds the best scoring asset to subset until it holds num_selected assets.
+    """
+    cov_matrix = problem[1]
+    subset = list(subset)
+    inverse = np.linalg.inv(cov_matrix[np.ix_(subset, subset)]) if subset else np.empty((0, 0))
+    while len(subset) < num_selected:
+        _, asset, inverse = _best_addition(problem, target, subset, inverse)
+        subset.append(asset)
+    return subset
+
+def _backward_selection(problem, target, num_selected):
+    """
+    Removes the asset whose loss scores best until num_selected assets are left. Assets the long-only
+    optimum doesn't hold are dropped first, since that costs nothing, and if fewer than num_selected
+    are held the rest are added with forward selection.
+    """
+    cov_matrix = problem[1]
+    _, weights = _solve_subset(problem, list(range(len(target))))
+    held = [] if weights is None else list(np.flatnonzero(weights > WEIGHT_TOLERANCE))
+    if len(held) < num_selected:
+        return _forward_selection(problem, target, held, num_selected)
+
+    subset = held
+    inverse = np.linalg.inv(cov_matrix[np.ix_(subset, subset)])
+    while len(subset) > num_selected:
+        base = inverse @ target[subset]
+        diagonal = np.diag(inverse)
+        quadratics = target[subset] @ base - base**2 / diagonal
+        # Column i is the unconstrained optimum without asset i, where its own entry is zero
+        unconstrained_weights = base[:, None] - inverse * (base / diagonal)
+        scores = _scores(problem, quadratics, unconstrained_weights, lambda i: subset[:i] + subset[i + 1:])
+        position = int(np.argmax(scores))
+        inverse = _remove_from_inverse(inverse, position)
+        del subset[position]
+    return subset
+
+def _swap_search(problem, target, subset, max_passes):
+    """
+    Swaps a selected asset for an unselected one while that improves the score, trying the selected
+    assets in turn and taking the best replacement for each.
+    """
+    cov_matrix = problem[1]
+    subset = list(subset)
+    score = _solve_subset(problem, subset)[0]
+    inverse = np.linalg.inv(cov_matrix[np.ix_(subset, subset)])
+    for _ in range(max_passes):
+        improved = False
+        for position in range(len(subset)):
+            removed = subset[position]
+            rest = subset[:position] + subset[position + 1:]
+            rest_inverse = _remove_from_inverse(inverse, position)
+            swap_score, asset, swap_inverse = _best_addition(problem, target, rest, rest_inverse, excluded=[removed])
+            if swap_score > score + 1e-12:
+                subset, score, inverse = rest + [asset], swap_score, swap_inverse
+                improved = True
+                break
+        if not improved:
+            break
+    return subset
+
+def _branch_and_bound(problem, num_selected, start):
+    """
+    Exact search over subsets, see select_assets, starting from the subset start as the best so far.
+    """
+    num_assets = len(problem[0])
+    best_subset = list(start)
+    best_score = _solve_subset(problem, best_subset)[0]
+    # Each node is (assets that must be held, assets that can't be held)
+    nodes = [((), ())]
+    while nodes:
+        included, excluded = nodes.pop()
+        allowed = [asset for asset in range(num_assets) if asset not in excluded]
+        if len(included) == num_selected:
+            allowed = list(included)
+        if len(allowed) < num_selected:
+            continue
+
+        bound, weights = _solve_subset(problem, allowed)
+        if bound <= best_score + 1e-12:
+            continue
+        held = [asset for asset, weight in zip(allowed, weights) if weight > WEIGHT_TOLERANCE]
+        chosen = sorted(set(held) | set(included))
+        if len(chosen) <= num_selected:
+            # The bound is reached with few enough assets, any others can be added without changing it
+            padding = [asset for asset in allowed if asset not in chosen][:num_selected - len(chosen)]
+            best_score, best_subset = bound, chosen + padding
+            continue
+
+        # Branch on the largest weight that isn't fixed yet, trying to hold it first
+        branch = max((asset for asset in held if asset not in included), key=lambda asset: weights[allowed.index(asset)])
+        nodes.append((included, excluded + (branch,)))
+        nodes.append((included + (branch,), excluded))
+    return best_subset
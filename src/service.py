@@ -0,0 +1,223 @@
+"""
+Long-running local optimization service. Keeps asset data and compiled problems in memory between
+requests, so repeated queries for the same universe skip downloading, estimating and compiling.
+
+Requests and responses are single lines of JSON over a TCP or Unix socket:
+    {"id": 1, "method": "tangency", "params": {"tickers": ["MSFT", "AAPL"], "days_back": 1095, "risk_free_return": 0.03}}
+    {"id": 1, "result": {"weights": [...], "return": 0.21, "risk": 0.18, "sharpe_ratio": 1.0}}
+
+Start it from the src directory with:
+    python service.py --port 8765
+    python service.py --unix /tmp/portfolio.sock
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from data_processing import get_asset_data
+from optimization import FrontierProblem
+from critical_line import critical_line_frontier, interpolate_frontier_weights, frontier_max_sharpe
+from monte_carlo import simulate_portfolio_summary
+from portfolio_stats import portfolio_return_and_risk, portfolio_sharpe_ratio, portfolio_returns_and_risks, portfolio_sharpe_ratios
+
+class UniverseEntry:
+    """
+    Cached data of one universe. The frontier problem and corner portfolios are built on first use.
+    """
+    def __init__(self, returns, cov_matrix):
+        self.returns = returns
+        self.cov_matrix = cov_matrix
+        self._frontier_problem = None
+        self._corners = None
+        # FrontierProblem keeps its state between solves, so solves on one universe take turns
+        self.lock = threading.Lock()
+
+    def frontier_problem(self):
+        if self._frontier_problem is None:
+            self._frontier_problem = FrontierProblem(self.returns, self.cov_matrix)
+        return self._frontier_problem
+
+    def corners(self):
+        if self._corners is None:
+            self._corners = critical_line_frontier(self.returns, self.cov_matrix)
+        return self._corners
+
+class PortfolioService:
+    """
+    Answers min_risk, frontier, tangency and simulate requests. Universes are cached in a least recently
+    used cache keyed by a hash of the tickers, window and covariance estimator. Solves run in a thread
+    pool so the event loop keeps serving other connections, and the compiled cvxpy problems are shared
+    by every request instead of being copied to other processes.
+
+    Args:
+        loader (callable): Function taking (tickers, days_back, cov_estimator) and returning (returns, cov_matrix).
+        By default get_asset_data with the cache settings below.
+        cache_size (int): Most universes kept in memory.
+        workers (int): Threads used for loading data and solving.
+        cache_dir (str): Price cache directory passed to get_asset_data.
+        offline (bool): Passed to get_asset_data.
+    """
+    def __init__(self, loader=None, cache_size=32, workers=4, cache_dir=None, offline=False):
+        self.loader = loader or (lambda tickers, days_back, cov_estimator: get_asset_data(
+            tickers, days_back, cache_dir=cache_dir, offline=offline, cov_estimator=cov_estimator))
+        self.cache_size = cache_size
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.methods = {"min_risk": self.min_risk, "frontier": self.frontier, "tangency": self.tangency, "simulate": self.simulate}
+        self._universes = OrderedDict()
+        self._loading = {}
+
+    @staticmethod
+    def universe_key(tickers, days_back, cov_estimator="sample"):
+        """
+        Hashes the settings that decide a universe's data. Ticker order matters since weights follow it.
+        """
+        return hashlib.sha1(json.dumps([list(tickers), days_back, cov_estimator]).encode()).hexdigest()
+
+    async def universe(self, tickers, days_back, cov_estimator="sample"):
+        """
+        Returns the cached UniverseEntry, loading it if needed. Concurrent requests for a universe that is
+        still loading wait for the same load.
+        """
+        key = self.universe_key(tickers, days_back, cov_estimator)
+        if key in self._universes:
+            self._universes.move_to_end(key)
+            return self._universes[key]
+        if key not in self._loading:
+            loop = asyncio.get_running_loop()
+            self._loading[key] = loop.run_in_executor(self.executor, self.loader, list(tickers), days_back, cov_estimator)
+        try:
+            returns, cov_matrix = await self._loading[key]
+        finally:
+            self._loading.pop(key, None)
+
+        if key not in self._universes:
+            self._universes[key] = UniverseEntry(np.asarray(returns, dtype=float), np.asarray(cov_matrix, dtype=float))
+            if len(self._universes) > self.cache_size:
+                self._universes.popitem(last=False)
+        return self._universes[key]
+
+    async def handle(self, request):
+        """
+        Answers one request dict and returns the response dict. Errors are returned rather than raised.
+        """
+        response = {"id": request.get("id")}
+        try:
+            method = self.methods.get(request.get("method"))
+            if method is None:
+                raise ValueError(f"Unknown method: {request.get('method')}")
+            params = dict(request.get("params", {}))
+            entry = await self.universe(params.pop("tickers"), params.pop("days_back"), params.pop("cov_estimator", "sample"))
+            loop = asyncio.get_running_loop()
+            response["result"] = await loop.run_in_executor(self.executor, lambda: method(entry, **params))
+        except Exception as error:
+            response["error"] = f"{type(error).__name__}: {error}"
+        return response
+
+    def min_risk(self, entry, target_return, method="critical_line"):
+        """
+        Minimum risk portfolio for a target return, see optimize_portfolio.
+        """
+        if method == "cvxpy":
+            with entry.lock:
+                weights = entry.frontier_problem().solve(target_return)
+        elif method == "critical_line":
+            corner_returns, _, corner_weights = entry.corners()
+            weights = interpolate_frontier_weights(corner_returns, corner_weights, target_return)[0]
+            weights = None if np.isnan(weights).any() else weights
+        else:
+            raise ValueError(f"Unknown method: {method}")
+
+        if weights is None:
+            return {"weights": None, "return": None, "risk": None}
+        portfolio_return, portfolio_risk = portfolio_return_and_risk(entry.returns, entry.cov_matrix, weights)
+        return {"weights": weights.tolist(), "return": float(portfolio_return), "risk": float(portfolio_risk)}
+
+    def frontier(self, entry, risk_free_return, num_returns=50):
+        """
+        Evenly spaced points of the efficient frontier, from the minimum risk portfolio to the highest return.
+        """
+        corner_returns, _, corner_weights = entry.corners()
+        target_returns = np.linspace(corner_returns[-1], corner_returns[0], num_returns)
+        weights = interpolate_frontier_weights(corner_returns, corner_weights, target_returns)
+        returns, risks = portfolio_returns_and_risks(entry.returns, entry.cov_matrix, weights)
+        sharpe_ratios = portfolio_sharpe_ratios(returns, risks, risk_free_return)
+        return {"returns": returns.tolist(), "risks": risks.tolist(), "sharpe_ratios": sharpe_ratios.tolist()}
+
+    def tangency(self, entry, risk_free_return):
+        """
+        Maximum Sharpe ratio portfolio, see critical_line.frontier_max_sharpe.
+        """
+        corner_returns, _, corner_weights = entry.corners()
+        weights = frontier_max_sharpe(corner_returns, corner_weights, entry.cov_matrix, risk_free_return)
+        if weights is None:
+            return {"weights": None, "return": None, "risk": None, "sharpe_ratio": None}
+        portfolio_return, portfolio_risk = portfolio_return_and_risk(entry.returns, entry.cov_matrix, weights)
+        return {"weights": weights.tolist(), "return": float(portfolio_return), "risk": float(portfolio_risk),
+                "sharpe_ratio": float(portfolio_sharpe_ratio(portfolio_return, portfolio_risk, risk_free_return))}
+
+    def simulate(self, entry, weights, initial_value=10_000, total_time=1, step_size=1 / 252, sims=10_000, seed=None):
+        """
+        Monte Carlo summary of a portfolio, see simulate_portfolio_summary.
+        """
+        portfolio_return, portfolio_risk = portfolio_return_and_risk(entry.returns, entry.cov_matrix, np.asarray(weights, dtype=float))
+        summary = simulate_portfolio_summary(initial_value, portfolio_return, portfolio_risk, total_time, step_size, sims, seed=seed)
+        return {key: value.tolist() if isinstance(value, np.ndarray) else float(value) for key, value in summary.items()}
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves one connection. Each request line is answered as soon as it is done, so responses can
+        arrive out of order and are matched to requests by their id.
+        """
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        async def answer(line):
+            try:
+                response = await self.handle(json.loads(line))
+            except json.JSONDecodeError as error:
+                response = {"id": None, "error": f"JSONDecodeError: {error}"}
+            async with write_lock:
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending)
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        """
+        Serves requests until cancelled, on a Unix socket if path is given and on TCP otherwise.
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+        async with server:
+            await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host (default 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default 8765).")
+    parser.add_argument("--unix", help="Serve on this Unix socket path instead of TCP.")
+    parser.add_argument("--cache-dir", default="../.price_cache", help="Price cache directory.")
+    parser.add_argument("--offline", action="store_true", help="Only use cached prices.")
+    parser.add_argument("--cache-size", type=int, default=32, help="Most universes kept in memory.")
+    parser.add_argument("--workers", type=int, default=4, help="Threads used for loading data and solving.")
+    args = parser.parse_args()
+
+    service = PortfolioService(cache_size=args.cache_size, workers=args.workers, cache_dir=args.cache_dir, offline=args.offline)
+    asyncio.run(service.serve(args.host, args.port, args.unix))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import json
+import os
+import numpy as np
+from data_processing import compute_asset_statistics
+from instrumentation import timed
+
+METADATA_FILE = "metadata.json"
+ARRAY_FILES = {"returns": "returns.npy", "cov_matrix": "cov_matrix.npy", "daily_returns": "daily_returns.npy"}
+
+@timed
+def build_universe_index(closes, path):
+    """
+    Computes the statistics of a whole ticker universe once and stores them in a directory, so any
+    subset of it can later be looked up with UniverseIndex without recomputing anything.
+
+    The annualized expected returns, annualized covariance matrix and daily returns are saved as
+    .npy files that are memory mapped when loaded, next to a JSON file with the tickers and date range.
+    Covariances are pairwise like compute_asset_statistics, so slicing the universe statistics gives
+    exactly the statistics of the subset's closes.
+
+    Args:
+        closes (pd.DataFrame): Closing prices indexed by date with one column per ticker, for
+        example from get_closes(..., drop_missing=True).
+        path (str): Directory the index is written to, created if it doesn't exist.
+
+    Returns:
+        UniverseIndex: The index that was written, loaded from path.
+    """
+    returns, cov_matrix = compute_asset_statistics(closes)
+    daily_returns = closes.pct_change().to_numpy()[1:]
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, ARRAY_FILES["returns"]), returns)
+    np.save(os.path.join(path, ARRAY_FILES["cov_matrix"]), cov_matrix)
+    np.save(os.path.join(path, ARRAY_FILES["daily_returns"]), daily_returns)
+
+    metadata = {
+        "tickers": [str(ticker) for ticker in closes.columns],
+        "start": closes.index.min().date().isoformat(),
+        "end": closes.index.max().date().isoformat(),
+        "days": len(closes),
+    }
+    with open(os.path.join(path, METADATA_FILE), "w") as file:
+        json.dump(metadata, file, indent=2)
+
+    return UniverseIndex(path)
+
+class UniverseIndex:
+    """
+    Read-only view of the statistics written by build_universe_index. The arrays are memory mapped,
+    so opening an index is instant and only the rows that are sliced are read from disk.
+
+    Attributes:
+        tickers (list): Tickers of the universe, in column order.
+        ticker_index (dict): Position of each ticker in the arrays.
+        start (str): First date of the closes, ISO format.
+        end (str): Last date of the closes, ISO format.
+        returns (np.memmap): Annualized expected returns of every ticker (1D array).
+        cov_matrix (np.memmap): Annualized covariance matrix of every ticker (2D array).
+        daily_returns (np.memmap): Daily returns, one row per day and NaN where a ticker has no price (2D array).
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Directory written by build_universe_index.
+        """
+        with open(os.path.join(path, METADATA_FILE)) as file:
+            metadata = json.load(file)
+        self.tickers = metadata["tickers"]
+        self.ticker_index = {ticker: position for position, ticker in enumerate(self.tickers)}
+        self.start = metadata["start"]
+        self.end = metadata["end"]
+
+        self.returns = np.load(os.path.join(path, ARRAY_FILES["returns"]), mmap_mode="r")
+        self.cov_matrix = np.load(os.path.join(path, ARRAY_FILES["cov_matrix"]), mmap_mode="r")
+        self.daily_returns = np.load(os.path.join(path, ARRAY_FILES["daily_returns"]), mmap_mode="r")
+
+    def indices(self, tickers):
+        """
+        Converts tickers to their positions in the arrays (1D array), raising KeyError for tickers
+        that are not in the universe.
+        """
+        return np.array([self.ticker_index[ticker] for ticker in tickers], dtype=np.intp)
+
+    def get_asset_data(self, tickers):
+        """
+        Looks up the expected returns and covariance of a subset of the universe, in the same order
+        as tickers. Same return value as data_processing.get_asset_data.
+        """
+        positions = self.indices(tickers)
+        return self.returns[positions], self.cov_matrix[np.ix_(positions, positions)]
+
+    def get_asset_data_batch(self, universes):
+        """
+        Looks up many subsets of the same size at once with a single gather per array.
+
+        Args:
+            universes (list): Lists of tickers, all the same length, or a 2D array of their positions.
+
+        Returns:
+            tuple: (returns, cov_matrices)
+                - returns (np.array): Expected returns of each subset, shape (subsets, assets) (2D array).
+                - cov_matrices (np.array): Covariance matrix of each subset, shape (subsets, assets, assets) (3D array).
+        """
+        positions = np.asarray(universes)
+        if positions.dtype.kind not in "iu":
+            positions = np.array([self.indices(tickers) for tickers in universes], dtype=np.intp)
+        return self.returns[positions], self.cov_matrix[positions[:, :, None], positions[:, None, :]]
@@ -1,8 +1,31 @@
-import matplotlib.pyplot as plt
-from matplotlib.lines import Line2D
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+from instrumentation import timed
 
-def plot_scatter(x, y, line=False, xlabel="X-axis", ylabel="Y-axis", title="Scatter Plot", color="blue"):
+# matplotlib is imported inside each function, so importing this module (for example to build the
+# jobs of render_figures) doesn't load pyplot and a GUI backend
+
+def use_headless_backend():
+    """
+    Switches matplotlib to the non-interactive Agg backend so figures can be saved without a display.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+def _show_or_save(save_path):
+    """
+    Shows the current figure, or writes it to save_path and closes it so nothing blocks.
+    """
+    import matplotlib.pyplot as plt
+    if save_path is None:
+        plt.show()
+    else:
+        plt.savefig(save_path, bbox_inches="tight")
+        plt.close()
+
+@timed
+def plot_scatter(x, y, line=False, xlabel="X-axis", ylabel="Y-axis", title="Scatter Plot", color="blue", save_path=None):
     """
     General scatter plot function for return-risk or Sharpe ratio-return plots. Plots dashed lines identifying
     the max y value point.
@@ -15,7 +38,10 @@ def plot_scatter(x, y, line=False, xlabel="X-axis", ylabel="Y-axis", title="Scat
     - ylabel (str): Label for the y-axis.
     - title (str): Title of the graph.
     - color (str): Color of the scatter points.
+    - save_path (str): Writes the figure to this file instead of showing it.
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.lines import Line2D
     # Find the max y value
     max_y = max(y)
     max_index = y.index(max_y)
@@ -39,14 +65,17 @@ def plot_scatter(x, y, line=False, xlabel="X-axis", ylabel="Y-axis", title="Scat
     plt.xlabel(xlabel)
     plt.ylabel(ylabel)
     plt.title(title)
-    plt.show()
+    _show_or_save(save_path)
 
 
-def plot_random_portfolios_with_EF(ef_risks, ef_returns, max_sharpe_ratio, max_sharpe_ratio_index, random_risks, random_returns):
+@timed
+def plot_random_portfolios_with_EF(ef_risks, ef_returns, max_sharpe_ratio, max_sharpe_point, random_risks, random_returns, save_path=None):
     """
     Plots the efficient frontier line and points, and randomly generated portfolio points. Colours
-    the portfolio on the EF with max Sharpe ratio as black.
+    the max Sharpe ratio portfolio, given as a (risk, return) point such as the result of
+    optimize_max_sharpe, as black, unless max_sharpe_point is None. Writes the figure to save_path if given.
     """
+    import matplotlib.pyplot as plt
     # Random portfolios
     plt.scatter(random_risks, random_returns, c="blue", label="Random Portfolios")
     
@@ -55,18 +84,23 @@ def plot_random_portfolios_with_EF(ef_risks, ef_returns, max_sharpe_ratio, max_s
     plt.plot(ef_risks, ef_returns, "orange", label="Efficient Frontier", zorder=1)
 
     # Max Sharpe ratio point
-    plt.scatter(ef_risks[max_sharpe_ratio_index], ef_returns[max_sharpe_ratio_index], c="black", label=f"Max Sharpe Ratio {round(max_sharpe_ratio, 2)}", zorder=1)
+    if max_sharpe_point is not None:
+        max_sharpe_risk, max_sharpe_return = max_sharpe_point
+        plt.scatter(max_sharpe_risk, max_sharpe_return, c="black", label=f"Max Sharpe Ratio {round(max_sharpe_ratio, 2)}", zorder=2)
 
     plt.xlabel("Risk")
     plt.ylabel("Return")
     plt.title("Efficient Frontier")
     plt.legend()
-    plt.show()
+    _show_or_save(save_path)
 
-def display_portfolio_bar_chart(weights, assets, title):
+@timed
+def display_portfolio_bar_chart(weights, assets, title, save_path=None):
     """
-    Displays a stacked bar chart showing the proportions of each asset in a ortfolio
+    Displays a stacked bar chart showing the proportions of each asset in a ortfolio. Writes the
+    figure to save_path if given.
     """
+    import matplotlib.pyplot as plt
     # Get random distinct colours
     cmap = plt.get_cmap('tab20')
     colours = [cmap(i) for i in np.linspace(0, 1, len(assets))]
@@ -84,31 +118,125 @@ def display_portfolio_bar_chart(weights, assets, title):
     #plt.tight_layout(rect=[0, 0, 1, 0.95])
     plt.title(title)
     plt.tight_layout()
-    plt.show()
+    _show_or_save(save_path)
 
-def plot_monte_carlo_all(paths, title):
+@timed
+def plot_monte_carlo_all(paths, title, style="lines", max_paths=200, save_path=None, seed=None):
     """
-    Plot the lines of all simulated portfolio paths.
+    Plot the simulated portfolio paths. Drawing every path as its own line gets slow as the number
+    of simulations grows, so the other styles draw a fixed amount no matter how many paths there are.
+
+    Args:
+    - paths (np.ndarray): Simulated portfolio paths, one per row, from simulate_portfolio_returns.
+    - title (str): Title of the graph.
+    - style (str): "lines" draws every path, "subsample" draws max_paths random paths, "bands" draws
+      the median with 50% and 90% quantile bands, "density" draws a heatmap of how many paths pass
+      through each value at each time.
+    - max_paths (int): Number of paths drawn by the "subsample" style.
+    - save_path (str): Writes the figure to this file instead of showing it.
+    - seed (int): Seed for choosing the paths of the "subsample" style.
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
     final_values = paths[:, -1]
     lowest_final_value = np.min(final_values)
+    total_steps = paths.shape[1] - 1
     worst_performance_label = f"Worst Performing Portfolio Value: ${np.round(lowest_final_value, 0)} "
-    plt.hlines(y=lowest_final_value, xmin=0, xmax=252, color='red', linestyle='--', label=worst_performance_label)
+    plt.hlines(y=lowest_final_value, xmin=0, xmax=total_steps, color='red', linestyle='--', label=worst_performance_label)
+
+    if style == "lines":
+        plt.plot(paths.T)
+    elif style == "subsample":
+        rng = np.random.default_rng(seed)
+        chosen = rng.choice(len(paths), size=min(max_paths, len(paths)), replace=False)
+        plt.plot(paths[chosen].T, rasterized=True)
+    elif style == "bands":
+        _plot_quantile_bands(np.arange(total_steps + 1), np.quantile(paths, [0.05, 0.25, 0.5, 0.75, 0.95], axis=0))
+    elif style == "density":
+        value_edges = np.linspace(paths.min(), paths.max(), 200)
+        counts = np.array([np.histogram(step_values, bins=value_edges)[0] for step_values in paths.T])
+        counts = np.ma.masked_equal(counts, 0)
+        plt.pcolormesh(np.arange(total_steps + 2) - 0.5, value_edges, counts.T, norm=LogNorm(), cmap="viridis", rasterized=True)
+        plt.colorbar(label="Simulations")
+    else:
+        raise ValueError(f"Unknown Monte Carlo plot style: {style}")
+
     plt.legend(loc="lower left")
+    plt.xlabel("Trading Days")
+    plt.ylabel("Portfolio Value (Dollars)")
+    plt.title(title)
+    _show_or_save(save_path)
+
+@timed
+def plot_monte_carlo_summary(summary, title, save_path=None):
+    """
+    Plot the quantile bands and average path of a simulation summary from simulate_portfolio_summary,
+    which never stores the paths. Expects the default 5%, 50% and 95% quantiles.
+    """
+    import matplotlib.pyplot as plt
+    quantile_paths = summary["quantile_paths"]
+    total_steps = quantile_paths.shape[1] - 1
+    worst_performance_label = f"Worst Performing Portfolio Value: ${np.round(summary['min_terminal_value'], 0)} "
+    plt.hlines(y=summary["min_terminal_value"], xmin=0, xmax=total_steps, color='red', linestyle='--', label=worst_performance_label)
 
-    plt.plot(paths.T)
+    steps = np.arange(total_steps + 1)
+    plt.fill_between(steps, quantile_paths[0], quantile_paths[-1], color="tab:blue", alpha=0.2, label="5% to 95%")
+    plt.plot(steps, quantile_paths[len(quantile_paths) // 2], color="tab:blue", label="Median")
+    plt.plot(steps, summary["mean_path"], color="black", linestyle=":", label="Average")
+
+    plt.legend(loc="lower left")
     plt.xlabel("Trading Days")
     plt.ylabel("Portfolio Value (Dollars)")
     plt.title(title)
-    plt.show()
+    _show_or_save(save_path)
 
-def plot_monte_carlo_avg(paths, title):
+def _plot_quantile_bands(steps, quantile_paths):
     """
-    Plot the avrage of all the portfolio paths.
+    Draws a fan chart from the 5%, 25%, 50%, 75% and 95% quantile paths.
     """
+    import matplotlib.pyplot as plt
+    plt.fill_between(steps, quantile_paths[0], quantile_paths[4], color="tab:blue", alpha=0.2, label="5% to 95%")
+    plt.fill_between(steps, quantile_paths[1], quantile_paths[3], color="tab:blue", alpha=0.4, label="25% to 75%")
+    plt.plot(steps, quantile_paths[2], color="tab:blue", label="Median")
+
+@timed
+def plot_monte_carlo_avg(paths, title, save_path=None):
+    """
+    Plot the avrage of all the portfolio paths. Writes the figure to save_path if given.
+    """
+    import matplotlib.pyplot as plt
     average_path = np.mean(paths, axis=0)
     plt.plot(average_path)
     plt.xlabel("Trading Days")
     plt.ylabel("Portfolio Value")
     plt.title(title)
-    plt.show()
\ No newline at end of file
+    _show_or_save(save_path)
+
+def render_figures(jobs, workers=None):
+    """
+    Renders independent figures to files in parallel worker processes using the Agg backend.
+
+    Args:
+        jobs (list): One (plot_function, args, kwargs) tuple per figure, where plot_function is one of the
+        functions in this module and kwargs includes its save_path.
+        workers (int): Number of worker processes, None uses every core and 1 renders in this process.
+
+    Returns:
+        list: The save_path of each figure, in the same order as jobs.
+    """
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        use_headless_backend()
+        for job in jobs:
+            _render_job(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_headless_backend) as executor:
+            list(executor.map(_render_job, jobs))
+    return [kwargs["save_path"] for _, _, kwargs in jobs]
+
+def _render_job(job):
+    """
+    Renders one figure. Takes a single tuple so it can be mapped over a process pool.
+    """
+    plot_function, args, kwargs = job
+    plot_function(*args, **kwargs)
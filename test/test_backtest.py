@@ -0,0 +1,44 @@
+import numpy as np
+from src.backtest import RollingMoments, walk_forward_backtest
+
+
+def test_rolling_moments_match_full_recompute():
+    """
+    Test that sliding the window with rank-one updates gives the same mean and covariance
+    as computing them from the window directly.
+    """
+    rng = np.random.default_rng(0)
+    daily_returns = rng.normal(0.001, 0.02, (400, 5))
+    window = 60
+
+    moments = RollingMoments(daily_returns[:window])
+    for day in range(window, len(daily_returns)):
+        moments.add(daily_returns[day])
+        moments.remove(daily_returns[day - window])
+
+    last_window = daily_returns[-window:]
+    assert np.allclose(moments.mean(), last_window.mean(axis=0), atol=1e-12), "Rolling mean doesn't match"
+    assert np.allclose(moments.cov(), np.cov(last_window.T), atol=1e-12), "Rolling covariance doesn't match"
+
+
+def test_backtest_values_follow_rebalanced_weights():
+    """
+    Test that the portfolio values match replaying the daily returns with the weights chosen at
+    each rebalance, and that every set of weights is valid.
+    """
+    rng = np.random.default_rng(1)
+    num_days, num_assets = 300, 4
+    daily_returns = rng.normal(0.0005, 0.015, (num_days, num_assets))
+    window, rebalance_every = 100, 20
+
+    values, rebalance_days, weights_history = walk_forward_backtest(daily_returns, window, rebalance_every, initial_value=100)
+
+    assert len(values) == num_days - window + 1, "Expected one value per day after the first window"
+    assert rebalance_days == list(range(window, num_days, rebalance_every)), "Rebalances happened on the wrong days"
+    assert np.all(weights_history >= 0) and np.allclose(weights_history.sum(axis=1), 1), "Weights must be valid"
+
+    value = 100
+    for start, weights in zip(rebalance_days, weights_history):
+        period_growth = np.prod(1 + daily_returns[start:start + rebalance_every], axis=0)
+        value *= weights @ period_growth
+    assert np.isclose(values[-1], value), "Final value doesn't match replaying the rebalanced weights"
@@ -0,0 +1,87 @@
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from src.bulk_download import bulk_download, BulkDownloader, RateLimiter
+from src.price_cache import load_closes
+
+
+class FakeFetcher:
+    """
+    Stands in for Yahoo Finance. Tickers in failures raise for their first few requests, and "BAD" always raises.
+    """
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, ticker, start, end):
+        with self.lock:
+            self.calls.append(ticker)
+            if ticker == "BAD" or self.failures.get(ticker, 0) > 0:
+                self.failures[ticker] = self.failures.get(ticker, 0) - 1
+                raise ConnectionError(f"{ticker} unavailable")
+        # Each ticker trades on a different set of days so the frame has to be aligned
+        dates = pd.bdate_range(start, end, inclusive="left")[ord(ticker[0]) % 3:]
+        return pd.Series(100 + dates.dayofyear + ord(ticker[0]), index=dates, dtype=float)
+
+
+def test_bulk_download_retries_and_reports_failures():
+    """
+    Test that flaky tickers are retried with growing waits, tickers that keep failing are reported,
+    and the successful tickers are aligned on the union of their dates in the requested order.
+    """
+    fetcher = FakeFetcher(failures={"FLAKY": 2})
+    waits = []
+    tickers = ["FLAKY", "BAD", "AAA", "BBB"]
+    closes, failed = bulk_download(tickers, datetime(2024, 1, 1), datetime(2024, 2, 1), fetcher=fetcher,
+                                   max_workers=4, retries=3, backoff=0.5, sleep=waits.append)
+
+    assert list(closes.columns) == ["FLAKY", "AAA", "BBB"], "Columns should be the successful tickers in order"
+    assert list(failed) == ["BAD"] and "unavailable" in failed["BAD"], "The failing ticker wasn't reported"
+    assert fetcher.calls.count("FLAKY") == 3 and fetcher.calls.count("BAD") == 4, "Wrong number of attempts"
+    assert sorted(waits) == [0.5, 0.5, 1.0, 1.0, 2.0], "Backoff should double between retries"
+
+    expected_dates = pd.bdate_range(datetime(2024, 1, 1), datetime(2024, 2, 1), inclusive="left")
+    assert closes.index.equals(expected_dates.rename("Date")), "Dates should be the union of every ticker's dates"
+    assert closes["AAA"].isna().sum() == ord("A") % 3, "Missing dates should be NaN"
+
+
+def test_failed_tickers_are_not_cached(tmp_path):
+    """
+    Test that a ticker that failed through the bulk downloader is not marked as cached, so it is
+    downloaded again on the next request, and that the rate limiter spaces out requests.
+    """
+    fetcher = FakeFetcher(failures={"FLAKY": 2})
+    downloader = BulkDownloader(fetcher=fetcher, retries=0)
+    first = load_closes(["AAA", "FLAKY"], datetime(2024, 1, 1), datetime(2024, 2, 1), tmp_path, downloader=downloader)
+    assert downloader.failed.keys() == {"FLAKY"} and first["FLAKY"].isna().all(), "FLAKY should have failed"
+
+    load_closes(["AAA", "FLAKY"], datetime(2024, 1, 1), datetime(2024, 2, 1), tmp_path, downloader=downloader)
+    second = load_closes(["AAA", "FLAKY"], datetime(2024, 1, 1), datetime(2024, 2, 1), tmp_path, downloader=downloader)
+    assert fetcher.calls == ["AAA", "FLAKY", "FLAKY", "FLAKY"], "Only the failed ticker should be downloaded again"
+    assert np.all(second["FLAKY"].notna()), "FLAKY should be cached once it downloads"
+
+    now, waits = [0.0], []
+    rate_limiter = RateLimiter(requests_per_second=4, clock=lambda: now[0], sleep=waits.append)
+    for _ in range(3):
+        rate_limiter.wait()
+    assert waits == [0.25, 0.5], "Requests should be spaced by a quarter second"
+
+
+def test_ranges_without_prices_are_not_failures(tmp_path):
+    """
+    Test that a ticker without prices in a weekend range is returned without retries instead of being
+    reported as failed, so load_closes caches the weekend as covered.
+    """
+    fetcher = FakeFetcher()
+    waits = []
+    closes, failed = bulk_download(["AAA"], datetime(2024, 1, 6), datetime(2024, 1, 8), fetcher=fetcher, sleep=waits.append)
+    assert failed == {} and list(closes.columns) == ["AAA"] and closes.empty, "An empty range isn't a failure"
+    assert fetcher.calls == ["AAA"] and waits == [], "An empty range shouldn't be retried"
+
+    downloader = BulkDownloader(fetcher=fetcher)
+    for _ in range(2):
+        load_closes(["AAA"], datetime(2024, 1, 1), datetime(2024, 1, 8), tmp_path, downloader=downloader)
+    load_closes(["AAA"], datetime(2024, 1, 1), datetime(2024, 1, 6), tmp_path, downloader=downloader)
+    assert fetcher.calls == ["AAA", "AAA"] and downloader.failed == {}, "Cached ranges shouldn't be downloaded again"
@@ -0,0 +1,61 @@
+import numpy as np
+from src.covariance import ledoit_wolf_covariance, pca_factor_model, factor_covariance, sample_covariance
+from src.optimization import optimize_portfolio, optimize_portfolio_factor
+
+
+def test_ledoit_wolf_is_positive_definite_with_few_days():
+    """
+    Test that with more assets than days, where the sample covariance is singular, the
+    Ledoit-Wolf estimate is still positive definite and keeps the average variance.
+    """
+    rng = np.random.default_rng(0)
+    daily_returns = rng.normal(0, 0.02, (30, 50))
+
+    cov_matrix, shrinkage = ledoit_wolf_covariance(daily_returns)
+    sample = sample_covariance(daily_returns) * (29 / 30)
+
+    assert 0 < shrinkage <= 1, "Shrinkage must be between 0 and 1"
+    assert np.min(np.linalg.eigvalsh(cov_matrix)) > 0, "Shrunk covariance must be positive definite"
+    assert np.isclose(np.trace(cov_matrix), np.trace(sample)), "Shrinking shouldn't change the total variance"
+
+
+def test_factor_optimizer_matches_dense_optimizer():
+    """
+    Test that the factor model keeps each asset's variance and that optimizing with the factor
+    structure gives the same risk as optimizing with the dense factor covariance.
+    """
+    rng = np.random.default_rng(1)
+    num_days, num_assets, num_factors = 500, 30, 3
+    market = rng.normal(0, 0.01, (num_days, num_factors))
+    daily_returns = market @ rng.normal(1, 0.3, (num_factors, num_assets)) + rng.normal(0, 0.01, (num_days, num_assets))
+    returns = rng.uniform(0.05, 0.3, num_assets)
+    target_return = 0.15
+
+    factor_loadings, specific_variances = pca_factor_model(daily_returns * np.sqrt(252), num_factors)
+    cov_matrix = factor_covariance(factor_loadings, specific_variances)
+    assert np.allclose(np.diag(cov_matrix), np.diag(sample_covariance(daily_returns)) * 252), "Factor model should keep each asset's variance"
+
+    factor_weights = optimize_portfolio_factor(returns, factor_loadings, specific_variances, target_return)
+    dense_weights = optimize_portfolio(returns, cov_matrix, target_return)
+    factor_risk = np.sqrt(factor_weights @ cov_matrix @ factor_weights)
+    dense_risk = np.sqrt(dense_weights @ cov_matrix @ dense_weights)
+    assert np.isclose(factor_risk, dense_risk, rtol=1e-3), "Factor and dense optimizers disagree"
+
+
+def test_pca_factor_model_matches_sample_covariance_eigenvectors():
+    """
+    Test that the factor model from the SVD of the returns explains the same covariance as the top
+    eigenvectors of the sample covariance, and keeps the variances on the diagonal, also with fewer
+    days than factors.
+    """
+    rng = np.random.default_rng(1)
+    daily_returns = rng.normal(0, 0.01, (300, 3)) @ rng.normal(1, 0.3, (3, 40)) + rng.normal(0, 0.01, (300, 40))
+
+    factor_loadings, specific_variances = pca_factor_model(daily_returns, 3)
+    eigenvalues, eigenvectors = np.linalg.eigh(sample_covariance(daily_returns))
+    top_loadings = eigenvectors[:, -3:] * np.sqrt(eigenvalues[-3:])
+    assert np.allclose(factor_loadings @ factor_loadings.T, top_loadings @ top_loadings.T), "Factors don't match the top eigenvectors"
+    assert np.allclose(np.diag(factor_covariance(factor_loadings, specific_variances)), np.diag(sample_covariance(daily_returns))), "Variances should be kept"
+
+    factor_loadings, _ = pca_factor_model(daily_returns[:4], 5)
+    assert factor_loadings.shape == (40, 5), "Every factor should have loadings"
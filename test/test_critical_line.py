@@ -0,0 +1,67 @@
+import numpy as np
+from src.critical_line import critical_line_frontier, interpolate_frontier_weights, frontier_max_sharpe
+from src.optimization import optimize_portfolio, optimize_max_sharpe
+from src.portfolio_stats import portfolio_return_and_risk
+
+
+def test_corner_portfolios_are_valid():
+    """
+    Test that every corner portfolio is fully invested with no short selling, and that the corners
+    go from the highest return asset down to lower returns.
+    """
+    rng = np.random.default_rng(1)
+    num_assets = 8
+    returns = rng.uniform(0.0, 0.4, num_assets)
+    cov_matrix = np.cov(rng.normal(0, 0.02, (400, num_assets)).T) * 252
+
+    corner_returns, corner_risks, corner_weights = critical_line_frontier(returns, cov_matrix)
+
+    assert np.all(corner_weights >= 0), "All weights must be non-negative"
+    assert np.allclose(corner_weights.sum(axis=1), 1), "Sum of weights must be 1"
+    assert np.isclose(corner_returns[0], returns.max()), "The first corner should hold the highest return asset"
+    assert np.all(np.diff(corner_returns) <= 1e-12), "Corner returns should be decreasing"
+    assert np.all(np.diff(corner_risks) <= 1e-12), "Corner risks should be decreasing"
+
+
+def test_interpolated_frontier_matches_optimize_portfolio():
+    """
+    Test that interpolating between corner portfolios gives the same risk as solving for
+    each target return with optimize_portfolio, including targets below the minimum risk
+    portfolio's return and infeasible targets above every asset's return.
+    """
+    rng = np.random.default_rng(2)
+    num_assets = 10
+    returns = rng.uniform(-0.1, 0.5, num_assets)
+    mixing = np.eye(num_assets) + 0.3 * rng.normal(size=(num_assets, num_assets))
+    cov_matrix = np.cov((rng.normal(0, 0.02, (600, num_assets)) @ mixing).T) * 252
+
+    corner_returns, _, corner_weights = critical_line_frontier(returns, cov_matrix)
+    target_returns = np.linspace(returns.min(), returns.max() + 0.05, 20)
+    frontier_weights = interpolate_frontier_weights(corner_returns, corner_weights, target_returns)
+
+    for target_return, weights in zip(target_returns, frontier_weights):
+        expected_weights = optimize_portfolio(returns, cov_matrix, target_return)
+        if expected_weights is None:
+            assert np.all(np.isnan(weights)), f"Target return {target_return:.4f} should be infeasible"
+            continue
+
+        _, expected_risk = portfolio_return_and_risk(returns, cov_matrix, expected_weights)
+        actual_return, actual_risk = portfolio_return_and_risk(returns, cov_matrix, weights)
+        assert actual_return >= target_return - 1e-8, "Interpolated portfolio does not meet the target return"
+        assert np.isclose(actual_risk, expected_risk, atol=1e-5), f"Risk {actual_risk:.6f} does not match solver risk {expected_risk:.6f}"
+
+
+def test_frontier_max_sharpe_matches_direct_solve():
+    """
+    Test that the exact maximum Sharpe ratio portfolio found from the corner portfolios matches the
+    tangency portfolio solved with cvxpy.
+    """
+    rng = np.random.default_rng(5)
+    for num_assets in [2, 6, 12]:
+        returns = rng.uniform(0.0, 0.4, num_assets)
+        cov_matrix = np.cov(rng.normal(0, 0.02, (400, num_assets)).T) * 252
+        corner_returns, _, corner_weights = critical_line_frontier(returns, cov_matrix)
+
+        weights = frontier_max_sharpe(corner_returns, corner_weights, cov_matrix, 0.03)
+        assert np.allclose(weights, optimize_max_sharpe(returns, cov_matrix, 0.03), atol=1e-6), "Weights don't match the direct solve"
+    assert frontier_max_sharpe(corner_returns, corner_weights, cov_matrix, 1.0) is None, "No portfolio beats a risk-free rate above every return"
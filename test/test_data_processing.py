@@ -1,7 +1,18 @@
 import pandas as pd
 import numpy as np
 import random
-from src.data_processing import get_asset_data
+from src.data_processing import (
+    get_asset_data,
+    get_random_portfolios,
+    get_random_portfolio_histogram,
+    get_random_portfolio_sample,
+    get_adaptive_frontier_data,
+    compute_asset_statistics,
+    compute_factor_model,
+)
+from src.covariance import factor_covariance
+from src.optimization import optimize_portfolio, optimize_portfolio_factor
+from src.critical_line import critical_line_frontier, interpolate_frontier_weights
 
 def test_data_returned_for_all_tickers():
     """
@@ -34,3 +45,115 @@ def test_covariance_matrix_is_symmetric():
     _, cov_matrix = get_asset_data(tickers, days_back)
 
     assert np.allclose(cov_matrix, cov_matrix.T), "Covariance matrix is not symmetric"
+
+def test_random_portfolios_do_not_depend_on_chunk_size():
+    """
+    Test that the histogram counts every portfolio and matches the unchunked random portfolios
+    drawn with the same seed.
+    """
+    rng = np.random.default_rng(0)
+    num_assets = 6
+    returns = rng.uniform(0.0, 0.4, num_assets)
+    cov_matrix = np.cov(rng.normal(0, 0.02, (300, num_assets)).T) * 252
+    amount = 10_000
+
+    actual_returns, risks = get_random_portfolios(returns, cov_matrix, amount, seed=1)
+    counts, risk_edges, return_edges = get_random_portfolio_histogram(returns, cov_matrix, amount, bins=20, chunk_size=999, seed=1)
+    expected_counts, _, _ = np.histogram2d(risks, actual_returns, bins=[risk_edges, return_edges])
+
+    assert counts.sum() == amount, "Histogram doesn't count every portfolio"
+    assert np.array_equal(counts, expected_counts), "Chunked histogram doesn't match the unchunked portfolios"
+
+def test_random_portfolio_sample_is_subset():
+    """
+    Test that the reservoir sample has the requested size and only contains generated portfolios.
+    """
+    rng = np.random.default_rng(0)
+    num_assets = 4
+    returns = rng.uniform(0.0, 0.4, num_assets)
+    cov_matrix = np.cov(rng.normal(0, 0.02, (300, num_assets)).T) * 252
+
+    all_returns, _ = get_random_portfolios(returns, cov_matrix, 5_000, method="dirichlet", seed=3)
+    sample_returns, sample_risks = get_random_portfolio_sample(returns, cov_matrix, 5_000, 100, chunk_size=700, method="dirichlet", seed=3)
+
+    assert sample_returns.shape == (100,) and sample_risks.shape == (100,), "Sample doesn't have the requested size"
+    assert np.all(np.isin(sample_returns, all_returns)), "Sample contains portfolios that were not generated"
+
+def test_adaptive_frontier_meets_tolerance():
+    """
+    Test that the adaptive frontier spans the feasible returns and that the line through its points
+    stays within the tolerance of the exact frontier, for both methods.
+    """
+    rng = np.random.default_rng(3)
+    num_assets = 10
+    returns = rng.uniform(0.02, 0.5, num_assets)
+    cov_matrix = np.cov(rng.normal(0, 0.02, (500, num_assets)).T) * 252
+    corner_returns, _, corner_weights = critical_line_frontier(returns, cov_matrix)
+
+    for method in ["cvxpy", "critical_line"]:
+        actual_returns, risks, sharpe_ratios = get_adaptive_frontier_data(returns, cov_matrix, 0.03, tolerance=1e-3, method=method)
+
+        assert np.isclose(actual_returns[0], corner_returns[-1], atol=1e-4), "Frontier should start at the minimum risk portfolio"
+        assert np.isclose(actual_returns[-1], returns.max(), atol=1e-4), "Frontier should end at the highest asset return"
+        assert len(actual_returns) < 76 and not np.isnan(sharpe_ratios).any(), "Every point should be feasible"
+
+        dense_returns = np.linspace(actual_returns[0], actual_returns[-1], 2_000)
+        dense_weights = interpolate_frontier_weights(corner_returns, corner_weights, dense_returns)
+        exact_risks = np.sqrt(np.einsum("ij,jk,ik->i", dense_weights, cov_matrix, dense_weights))
+        assert np.max(np.abs(np.interp(dense_returns, actual_returns, risks) - exact_risks)) < 1e-3, "Frontier line is outside the tolerance"
+
+def test_adaptive_frontier_skips_solver_errors(monkeypatch):
+    """
+    Test that solver errors in the adaptive frontier skip the point like on the grid, and that a
+    failed minimum risk portfolio raises a ValueError.
+    """
+    import cvxpy as cp
+    import pytest
+    from src import data_processing
+
+    returns = np.array([0.05, 0.1, 0.2])
+    cov_matrix = np.diag([0.01, 0.04, 0.09])
+    real_problem = data_processing.FrontierProblem(returns, cov_matrix)
+
+    class FailingProblem:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def solve(self, target_return):
+            if 0.1 < target_return < 0.19:
+                raise cp.error.SolverError("Solver failed")
+            return real_problem.solve(target_return)
+
+    monkeypatch.setattr(data_processing, "FrontierProblem", FailingProblem)
+    actual_returns, _, _ = get_adaptive_frontier_data(returns, cov_matrix, 0.03)
+    assert not any(0.1 < value < 0.19 for value in actual_returns), "Failed targets shouldn't be on the frontier"
+    assert np.isclose(actual_returns[-1], 0.2, atol=1e-4), "Frontier should still end at the highest asset return"
+
+    class BrokenProblem(FailingProblem):
+        def solve(self, target_return):
+            raise cp.error.SolverError("Solver failed")
+
+    monkeypatch.setattr(data_processing, "FrontierProblem", BrokenProblem)
+    with pytest.raises(ValueError):
+        get_adaptive_frontier_data(returns, cov_matrix, 0.03)
+
+def test_factor_model_data_matches_pca_statistics():
+    """
+    Test that the factor model gives the same returns and covariance as the "pca" estimator, and that
+    optimizing with it directly gives the same risk as optimizing the dense covariance.
+    """
+    rng = np.random.default_rng(0)
+    daily_returns = rng.normal(0, 0.01, (400, 2)) @ rng.normal(1, 0.3, (2, 12)) + rng.normal(0.0005, 0.01, (400, 12))
+    closes = pd.DataFrame(100 * np.cumprod(1 + daily_returns, axis=0))
+
+    returns, cov_matrix = compute_asset_statistics(closes, cov_estimator="pca", num_factors=2)
+    factor_returns, factor_loadings, specific_variances = compute_factor_model(closes, num_factors=2)
+    assert np.allclose(factor_returns, returns), "Returns don't match"
+    assert np.allclose(factor_covariance(factor_loadings, specific_variances), cov_matrix), "Covariance doesn't match"
+
+    target_return = float(np.median(returns))
+    dense_weights = optimize_portfolio(returns, cov_matrix, target_return)
+    factor_weights = optimize_portfolio_factor(factor_returns, factor_loadings, specific_variances, target_return)
+    dense_risk = np.sqrt(dense_weights @ cov_matrix @ dense_weights)
+    factor_risk = np.sqrt(factor_weights @ cov_matrix @ factor_weights)
+    assert np.isclose(factor_risk, dense_risk, rtol=1e-4), "Factor optimizer risk doesn't match"
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Heavy dependencies each stage must not import until they are used
+HEAVY_DEPENDENCIES = {"cvxpy", "yfinance", "matplotlib"}
+IMPORT_BUDGETS = {
+    "main": HEAVY_DEPENDENCIES,
+    "data_processing": HEAVY_DEPENDENCIES,
+    "price_cache": HEAVY_DEPENDENCIES,
+    "bulk_download": HEAVY_DEPENDENCIES,
+    "universe_index": HEAVY_DEPENDENCIES,
+    "screening": HEAVY_DEPENDENCIES,
+    "service": HEAVY_DEPENDENCIES,
+    "backtest": HEAVY_DEPENDENCIES,
+    "visualizations": HEAVY_DEPENDENCIES,
+    "optimization": HEAVY_DEPENDENCIES | {"pandas"},
+    "monte_carlo": HEAVY_DEPENDENCIES | {"pandas"},
+    "resampling": HEAVY_DEPENDENCIES | {"pandas"},
+    "selection": HEAVY_DEPENDENCIES | {"pandas"},
+}
+
+
+def imported_modules(module):
+    """
+    Imports a module in a fresh interpreter with -X importtime and returns the top level packages it loaded.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=SRC_DIR, capture_output=True, text=True, check=True)
+    packages = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            packages.add(name.split(".")[0])
+    return packages
+
+
+@pytest.mark.parametrize("module", IMPORT_BUDGETS)
+def test_stage_imports_stay_within_budget(module):
+    """
+    Test that importing each stage doesn't load heavy dependencies it only needs on first use.
+    """
+    unexpected = imported_modules(module) & IMPORT_BUDGETS[module]
+    assert not unexpected, f"Importing {module} also imports {sorted(unexpected)}"
+
+
+def test_heavy_dependencies_load_on_first_use():
+    """
+    Test that cvxpy is imported once a cvxpy solve is actually run.
+    """
+    code = (
+        "import sys, numpy as np\n"
+        "from optimization import optimize_portfolio\n"
+        "assert 'cvxpy' not in sys.modules\n"
+        "weights = optimize_portfolio(np.array([0.1, 0.2]), np.eye(2), 0.15)\n"
+        "assert 'cvxpy' in sys.modules and np.isclose(weights.sum(), 1)\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, check=True)
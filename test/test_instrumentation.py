@@ -0,0 +1,63 @@
+import csv
+import json
+import sys
+from src import instrumentation
+
+
+@instrumentation.timed
+def add(a, b):
+    return a + b
+
+
+def test_nothing_is_recorded_while_disabled():
+    """
+    Test that timed functions and stages still work but record nothing while instrumentation is off.
+    """
+    instrumentation.reset()
+    assert add(1, 2) == 3, "Timed function should return its result"
+    with instrumentation.stage("disabled stage"):
+        pass
+    instrumentation.record_event("disabled event")
+
+    assert instrumentation.get_records() == [], "Nothing should be recorded while disabled"
+
+
+def test_records_are_written_as_json_and_csv(tmp_path):
+    """
+    Test that stages, timed calls and events are recorded and written to both metrics formats.
+    """
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        with instrumentation.stage("load", tickers=5):
+            add(1, 2)
+        add(3, 4)
+        instrumentation.record_event("infeasible_target_return", target_return=0.9)
+    finally:
+        instrumentation.disable()
+
+    records = instrumentation.get_records()
+    assert [record["type"] for record in records] == ["stage", "stage", "stage", "event"], "Unexpected records"
+    assert instrumentation.summarize()[f"{__name__}.add"]["calls"] == 2, "Timed calls should be counted"
+
+    json_path = tmp_path / "metrics.json"
+    csv_path = tmp_path / "metrics.csv"
+    instrumentation.write_metrics(str(json_path))
+    instrumentation.write_metrics(str(csv_path))
+
+    assert json.loads(json_path.read_text()) == records, "JSON metrics don't match the records"
+    with open(csv_path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert len(rows) == len(records) and rows[1]["tickers"] == "5", "CSV metrics don't match the records"
+
+
+def test_reset_stops_profiling():
+    """
+    Test that reset stops an active profiler instead of leaving it running.
+    """
+    instrumentation.enable(profile=True)
+    instrumentation.reset()
+    try:
+        assert sys.getprofile() is None, "The profiler should be stopped after a reset"
+    finally:
+        instrumentation.disable()
@@ -0,0 +1,108 @@
+import pytest
+import numpy as np
+from scipy.stats import norm
+from src.monte_carlo import simulate_portfolio_returns, simulate_portfolio_summary, simulate_multi_asset_portfolio, simulate_portfolio_estimates
+
+
+def test_summary_matches_full_paths():
+    """
+    Test that the chunked summary of simulations matches statistics computed from the full
+    paths simulated with the same seed.
+    """
+    initial_value = 10_000
+    paths = simulate_portfolio_returns(initial_value, 0.2, 0.25, 1, 1 / 252, 5_000, seed=3)
+    summary = simulate_portfolio_summary(initial_value, 0.2, 0.25, 1, 1 / 252, 5_000, chunk_size=700, seed=3)
+
+    final_values = paths[:, -1]
+    tail_value = np.quantile(final_values, 0.05)
+    peaks = np.maximum.accumulate(paths, axis=1)
+    max_drawdowns = np.max(1 - paths / peaks, axis=1)
+
+    assert np.allclose(summary["mean_path"], paths.mean(axis=0)), "Mean path doesn't match"
+    assert np.isclose(summary["min_terminal_value"], final_values.min()), "Worst final value doesn't match"
+    assert np.allclose(summary["quantile_paths"][:, -1], np.quantile(final_values, [0.05, 0.5, 0.95]), rtol=1e-3), "Final quantiles don't match"
+    assert np.isclose(summary["value_at_risk"], initial_value - tail_value, rtol=1e-2), "Value at risk doesn't match"
+    assert np.isclose(summary["conditional_value_at_risk"], initial_value - final_values[final_values <= tail_value].mean(), rtol=1e-2), "Conditional value at risk doesn't match"
+    assert np.isclose(summary["mean_max_drawdown"], max_drawdowns.mean()), "Mean max drawdown doesn't match"
+    assert summary["terminal_counts"].sum() == 5_000, "Final value histogram doesn't count every simulation"
+
+
+def test_multi_asset_simulation_is_reproducible_and_unbiased():
+    """
+    Test that the multi-asset simulation gives identical paths for any number of workers, and
+    that the average final value matches the expected growth for buy-and-hold and for rebalancing
+    every step.
+    """
+    weights = np.array([0.5, 0.3, 0.2])
+    returns = np.array([0.08, 0.12, 0.2])
+    cov_matrix = np.array([[0.04, 0.01, 0.0],
+                           [0.01, 0.09, 0.02],
+                           [0.0, 0.02, 0.16]])
+    step_size = 1 / 252
+    sims = 20_000
+
+    serial_paths = simulate_multi_asset_portfolio(1, weights, returns, cov_matrix, 1, step_size, sims, block_size=2_500, workers=1, seed=7)
+    parallel_paths = simulate_multi_asset_portfolio(1, weights, returns, cov_matrix, 1, step_size, sims, block_size=2_500, workers=3, seed=7)
+    assert np.array_equal(serial_paths, parallel_paths), "Paths depend on the number of workers"
+
+    buy_and_hold_mean = weights @ np.exp(returns)
+    assert np.isclose(serial_paths[:, -1].mean(), buy_and_hold_mean, rtol=1e-2), "Buy-and-hold final value is biased"
+
+    rebalanced_paths = simulate_multi_asset_portfolio(1, weights, returns, cov_matrix, 1, step_size, sims, rebalance_every=1, workers=1, seed=7)
+    rebalanced_mean = (weights @ np.exp(returns * step_size)) ** 252
+    assert np.isclose(rebalanced_paths[:, -1].mean(), rebalanced_mean, rtol=1e-2), "Rebalanced final value is biased"
+
+
+def test_variance_reduction_matches_plain_accuracy_with_fewer_paths():
+    """
+    Test that Sobol sampling and the control variate reach the standard errors of plain sampling with
+    a tenth of the paths, that every method stays close to the exact values, and that antithetic
+    paths come in mirrored pairs.
+    """
+    initial_value, expected_return, expected_risk = 10_000, 0.15, 0.2
+    exact_mean = initial_value * np.exp(expected_return)
+    exact_value_at_risk = initial_value * (1 - np.exp(expected_return - 0.5 * expected_risk**2 + expected_risk * norm.ppf(0.05)))
+
+    plain = simulate_portfolio_estimates(initial_value, expected_return, expected_risk, 1, 1 / 252, 10_240, seed=0)
+    sobol = simulate_portfolio_estimates(initial_value, expected_return, expected_risk, 1, 1 / 252, 1_024, method="sobol", seed=0)
+    control = simulate_portfolio_estimates(initial_value, expected_return, expected_risk, 1, 1 / 252, 1_024, control_variate=True, seed=0)
+
+    for estimates in [plain, sobol, control]:
+        assert abs(estimates["mean_terminal_value"] - exact_mean) < 4 * estimates["mean_standard_error"], "Mean is too far from the exact mean"
+        assert abs(estimates["value_at_risk"] - exact_value_at_risk) < 4 * estimates["value_at_risk_standard_error"], "Value at risk is too far from the exact value"
+    for estimates in [sobol, control]:
+        assert estimates["mean_standard_error"] < plain["mean_standard_error"], "Mean standard error should beat 10x more plain paths"
+        assert estimates["value_at_risk_standard_error"] < plain["value_at_risk_standard_error"], "Value at risk standard error should beat 10x more plain paths"
+
+    antithetic = simulate_portfolio_returns(initial_value, expected_return, expected_risk, 1, 1 / 252, 10, seed=0, method="antithetic")
+    log_growth = np.log(antithetic[:, -1] / initial_value)
+    assert np.allclose(log_growth[0::2] + log_growth[1::2], 2 * (expected_return - 0.5 * expected_risk**2)), "Antithetic paths should mirror each other"
+
+
+def test_summary_without_risk_is_deterministic():
+    """
+    Test that a portfolio without risk, where every path is the same, gives its exact growth instead of
+    failing on zero width histogram bins.
+    """
+    summary = simulate_portfolio_summary(10_000, 0.05, 0.0, 1, 1 / 12, 1_000, seed=0)
+    expected = 10_000 * np.exp(0.05 * np.arange(13) / 12)
+
+    assert np.allclose(summary["mean_path"], expected), "Mean path should be the deterministic growth"
+    assert np.allclose(summary["quantile_paths"], expected), "Every quantile should be the deterministic growth"
+    assert np.isclose(summary["value_at_risk"], 10_000 - expected[-1]), "Value at risk should be minus the gain"
+    assert np.isclose(summary["conditional_value_at_risk"], 10_000 - expected[-1]), "CVaR should be minus the gain"
+    assert summary["terminal_counts"].sum() == 1_000 and summary["worst_max_drawdown"] == 0, "Invalid histogram or drawdown"
+
+
+def test_estimates_reject_uneven_batches_and_allow_zero_risk():
+    """
+    Test that simulations that can't be split evenly into batches raise a ValueError, and that the
+    control variate is skipped for a portfolio without risk.
+    """
+    for sims in [1_000, 8]:
+        with pytest.raises(ValueError):
+            simulate_portfolio_estimates(10_000, 0.05, 0.2, 1, 1 / 12, sims, batches=16, seed=0)
+
+    estimates = simulate_portfolio_estimates(10_000, 0.05, 0.0, 1, 1 / 12, 160, control_variate=True, seed=0)
+    assert np.isclose(estimates["mean_terminal_value"], 10_000 * np.exp(0.05)), "Mean should be the deterministic growth"
+    assert np.isclose(estimates["mean_standard_error"], 0.0), "A portfolio without risk has no standard error"
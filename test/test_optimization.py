@@ -1,9 +1,13 @@
 import numpy as np
 import pandas as pd
 import random
-from src.optimization import optimize_portfolio
+# The src modules import each other by their top level names (pytest.ini puts src on the path), so the
+# optimizer records into the top level instrumentation module, not src.instrumentation
+import instrumentation
+from src.optimization import optimize_portfolio, optimize_portfolios, optimize_max_sharpe, optimize_cvar, FrontierProblem
+from src.monte_carlo import simulate_asset_returns
 from src.data_processing import get_asset_data
-from src.portfolio_stats import portfolio_return_and_risk
+from src.portfolio_stats import portfolio_return_and_risk, portfolio_conditional_value_at_risk
 
 
 def test_valid_weights():
@@ -77,3 +81,112 @@ def test_fuzz_optimization_is_optimal():
             (rand_risk < min_risk) and (rand_return >= target_return)
         ), f"Random portfolio found with risk {rand_risk:.4f} < optimal {min_risk:.4f} and return {rand_return:.4f} >= target {target_return:.4f}"
 
+
+def test_frontier_problem_matches_optimize_portfolio():
+    """
+    Test that re-solving one compiled problem across target returns, with fixed or parametric
+    asset data, gives the same weights as building a new problem for each target.
+    """
+    rng = np.random.default_rng(0)
+    num_assets = 6
+    daily_returns = rng.normal(0.0005, 0.02, (500, num_assets))
+    returns = rng.uniform(0.05, 0.4, num_assets)
+    cov_matrix = np.cov(daily_returns.T) * 252
+
+    fixed_problem = FrontierProblem(returns, cov_matrix)
+    parametric_problem = FrontierProblem(returns, cov_matrix, parametric_data=True)
+    for target_return in np.linspace(0.1, 0.35, 6):
+        expected_weights = optimize_portfolio(returns, cov_matrix, target_return)
+        assert np.allclose(fixed_problem.solve(target_return), expected_weights, atol=1e-4), "Compiled problem weights do not match"
+        assert np.allclose(parametric_problem.solve(target_return), expected_weights, atol=1e-4), "Parametric problem weights do not match"
+
+    assert fixed_problem.timings["solves"] == 6, "Solves were not counted"
+    assert fixed_problem.solve(1.0) is None, "Target return above every asset's return should be infeasible"
+
+def test_critical_line_solver_matches_cvxpy():
+    """
+    Test that the NumPy solver gives the same weights as cvxpy, both one target at a time and
+    batched over several universes.
+    """
+    rng = np.random.default_rng(4)
+    num_universes, num_assets = 3, 8
+    returns = rng.uniform(0.0, 0.4, (num_universes, num_assets))
+    cov_matrix = np.array([np.cov(rng.normal(0, 0.02, (400, num_assets)).T) * 252 for _ in range(num_universes)])
+    target_returns = np.array([0.1, 0.2, 0.3])
+
+    batch_weights = optimize_portfolios(returns, cov_matrix, target_returns)
+    assert batch_weights.shape == (num_universes, len(target_returns), num_assets), "Batch weights have the wrong shape"
+
+    for universe in range(num_universes):
+        for target_index, target_return in enumerate(target_returns):
+            expected_weights = optimize_portfolio(returns[universe], cov_matrix[universe], target_return)
+            actual_weights = optimize_portfolio(returns[universe], cov_matrix[universe], target_return, method="critical_line")
+            if expected_weights is None:
+                assert actual_weights is None, "NumPy solver should also find the target infeasible"
+                assert np.all(np.isnan(batch_weights[universe, target_index])), "Infeasible batch weights should be NaN"
+                continue
+            assert np.allclose(actual_weights, expected_weights, atol=1e-3), "NumPy solver weights don't match cvxpy"
+            assert np.allclose(batch_weights[universe, target_index], actual_weights), "Batch weights don't match single solves"
+
+def test_max_sharpe_matches_frontier_scan():
+    """
+    Test that the direct tangency portfolio solve matches the best Sharpe ratio of a fine scan of the
+    efficient frontier, and that no portfolio is returned when every asset is below the risk-free rate.
+    """
+    rng = np.random.default_rng(7)
+    num_assets = 8
+    returns = rng.uniform(0.02, 0.35, num_assets)
+    cov_matrix = np.cov(rng.normal(0, 0.02, (500, num_assets)).T) * 252
+    risk_free_return = 0.03
+
+    weights = optimize_max_sharpe(returns, cov_matrix, risk_free_return)
+    max_return, max_risk = portfolio_return_and_risk(returns, cov_matrix, weights)
+
+    target_returns = np.linspace(returns.min(), returns.max(), 20_001)
+    frontier_weights = optimize_portfolios(returns, cov_matrix, target_returns)
+    frontier_returns = frontier_weights @ returns
+    frontier_risks = np.sqrt(np.einsum("ij,jk,ik->i", frontier_weights, cov_matrix, frontier_weights))
+    sharpe_ratios = (frontier_returns - risk_free_return) / frontier_risks
+    best = np.nanargmax(sharpe_ratios)
+
+    assert np.all(weights >= 0) and np.isclose(weights.sum(), 1), "Weights must be long-only and sum to 1"
+    assert np.isclose((max_return - risk_free_return) / max_risk, sharpe_ratios[best], rtol=1e-6), "Sharpe ratio doesn't match the scan"
+    assert np.isclose(max_return, frontier_returns[best], atol=1e-4), "Return doesn't match the scan"
+    assert np.allclose(weights, frontier_weights[best], atol=1e-4), "Weights don't match the scan"
+    assert optimize_max_sharpe(returns, cov_matrix, 0.5) is None, "No portfolio beats a risk-free rate above every return"
+
+def test_cvar_methods_agree_and_beat_random_portfolios():
+    """
+    Test that the cutting plane and full linear program reach the same conditional value at risk, that
+    the result meets the constraints, that no random portfolio meeting the target has a lower one, and
+    that running out of iterations is recorded.
+    """
+    rng = np.random.default_rng(0)
+    num_assets = 6
+    factors = rng.normal(size=(num_assets, num_assets))
+    returns = rng.uniform(0.02, 0.2, num_assets)
+    scenarios = simulate_asset_returns(returns, factors @ factors.T * 0.01, 1, 2_000, seed=1)
+    target_return = float(np.median(returns))
+
+    cutting_plane_weights = optimize_cvar(scenarios, target_return, returns=returns)
+    lp_weights = optimize_cvar(scenarios, target_return, returns=returns, method="lp")
+    cvar = portfolio_conditional_value_at_risk(scenarios, cutting_plane_weights)
+
+    assert np.isclose(cvar, portfolio_conditional_value_at_risk(scenarios, lp_weights), atol=1e-7), "Methods disagree"
+    assert np.isclose(cutting_plane_weights.sum(), 1) and cutting_plane_weights @ returns >= target_return - 1e-9, "Constraints not met"
+
+    random_weights = rng.dirichlet(np.ones(num_assets), 2_000)
+    for weights in random_weights[random_weights @ returns >= target_return]:
+        assert portfolio_conditional_value_at_risk(scenarios, weights) >= cvar - 1e-9, "A random portfolio has a lower CVaR"
+
+    assert optimize_cvar(scenarios, returns.max() + 0.1, returns=returns) is None, "Unreachable target should return None"
+
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        assert optimize_cvar(scenarios, target_return, returns=returns, max_iterations=1) is not None, "Best portfolio should be returned"
+        events = [record["name"] for record in instrumentation.get_records() if record["type"] == "event"]
+        assert events == ["cvar_not_converged"], "Stopping early should be recorded"
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
@@ -1,6 +1,7 @@
 import numpy as np
 import pytest
-from src.portfolio_stats import portfolio_return_and_risk, portfolio_sharpe_ratio
+from src.portfolio_stats import portfolio_return_and_risk, portfolio_sharpe_ratio, portfolio_returns_and_risks, portfolio_sharpe_ratios
+from src.covariance import covariance_factor
 
 def test_portfolio_metrics_are_accurate():
     """
@@ -38,4 +39,28 @@ def test_basic_sharpe_ratio_is_correct():
     expected_sharpe_ratio = 0.5
     actual_sharpe_ratio = portfolio_sharpe_ratio(portfolio_return, portfolio_risk, risk_free_rate)
 
-    assert expected_sharpe_ratio == actual_sharpe_ratio, "Resulting Sharpe ratio is not as expected"
\ No newline at end of file
+    assert expected_sharpe_ratio == actual_sharpe_ratio, "Resulting Sharpe ratio is not as expected"
+
+def test_batched_metrics_match_single_portfolio_metrics():
+    """
+    Test that the batched returns, risks and Sharpe ratios match the single portfolio functions, with
+    and without a covariance factor, and that zero risk portfolios get a NaN Sharpe ratio.
+    """
+    rng = np.random.default_rng(0)
+    num_assets = 6
+    returns = rng.uniform(0.0, 0.3, num_assets)
+    cov_matrix = np.cov(rng.normal(0, 0.02, (300, num_assets)).T) * 252
+    weights = rng.dirichlet(np.ones(num_assets), 1_000)
+
+    batch_returns, batch_risks = portfolio_returns_and_risks(returns, cov_matrix, weights)
+    factor_returns, factor_risks = portfolio_returns_and_risks(returns, cov_matrix, weights, covariance_factor(cov_matrix))
+    sharpe_ratios = portfolio_sharpe_ratios(batch_returns, batch_risks, 0.02)
+
+    for i in [0, 500, 999]:
+        single_return, single_risk = portfolio_return_and_risk(returns, cov_matrix, weights[i])
+        assert np.isclose(batch_returns[i], single_return) and np.isclose(batch_risks[i], single_risk), "Batched metrics don't match"
+        assert np.isclose(sharpe_ratios[i], portfolio_sharpe_ratio(single_return, single_risk, 0.02)), "Batched Sharpe ratio doesn't match"
+    assert np.allclose(factor_risks, batch_risks) and np.allclose(factor_returns, batch_returns), "Covariance factor changes the risks"
+
+    zero_risk = portfolio_sharpe_ratios(np.array([0.1, 0.2]), np.array([0.0, 0.1]), 0.02)
+    assert np.isnan(zero_risk[0]) and np.isclose(zero_risk[1], 1.8), "Zero risk should give NaN instead of raising"
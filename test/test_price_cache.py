@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+from src.price_cache import load_closes, MissingPriceDataError
+
+
+class FakeDownloader:
+    """
+    Stands in for yfinance. Returns a deterministic price for every weekday and records each call.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, tickers, start, end):
+        self.calls.append((list(tickers), start, end))
+        dates = pd.bdate_range(start, end, inclusive="left")
+        prices = {ticker: 100 + dates.dayofyear + ord(ticker[0]) for ticker in tickers}
+        return pd.DataFrame(prices, index=dates, dtype=float)
+
+
+def test_only_missing_dates_are_downloaded(tmp_path):
+    """
+    Test that a second request only downloads the dates and tickers that are not cached, and that
+    cached and freshly downloaded prices are the same.
+    """
+    downloader = FakeDownloader()
+    first = load_closes(["AAA", "BBB"], datetime(2024, 1, 1), datetime(2024, 3, 1), tmp_path, downloader=downloader)
+    assert len(downloader.calls) == 1, "First request should download everything at once"
+
+    second = load_closes(["BBB", "AAA", "CCC"], datetime(2024, 1, 1), datetime(2024, 4, 1), tmp_path, downloader=downloader)
+    calls = {(tuple(tickers), start, end) for tickers, start, end in downloader.calls[1:]}
+    assert calls == {
+        (("BBB", "AAA"), datetime(2024, 3, 1), datetime(2024, 4, 1)),
+        (("CCC",), datetime(2024, 1, 1), datetime(2024, 4, 1)),
+    }, "Only the missing ranges should be downloaded"
+
+    expected = FakeDownloader()(["AAA", "BBB"], datetime(2024, 1, 1), datetime(2024, 4, 1))
+    assert list(second.columns) == ["BBB", "AAA", "CCC"], "Columns should follow the ticker order"
+    assert np.allclose(second[["AAA", "BBB"]].to_numpy(), expected.to_numpy()), "Cached prices don't match the downloaded prices"
+    assert second.loc[first.index, ["AAA", "BBB"]].equals(first), "Cached prices changed between requests"
+
+
+def test_offline_mode_raises_when_data_is_missing(tmp_path):
+    """
+    Test that offline mode serves cached data without downloading and raises when data is missing.
+    """
+    downloader = FakeDownloader()
+    load_closes(["AAA"], datetime(2024, 1, 1), datetime(2024, 3, 1), tmp_path, downloader=downloader)
+
+    closes = load_closes(["AAA"], datetime(2024, 1, 15), datetime(2024, 2, 15), tmp_path, downloader=downloader, offline=True)
+    assert len(downloader.calls) == 1, "Offline mode should never download"
+    assert closes.index.min() >= pd.Timestamp(2024, 1, 15) and closes.index.max() < pd.Timestamp(2024, 2, 15), "Dates outside the request were returned"
+
+    with pytest.raises(MissingPriceDataError):
+        load_closes(["AAA", "BBB"], datetime(2024, 1, 1), datetime(2024, 3, 1), tmp_path, downloader=downloader, offline=True)
+
+
+def test_failed_tickers_are_not_cached(tmp_path):
+    """
+    Test that a ticker left out of the downloader's result, which is how downloaders report failures,
+    comes back empty and is downloaded again by the next request instead of being treated as cached.
+    """
+    downloader = FakeDownloader()
+
+    def failing_downloader(tickers, start, end):
+        return downloader(tickers, start, end).drop(columns="BAD", errors="ignore")
+
+    closes = load_closes(["AAA", "BAD"], datetime(2024, 1, 1), datetime(2024, 3, 1), tmp_path, downloader=failing_downloader)
+    assert closes["BAD"].isna().all() and closes["AAA"].notna().all(), "Only the failed ticker should be empty"
+    assert not (tmp_path / "BAD.npz").exists(), "A failed ticker should not be cached"
+
+    load_closes(["AAA", "BAD"], datetime(2024, 1, 1), datetime(2024, 3, 1), tmp_path, downloader=downloader)
+    assert downloader.calls[-1][0] == ["BAD"], "The failed ticker should be downloaded again"
+
+
+def test_ranges_without_trading_days_are_cached(tmp_path):
+    """
+    Test that a weekend that downloads without any prices is marked as covered, so it isn't downloaded
+    again and offline mode can serve it, and that offline mode serves the cached prices of a request
+    that ends after the cache.
+    """
+    downloader = FakeDownloader()
+    load_closes(["AAA"], datetime(2024, 1, 1), datetime(2024, 1, 6), tmp_path, downloader=downloader)
+    load_closes(["AAA"], datetime(2024, 1, 1), datetime(2024, 1, 8), tmp_path, downloader=downloader)
+    assert downloader.calls[-1][1:] == (datetime(2024, 1, 6), datetime(2024, 1, 8)), "The weekend should be downloaded once"
+
+    closes = load_closes(["AAA"], datetime(2024, 1, 1), datetime(2024, 1, 8), tmp_path, downloader=downloader)
+    assert len(downloader.calls) == 2, "A covered weekend shouldn't be downloaded again"
+    assert len(closes) == 5, "Only the weekdays should have prices"
+
+    offline_closes = load_closes(["AAA"], datetime(2024, 1, 1), datetime(2024, 2, 1), tmp_path, downloader=downloader, offline=True)
+    assert len(downloader.calls) == 2 and offline_closes.equals(closes), "Offline mode should serve the cached prices"
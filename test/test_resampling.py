@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+from src.data_processing import compute_asset_statistics
+from src.resampling import bootstrap_indices, bootstrap_statistics, resampled_frontier
+
+
+def make_daily_returns(num_assets, num_days, seed=0):
+    """
+    Daily returns with a common market factor.
+    """
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0, 0.01, (num_days, 1))
+    return market * rng.uniform(0.5, 1.5, num_assets) + rng.normal(0.0005, 0.015, (num_days, num_assets))
+
+
+def test_batched_statistics_match_each_resample():
+    """
+    Test that the batched means and covariances match compute_asset_statistics on the closes of the
+    resampled days, for plain and block resamples.
+    """
+    daily_returns = make_daily_returns(8, 200)
+    for block_size in [1, 5]:
+        returns, cov_matrices = bootstrap_statistics(daily_returns, 20, block_size=block_size, chunk_size=7, seed=1)
+        indices = bootstrap_indices(200, 20, block_size=block_size, seed=1)
+        for resample in [0, 13, 19]:
+            # Closes whose daily returns are exactly the resampled days
+            resampled = daily_returns[indices[resample]]
+            closes = pd.DataFrame(np.vstack([np.ones(8), np.cumprod(1 + resampled, axis=0)]))
+            expected_returns, expected_cov = compute_asset_statistics(closes)
+            assert np.allclose(returns[resample], expected_returns), "Resampled returns don't match"
+            assert np.allclose(cov_matrices[resample], expected_cov), "Resampled covariance doesn't match"
+
+
+def test_resampled_frontier_is_valid_and_independent_of_workers():
+    """
+    Test that the averaged weights are long-only and sum to one, the bands are ordered, and the result
+    only depends on the seed.
+    """
+    daily_returns = make_daily_returns(10, 300)
+    frontier = resampled_frontier(daily_returns, num_points=20, resamples=40, workers=1, seed=3)
+    parallel = resampled_frontier(daily_returns, num_points=20, resamples=40, workers=2, seed=3)
+
+    assert frontier["weights"].shape == (20, 10), "Wrong number of frontier points"
+    assert np.all(frontier["weights"] >= -1e-12) and np.allclose(frontier["weights"].sum(axis=1), 1), "Weights are invalid"
+    for name in ["weights", "returns", "risks"]:
+        assert np.all(frontier[f"{name}_lower"] <= frontier[f"{name}_upper"]), f"{name} bands are not ordered"
+        assert np.allclose(frontier[name], parallel[name]), "Result depends on the number of workers"
+    assert np.all(np.diff(frontier["returns_upper"]) >= -1e-12), "Higher ranks should reach higher returns"
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+from src.universe_index import build_universe_index
+from src.screening import random_universes, screen_universes
+from src.optimization import optimize_max_sharpe
+from src.portfolio_stats import portfolio_return_and_risk
+
+
+def make_index(path, num_assets=20, num_days=300, seed=0):
+    """
+    Builds a universe index from random walk closing prices.
+    """
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0.0008, 0.02, (num_days, num_assets)), axis=0))
+    closes = pd.DataFrame(prices, index=pd.bdate_range("2022-01-03", periods=num_days), columns=[f"T{i}" for i in range(num_assets)])
+    return build_universe_index(closes, path)
+
+
+def test_screening_matches_direct_solves_for_any_worker_count(tmp_path):
+    """
+    Test that screening in worker processes gives the same results as screening in this process,
+    that the results are ranked, and that the max Sharpe metrics match a direct solve.
+    """
+    index = make_index(tmp_path / "index")
+    universes = random_universes(index.tickers, 5, 30, seed=1)
+
+    parallel = screen_universes(index, universes, tmp_path / "parallel.csv", monte_carlo_sims=200, chunk_size=4, workers=2, seed=2)
+    serial = screen_universes(index, universes, tmp_path / "serial.csv", monte_carlo_sims=200, chunk_size=7, workers=1, seed=2)
+
+    assert len(parallel) == 30 and len(pd.read_csv(tmp_path / "parallel.csv")) == 30, "Every universe should be written"
+    pd.testing.assert_frame_equal(parallel, serial)
+    assert parallel["max_sharpe_ratio"].is_monotonic_decreasing, "Results should be ranked by Sharpe ratio"
+
+    best = parallel.iloc[0]
+    returns, cov_matrix = index.get_asset_data(best["tickers"].split())
+    weights = optimize_max_sharpe(returns, cov_matrix, 0.03)
+    portfolio_return, portfolio_risk = portfolio_return_and_risk(returns, cov_matrix, weights)
+    assert np.isclose(best["max_sharpe_ratio"], (portfolio_return - 0.03) / portfolio_risk, rtol=1e-6), "Sharpe ratio doesn't match a direct solve"
+    assert (parallel["conditional_value_at_risk"] >= parallel["value_at_risk"]).all(), "Tail losses should be at least the value at risk"
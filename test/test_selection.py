@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from src.selection import select_assets
+
+
+def make_universe(num_assets, seed=0):
+    """
+    Expected returns and a covariance matrix with a common market factor.
+    """
+    rng = np.random.default_rng(seed)
+    daily_returns = rng.normal(0, 0.01, (500, 1)) * rng.uniform(0.5, 1.5, num_assets) + rng.normal(0, 0.015, (500, num_assets))
+    return rng.uniform(0.0, 0.4, num_assets), np.cov(daily_returns.T) * 252
+
+
+@pytest.mark.parametrize("objective", ["min_risk", "max_sharpe"])
+def test_selection_methods_match_brute_force(objective):
+    """
+    Test that the exact search finds the brute force subset and the heuristics with local search reach
+    the same value on small universes.
+    """
+    for seed in range(3):
+        returns, cov_matrix = make_universe(12, seed)
+        selected, weights, value = select_assets(returns, cov_matrix, 4, objective, method="brute_force")
+        exact_selected, _, exact_value = select_assets(returns, cov_matrix, 4, objective, method="exact")
+        assert np.isclose(exact_value, value), "Exact search missed the best subset"
+        for method in ["forward", "backward"]:
+            assert np.isclose(select_assets(returns, cov_matrix, 4, objective, method=method)[2], value), f"{method} missed the best subset"
+
+        assert len(selected) == 4 and np.all(weights >= -1e-12) and np.isclose(weights.sum(), 1), "Invalid portfolio"
+
+
+def test_selected_portfolio_matches_reported_value():
+    """
+    Test that the reported risk and Sharpe ratio are those of the returned weights on the selected assets.
+    """
+    returns, cov_matrix = make_universe(40, seed=5)
+    selected, weights, risk = select_assets(returns, cov_matrix, 8, "min_risk")
+    assert np.isclose(risk, np.sqrt(weights @ cov_matrix[np.ix_(selected, selected)] @ weights)), "Risk doesn't match the weights"
+
+    selected, weights, sharpe_ratio = select_assets(returns, cov_matrix, 8, "max_sharpe", risk_free_return=0.03, method="backward")
+    subset_risk = np.sqrt(weights @ cov_matrix[np.ix_(selected, selected)] @ weights)
+    assert np.isclose(sharpe_ratio, (weights @ returns[selected] - 0.03) / subset_risk), "Sharpe ratio doesn't match the weights"
+
+    with pytest.raises(ValueError):
+        select_assets(returns, cov_matrix, 41)
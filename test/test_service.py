@@ -0,0 +1,82 @@
+import asyncio
+import json
+import numpy as np
+from src.service import PortfolioService
+from src.optimization import optimize_portfolio, optimize_max_sharpe
+
+
+class FakeLoader:
+    """
+    Stands in for get_asset_data. Returns random asset data seeded by the tickers and counts each load.
+    """
+    def __init__(self):
+        self.loads = []
+
+    def __call__(self, tickers, days_back, cov_estimator):
+        self.loads.append(tuple(tickers))
+        rng = np.random.default_rng(sum(ord(character) for character in "".join(tickers)))
+        returns = rng.uniform(0.02, 0.4, len(tickers))
+        cov_matrix = np.cov(rng.normal(0, 0.02, (400, len(tickers))).T) * 252
+        return returns, cov_matrix
+
+
+def test_socket_requests_are_answered_concurrently_and_cached(tmp_path):
+    """
+    Test that requests sent over a Unix socket are answered correctly, that each universe is only
+    loaded once, and that repeated queries are answered from the cache without loading again.
+    """
+    loader = FakeLoader()
+    service = PortfolioService(loader=loader)
+    first = {"tickers": ["AAA", "BBB", "CCC", "DDD"], "days_back": 365}
+    second = {"tickers": ["EEE", "FFF", "GGG"], "days_back": 365}
+    requests = [
+        {"id": 1, "method": "tangency", "params": {**first, "risk_free_return": 0.03}},
+        {"id": 2, "method": "min_risk", "params": {**first, "target_return": 0.2, "method": "cvxpy"}},
+        {"id": 3, "method": "frontier", "params": {**second, "risk_free_return": 0.03, "num_returns": 10}},
+        {"id": 4, "method": "simulate", "params": {**second, "weights": [0.2, 0.3, 0.5], "sims": 500, "seed": 0}},
+        {"id": 5, "method": "unknown", "params": first},
+    ]
+
+    async def run():
+        path = str(tmp_path / "service.sock")
+        server = await asyncio.start_unix_server(service.handle_connection, path=path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write("".join(json.dumps(request) + "\n" for request in requests).encode())
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in requests]
+
+            writer.write((json.dumps(requests[1]) + "\n").encode())
+            repeat = json.loads(await reader.readline())
+
+            # The service closes the connection once every request is answered
+            writer.write_eof()
+            await reader.read()
+            writer.close()
+        return {response["id"]: response for response in responses}, repeat
+
+    responses, repeat = asyncio.run(run())
+    returns, cov_matrix = FakeLoader()(first["tickers"], 365, "sample")
+
+    assert sorted(loader.loads) == [tuple(first["tickers"]), tuple(second["tickers"])], "Each universe should be loaded once"
+    assert np.allclose(responses[1]["result"]["weights"], optimize_max_sharpe(returns, cov_matrix, 0.03), atol=1e-6), "Tangency weights don't match"
+    assert np.allclose(responses[2]["result"]["weights"], optimize_portfolio(returns, cov_matrix, 0.2), atol=1e-4), "Min risk weights don't match"
+    assert len(responses[3]["result"]["risks"]) == 10 and responses[4]["result"]["value_at_risk"] is not None, "Frontier or simulation missing"
+    assert "Unknown method" in responses[5]["error"], "Unknown methods should return an error"
+    assert np.allclose(repeat["result"]["weights"], responses[2]["result"]["weights"]), "Repeat query doesn't match"
+
+
+def test_least_recently_used_universe_is_evicted():
+    """
+    Test that the cache keeps at most cache_size universes and reloads evicted ones.
+    """
+    loader = FakeLoader()
+    service = PortfolioService(loader=loader, cache_size=2)
+
+    async def run():
+        for tickers in [["AAA", "BBB"], ["CCC", "DDD"], ["AAA", "BBB"], ["EEE", "FFF"], ["CCC", "DDD"]]:
+            response = await service.handle({"method": "tangency", "params": {"tickers": tickers, "days_back": 30, "risk_free_return": 0.0}})
+            assert "result" in response, response
+
+    asyncio.run(run())
+    assert loader.loads == [("AAA", "BBB"), ("CCC", "DDD"), ("EEE", "FFF"), ("CCC", "DDD")], "Least recently used universe wasn't evicted"
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from src.data_processing import compute_asset_statistics
+from src.universe_index import build_universe_index, UniverseIndex
+
+
+def make_closes(num_assets, num_days, seed=0):
+    """
+    Random walk closing prices where some tickers start trading late or miss days.
+    """
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, (num_days, num_assets)), axis=0))
+    prices[:40, 3] = np.nan
+    prices[rng.random((num_days, num_assets)) < 0.01] = np.nan
+    dates = pd.bdate_range("2022-01-03", periods=num_days)
+    return pd.DataFrame(prices, index=dates, columns=[f"T{i}" for i in range(num_assets)])
+
+
+def test_subset_lookup_matches_recomputed_statistics(tmp_path):
+    """
+    Test that slicing a subset out of the universe index gives the same statistics as computing
+    them from the subset's closes, and that the saved index loads with the same tickers and dates.
+    """
+    closes = make_closes(30, 300)
+    build_universe_index(closes, tmp_path)
+    index = UniverseIndex(tmp_path)
+
+    subset = ["T7", "T3", "T21", "T0"]
+    returns, cov_matrix = index.get_asset_data(subset)
+    expected_returns, expected_cov = compute_asset_statistics(closes[subset])
+
+    assert np.allclose(returns, expected_returns, rtol=1e-12), "Returns don't match the recomputed returns"
+    assert np.allclose(cov_matrix, expected_cov, rtol=1e-12), "Covariance doesn't match the recomputed covariance"
+    assert index.tickers == list(closes.columns) and index.start == "2022-01-03", "Metadata wasn't saved"
+    assert isinstance(index.cov_matrix, np.memmap), "Arrays should be memory mapped"
+
+
+def test_batch_lookup_matches_single_lookups(tmp_path):
+    """
+    Test that looking up many universes at once matches looking them up one at a time.
+    """
+    index = build_universe_index(make_closes(30, 120, seed=1), tmp_path)
+    rng = np.random.default_rng(2)
+    universes = [list(rng.choice(index.tickers, size=5, replace=False)) for _ in range(50)]
+
+    batch_returns, batch_covs = index.get_asset_data_batch(universes)
+
+    for universe, returns, cov_matrix in zip(universes, batch_returns, batch_covs):
+        expected_returns, expected_cov = index.get_asset_data(universe)
+        assert np.array_equal(returns, expected_returns) and np.array_equal(cov_matrix, expected_cov), "Batch lookup doesn't match"
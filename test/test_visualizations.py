@@ -0,0 +1,56 @@
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+from src.monte_carlo import simulate_portfolio_returns, simulate_portfolio_summary
+from src.visualizations import plot_monte_carlo_all, plot_monte_carlo_summary, display_portfolio_bar_chart, render_figures, plot_random_portfolios_with_EF
+
+
+def test_monte_carlo_styles_save_without_showing(tmp_path):
+    """
+    Test that every Monte Carlo plot style and the summary plot write a figure file.
+    """
+    paths = simulate_portfolio_returns(10_000, 0.15, 0.2, 1, 1 / 252, 300, seed=0)
+    for style in ["lines", "subsample", "bands", "density"]:
+        save_path = tmp_path / f"{style}.png"
+        plot_monte_carlo_all(paths, style, style=style, max_paths=50, save_path=str(save_path), seed=0)
+        assert save_path.stat().st_size > 0, f"{style} figure wasn't written"
+
+    summary = simulate_portfolio_summary(10_000, 0.15, 0.2, 1, 1 / 252, 300, seed=0)
+    save_path = tmp_path / "summary.png"
+    plot_monte_carlo_summary(summary, "Summary", save_path=str(save_path))
+    assert save_path.stat().st_size > 0, "Summary figure wasn't written"
+
+
+def test_render_figures_in_parallel(tmp_path):
+    """
+    Test that render_figures writes every figure from worker processes and returns their paths in order.
+    """
+    weights = np.array([0.5, 0.3, 0.2])
+    jobs = [(display_portfolio_bar_chart, (weights, ["A", "B", "C"], f"Portfolio {i}"), {"save_path": str(tmp_path / f"{i}.png")})
+            for i in range(4)]
+
+    saved = render_figures(jobs, workers=2)
+
+    assert saved == [str(tmp_path / f"{i}.png") for i in range(4)], "Paths aren't returned in job order"
+    assert all((tmp_path / f"{i}.png").exists() for i in range(4)), "Not every figure was written"
+
+
+def test_figures_are_shown_without_save_path(monkeypatch):
+    """
+    Test that plots show the figure when no save_path is given.
+    """
+    import matplotlib.pyplot as plt
+    shown = []
+    monkeypatch.setattr(plt, "show", lambda: shown.append(True))
+    display_portfolio_bar_chart(np.array([0.6, 0.4]), ["A", "B"], "Portfolio")
+    plt.close()
+    assert shown == [True], "Figure wasn't shown"
+
+
+def test_frontier_plot_without_max_sharpe_point(tmp_path):
+    """
+    Test that the frontier figure is still written when there is no max Sharpe ratio portfolio.
+    """
+    save_path = tmp_path / "frontier.png"
+    plot_random_portfolios_with_EF([0.1, 0.2], [0.05, 0.08], None, None, [0.15], [0.06], save_path=str(save_path))
+    assert save_path.stat().st_size > 0, "Frontier figure wasn't written"